@@ -0,0 +1,292 @@
+import os
+import math
+import time
+import uuid
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwt
+import logging
+
+from .metrics import admission_rejections
+from .utils import SECRET_KEY, ALGORITHM
+
+logger = logging.getLogger(__name__)
+
+# 准入控制说明：
+# 每个用户在每类高开销接口上有一个令牌桶（容量=burst，按rate每秒补充），每次请求消耗cost个令牌；
+# 另外每类接口和全部高开销接口各有一个全局并发上限。超限时返回429并给出Retry-After。
+# 用户取自已验证的Bearer令牌（sub），查询参数中的 user_id 可以随意更换，不作为限流依据；未认证的请求按客户端地址限流。
+# 状态保存在可替换的后端中：单进程使用内存，多worker部署可使用共享的SQLite文件。
+
+
+@dataclass
+class EndpointClass:
+    """高开销接口类别的准入参数"""
+    name: str
+    cost: float          # 每次请求消耗的令牌数
+    rate: float          # 每秒补充的令牌数
+    burst: float         # 令牌桶容量
+    concurrency: int     # 该类接口的全局并发上限（0表示不限制）
+
+    @classmethod
+    def from_env(cls, name: str, cost: float, rate: float, burst: float, concurrency: int) -> "EndpointClass":
+        prefix = f"ADMISSION_{name.upper()}_"
+        return cls(
+            name=name,
+            cost=float(os.getenv(prefix + "COST", cost)),
+            rate=float(os.getenv(prefix + "RATE", rate)),
+            burst=float(os.getenv(prefix + "BURST", burst)),
+            concurrency=int(os.getenv(prefix + "CONCURRENCY", concurrency))
+        )
+
+
+class AdmissionBackend(ABC):
+    """令牌桶和并发计数的状态存储"""
+
+    @abstractmethod
+    def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        """尝试消耗令牌，成功返回0，否则返回需要等待的秒数"""
+        pass
+
+    @abstractmethod
+    def acquire(self, name: str, limit: int) -> Optional[str]:
+        """占用一个并发名额，成功返回名额标识，已满返回None"""
+        pass
+
+    @abstractmethod
+    def release(self, name: str, holder: str):
+        pass
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+def _wait_seconds(tokens: float, cost: float, rate: float) -> float:
+    return (cost - tokens) / rate if rate > 0 else float("inf")
+
+
+class MemoryBackend(AdmissionBackend):
+    """
+        进程内存后端（单worker部署）
+
+        已补满的令牌桶与不存在的桶等价，每隔 sweep_interval 秒清理一次，空闲用户（和客户端地址）不会一直占用内存
+    """
+
+    def __init__(self, sweep_interval: float = 60):
+        # key -> (令牌数, 更新时间, 补满时间)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._slots: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            tokens, updated, _ = self._buckets.get(key, (burst, now, now))
+            tokens = _refill(tokens, updated, now, rate, burst)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = _wait_seconds(tokens, cost, rate)
+            self._buckets[key] = (tokens, now, now + _wait_seconds(tokens, burst, rate))
+            return wait
+
+    def _sweep(self, now: float):
+        """删除已补满的令牌桶（持有锁时调用）"""
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+        self._next_sweep = now + self.sweep_interval
+
+    def acquire(self, name: str, limit: int) -> Optional[str]:
+        with self._lock:
+            count = self._slots.get(name, 0)
+            if count >= limit:
+                return None
+            self._slots[name] = count + 1
+            return name
+
+    def release(self, name: str, holder: str):
+        with self._lock:
+            self._slots[name] = max(0, self._slots.get(name, 0) - 1)
+
+
+class SQLiteBackend(AdmissionBackend):
+    """
+        共享SQLite文件后端（同一台机器上的多worker部署）
+
+        每次操作使用 BEGIN IMMEDIATE 事务保证跨进程原子性；
+        并发名额按占用者逐行记录并带过期时间，worker异常退出时名额会自动回收。
+    """
+
+    def __init__(self, path: str, slot_ttl: float = 300):
+        self.path = path
+        self.slot_ttl = slot_ttl
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS admission_buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS admission_slots (holder TEXT PRIMARY KEY, name TEXT, expires REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_admission_slots_name ON admission_slots (name)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        now = time.time()
+
+        def update(conn):
+            row = conn.execute("SELECT tokens, updated FROM admission_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(row[0], row[1], now, rate, burst) if row else burst
+            admitted = tokens >= cost
+            conn.execute("INSERT OR REPLACE INTO admission_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                         (key, tokens - cost if admitted else tokens, now))
+            return 0.0 if admitted else _wait_seconds(tokens, cost, rate)
+
+        return self._transaction(update)
+
+    def acquire(self, name: str, limit: int) -> Optional[str]:
+        now = time.time()
+        holder = uuid.uuid4().hex
+
+        def update(conn):
+            conn.execute("DELETE FROM admission_slots WHERE name = ? AND expires < ?", (name, now))
+            count = conn.execute("SELECT COUNT(*) FROM admission_slots WHERE name = ?", (name,)).fetchone()[0]
+            if count >= limit:
+                return None
+            conn.execute("INSERT INTO admission_slots (holder, name, expires) VALUES (?, ?, ?)",
+                         (holder, name, now + self.slot_ttl))
+            return holder
+
+        return self._transaction(update)
+
+    def release(self, name: str, holder: str):
+        self._transaction(lambda conn: conn.execute("DELETE FROM admission_slots WHERE holder = ?", (holder,)))
+
+
+class AdmissionController:
+    """高开销接口的准入控制"""
+
+    def __init__(self, backend: AdmissionBackend, classes: Dict[str, EndpointClass], global_concurrency: int = 0):
+        self.backend = backend
+        self.classes = classes
+        self.global_concurrency = global_concurrency
+
+    def _reject(self, endpoint_class: str, reason: str, retry_after: float):
+        admission_rejections.inc((endpoint_class, reason))
+        seconds = max(1, math.ceil(retry_after)) if math.isfinite(retry_after) else 60
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="请求过于频繁，请稍后再试" if reason == "rate" else "服务繁忙，请稍后再试",
+            headers={"Retry-After": str(seconds)}
+        )
+
+    def admit(self, endpoint_class: str, client_key: str) -> list:
+        """检查令牌桶并占用并发名额，返回需要释放的名额列表；不允许时抛出429"""
+        config = self.classes[endpoint_class]
+        wait = self.backend.take(f"{endpoint_class}:{client_key}", min(config.cost, config.burst),
+                                 config.rate, config.burst)
+        if wait > 0:
+            self._reject(endpoint_class, "rate", wait)
+
+        held = []
+        for name, limit in ((endpoint_class, config.concurrency), ("all", self.global_concurrency)):
+            if limit <= 0:
+                continue
+            holder = self.backend.acquire(name, limit)
+            if holder is None:
+                self.release(held)
+                self._reject(endpoint_class, "concurrency", 1)
+            held.append((name, holder))
+        return held
+
+    def release(self, held: list):
+        for name, holder in held:
+            self.backend.release(name, holder)
+
+
+def _create_controller() -> AdmissionController:
+    backend_name = os.getenv("ADMISSION_BACKEND", "memory")
+    if backend_name == "sqlite":
+        backend = SQLiteBackend(os.getenv("ADMISSION_SQLITE_PATH", "admission.db"))
+    else:
+        backend = MemoryBackend()
+
+    classes = {
+        # 能耗分析：多条聚合查询
+        "analysis": EndpointClass.from_env("analysis", cost=1, rate=1, burst=20, concurrency=16),
+        # 规则建议生成：分析 + 写库
+        "recommendations": EndpointClass.from_env("recommendations", cost=1, rate=0.2, burst=5, concurrency=8),
+        # AI建议生成：两次大模型调用
+        "ai": EndpointClass.from_env("ai", cost=1, rate=1 / 30, burst=3, concurrency=8),
+    }
+    return AdmissionController(backend, classes, int(os.getenv("ADMISSION_GLOBAL_CONCURRENCY", 24)))
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = _create_controller()
+    return _controller
+
+
+def _client_key(request: Request) -> str:
+    """按已认证用户（令牌中的用户ID）限流；未认证或令牌无效时按客户端地址"""
+    authorization = request.headers.get("Authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            user_id = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except JWTError:
+            user_id = None
+        if user_id:
+            return f"user:{user_id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def admission(endpoint_class: str):
+    """
+        准入控制依赖项，用法：
+
+            @router.get("/analysis", dependencies=[Depends(admission("analysis"))])
+    """
+    def dependency(request: Request):
+        if os.getenv("ADMISSION_ENABLED", "true").lower() != "true":
+            yield
+            return
+
+        controller = get_admission_controller()
+        held = controller.admit(endpoint_class, _client_key(request))
+        try:
+            yield
+        finally:
+            controller.release(held)
+
+    return dependency
@@ -0,0 +1,54 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from typing import Iterable, List
+from .. import models
+
+# 用户数据版本：写入读数、分时读数、设备、建议时在同一事务中递增对应计数（由调用方提交），
+# 列表和分析接口的ETag按主键读取这一行，不再扫描用户的全部数据。
+# 同一用户的并发写入在这一行上排队到提交为止；多个用户按ID顺序加锁，避免死锁。
+
+# DataVersion 的计数列
+KINDS = ("readings", "intervals", "devices", "recommendations")
+
+# 递增用户的数据版本（不提交），kinds 为 DataVersion 的计数列名
+def bump(db: Session, user_ids: Iterable[int], *kinds: str):
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    table = models.DataVersion.__table__
+    dialect = db.get_bind().dialect.name
+    rows = [dict({kind: 1 for kind in kinds}, user_id=user_id) for user_id in user_ids]
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        statement = insert(table).values(rows)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.user_id], set_={kind: table.c[kind] + 1 for kind in kinds}
+        ))
+    elif dialect == "mysql":
+        statement = mysql.insert(table).values(rows)
+        db.execute(statement.on_duplicate_key_update({kind: table.c[kind] + 1 for kind in kinds}))
+    else:
+        existing = {row.user_id: row for row in db.query(models.DataVersion).filter(
+            models.DataVersion.user_id.in_(user_ids)).with_for_update()}
+        for row in rows:
+            version = existing.get(row["user_id"])
+            if version is None:
+                db.add(models.DataVersion(**row))
+            else:
+                for kind in kinds:
+                    setattr(version, kind, getattr(models.DataVersion, kind) + 1)
+        db.flush()
+
+# 数据版本标量子查询（用户还没有版本行时为0），可与其他版本条件合并成一次查询
+def version_subqueries(user_id: int, *kinds: str) -> List:
+    return [
+        func.coalesce(select(getattr(models.DataVersion, kind)).where(
+            models.DataVersion.user_id == user_id
+        ).scalar_subquery(), 0)
+        for kind in kinds
+    ]
+
+# 获取用户的数据版本（用于ETag）
+def get_versions(db: Session, user_id: int, *kinds: str) -> tuple:
+    return tuple(db.execute(select(*version_subqueries(user_id, *kinds))).one())
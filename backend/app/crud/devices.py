@@ -1,11 +1,21 @@
 from sqlalchemy.orm import Session
 from .. import models, schemas
 from fastapi import HTTPException, status
+from . import data_versions
+from .fast_read import select_rows
 
 # 获取设备 by 当前用户
 def get_devices_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
     return db.query(models.Device).filter(models.Device.user_id == user_id).offset(skip).limit(limit).all()
 
+# 获取设备 by 当前用户（快速读取路径，返回字典行）
+def get_device_rows_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
+    return select_rows(db, models.Device, schemas.DeviceResponse, models.Device.user_id == user_id, skip=skip, limit=limit)
+
+# 获取设备数据版本（用于ETag）：新增、修改、删除设备时递增
+def get_data_version(db: Session, user_id: int):
+    return data_versions.get_versions(db, user_id, "devices")
+
 # 获取设备 by ID
 def get_device(db: Session, device_id: int):
     return db.query(models.Device).filter(models.Device.id == device_id).first()
@@ -17,6 +27,7 @@ def create_device(db: Session, device: schemas.DeviceCreate, user_id: int):
 
     # 保存设备
     db.add(db_device)
+    data_versions.bump(db, [user_id], "devices")
     db.commit()
     db.refresh(db_device)
 
@@ -43,6 +54,7 @@ def update_device(db: Session, device_id: int, device_update: schemas.DeviceUpda
     update_data = device_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_device, key, value)
+    data_versions.bump(db, [user_id], "devices")
 
     db.commit()
     db.refresh(db_device)
@@ -67,6 +79,7 @@ def delete_device(db: Session, device_id: int, user_id: int):
         )
 
     db.delete(db_device)
+    data_versions.bump(db, [user_id], "devices")
     db.commit()
 
     return db_device
\ No newline at end of file
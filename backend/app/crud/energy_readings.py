@@ -1,8 +1,22 @@
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import date
 from .. import models, schemas
-from sqlalchemy import extract
+from sqlalchemy import extract, func, literal_column
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from . import data_versions
+from .fast_read import select_rows
+from ..services import history_store, live_updates
+from ..services.tariff import get_tariff
+
+# 读数自然键（与 uq_energy_readings_natural_key 唯一索引的列和表达式一致）
+NATURAL_KEY = (
+    models.EnergyReading.user_id,
+    func.coalesce(models.EnergyReading.device_id, literal_column("0")),
+    models.EnergyReading.reading_date,
+    models.EnergyReading.reading_type,
+)
+UPSERT_CHUNK = 1000
 
 # 获取能耗数据 by 当前用户
 def get_energy_readings_by_user(
@@ -23,16 +37,203 @@ def get_energy_readings_by_user(
 
     return query.offset(skip).limit(limit).all()
 
-# 新增能耗数据
+# 获取能耗数据 by 当前用户（快速读取路径，返回字典行）
+def get_energy_reading_rows_by_user(
+    db: Session,
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    skip: int = 0,
+    limit: int = 100
+):
+    criteria = [models.EnergyReading.user_id == user_id]
+
+    if start_date:
+        criteria.append(models.EnergyReading.reading_date >= start_date)
+
+    if end_date:
+        criteria.append(models.EnergyReading.reading_date <= end_date)
+
+    return select_rows(db, models.EnergyReading, schemas.EnergyReadingResponse, *criteria, skip=skip, limit=limit)
+
+# 获取能耗数据版本（用于ETag）：读数版本 + 分时读数版本（分时汇总会原地更新日读数）
+def get_data_version(db: Session, user_id: int):
+    return data_versions.get_versions(db, user_id, "readings", "intervals")
+
+# 新增能耗数据（同一自然键已存在时覆盖，重复上报不会重复计数）
 def create_energy_reading(db: Session, reading:schemas.EnergyReadingCreate, user_id: int):
-    db_reading = models.EnergyReading(**reading.model_dump(), user_id=user_id)
+    row = dict(reading.model_dump(), user_id=user_id)
+
+    # 未提供电费时按电价方案计算
+    if row["cost"] is None:
+        row["cost"] = get_tariff().reading_cost(
+            reading.reading_value, get_month_to_date_consumption(db, user_id, reading.reading_date)
+        )
 
-    db.add(db_reading)
+    db_reading = upsert_energy_readings(db, [row])[0]
     db.commit()
-    db.refresh(db_reading)
+    live_updates.notify(user_id, [reading.reading_date])
 
     return db_reading
 
+# 批量新增能耗数据（不提交）：未提供电费的读数按写入顺序计算阶梯电价，与逐条写入结果一致
+def create_energy_readings(db: Session, rows: List[Dict]) -> List[models.EnergyReading]:
+    tariff = get_tariff()
+    # 用户 -> {日期: kWh}：一次查询取出涉及月份的已有日总读数，排在前面的总读数覆盖同一天的值
+    daily: Dict[int, Dict[date, float]] = {}
+    unpriced = [row for row in rows if row.get("cost") is None]
+    if unpriced:
+        for user_id, day, value in get_daily_totals_for_users(
+            db, {row["user_id"] for row in unpriced},
+            min(row["reading_date"].replace(day=1) for row in unpriced),
+            max(row["reading_date"] for row in unpriced)
+        ):
+            daily.setdefault(user_id, {})[day] = value or 0.0
+
+    priced = []
+    for row in rows:
+        row = dict(row)
+        if row.get("cost") is None:
+            month_start = row["reading_date"].replace(day=1)
+            month_to_date = sum(value for day, value in daily.get(row["user_id"], {}).items()
+                                if month_start <= day < row["reading_date"])
+            row["cost"] = tariff.reading_cost(row["reading_value"], month_to_date)
+        if models.ReadingType(row["reading_type"]) == models.ReadingType.total and row.get("device_id") is None:
+            daily.setdefault(row["user_id"], {})[row["reading_date"]] = row["reading_value"]
+        priced.append(row)
+    return upsert_energy_readings(db, priced)
+
+# 按ID批量获取读数（保持ID顺序），用于提交后一次取回全部行
+def get_energy_readings_by_ids(db: Session, ids: List[int]) -> List[models.EnergyReading]:
+    stored = {reading.id: reading for reading in db.query(models.EnergyReading).filter(models.EnergyReading.id.in_(ids))}
+    return [stored[reading_id] for reading_id in ids]
+
+def natural_key(row: Dict) -> Tuple:
+    return row["user_id"], row.get("device_id") or 0, row["reading_date"], models.ReadingType(row["reading_type"])
+
+def reading_key(reading: models.EnergyReading) -> Tuple:
+    return reading.user_id, reading.device_id or 0, reading.reading_date, reading.reading_type
+
+# 按自然键批量写入读数：已存在的覆盖读数值和电费并递增revision，同时递增涉及用户的数据版本，返回与输入顺序对应的行（不提交）
+def upsert_energy_readings(db: Session, rows: List[Dict]) -> List[models.EnergyReading]:
+    # 同一批次内的重复键只保留最后一条（PostgreSQL不允许一条语句两次更新同一行）
+    unique: Dict[Tuple, Dict] = {}
+    for row in rows:
+        row = dict(row, reading_type=models.ReadingType(row["reading_type"]), device_id=row.get("device_id"))
+        unique[natural_key(row)] = row
+
+    stored: Dict[Tuple, models.EnergyReading] = {}
+    upsert = UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if upsert is not None:
+        _track_history_changes(db, unique)
+    else:
+        upsert = _upsert_with_orm
+    values = list(unique.values())
+    for start in range(0, len(values), UPSERT_CHUNK):
+        for reading in upsert(db, values[start:start + UPSERT_CHUNK]):
+            stored[reading_key(reading)] = reading
+    data_versions.bump(db, {row["user_id"] for row in values}, "readings")
+    return [stored[natural_key(row)] for row in rows]
+
+def _existing_by_key(db: Session, keys, populate_existing: bool = False) -> Dict[Tuple, models.EnergyReading]:
+    """一次查询取出自然键已存在的读数"""
+    keys = list(keys)
+    if not keys:
+        return {}
+    query = db.query(models.EnergyReading).filter(
+        models.EnergyReading.user_id.in_({key[0] for key in keys}),
+        models.EnergyReading.reading_date.in_({key[2] for key in keys})
+    )
+    if populate_existing:
+        query = query.populate_existing()
+    wanted = set(keys)
+    return {reading_key(reading): reading for reading in query.all() if reading_key(reading) in wanted}
+
+# SQLite / PostgreSQL：INSERT ... ON CONFLICT DO UPDATE ... RETURNING，一条语句写入并取回
+def _upsert_on_conflict(insert):
+    def upsert(db: Session, rows: List[Dict]) -> List[models.EnergyReading]:
+        statement = insert(models.EnergyReading).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(NATURAL_KEY),
+            set_={
+                "reading_value": statement.excluded.reading_value,
+                "cost": statement.excluded.cost,
+                "revision": models.EnergyReading.revision + 1,
+            }
+        ).returning(models.EnergyReading)
+        return db.scalars(statement, execution_options={"populate_existing": True}).all()
+    return upsert
+
+# MySQL：INSERT ... ON DUPLICATE KEY UPDATE（由自然键唯一索引判断冲突），没有 RETURNING，写入后按自然键重新查询
+def _upsert_on_duplicate_key(db: Session, rows: List[Dict]) -> List[models.EnergyReading]:
+    statement = mysql.insert(models.EnergyReading).values(rows)
+    statement = statement.on_duplicate_key_update(
+        reading_value=statement.inserted.reading_value,
+        cost=statement.inserted.cost,
+        revision=models.EnergyReading.revision + 1,
+    )
+    db.execute(statement)
+    return list(_existing_by_key(db, [natural_key(row) for row in rows], populate_existing=True).values())
+
+# 不支持上述写法的数据库：先查出已存在的行再更新或插入
+def _upsert_with_orm(db: Session, rows: List[Dict]) -> List[models.EnergyReading]:
+    existing = _existing_by_key(db, [natural_key(row) for row in rows])
+    written = []
+    for row in rows:
+        reading = existing.get(natural_key(row))
+        if reading is None:
+            reading = models.EnergyReading(**row)
+            db.add(reading)
+        else:
+            reading.reading_value = row["reading_value"]
+            reading.cost = row["cost"]
+            reading.revision = models.EnergyReading.revision + 1
+        written.append(reading)
+    db.flush()
+    for reading in written:
+        db.refresh(reading)
+    return written
+
+# 按数据库方言选择单语句写入方式，其他数据库使用 _upsert_with_orm
+UPSERT_DIALECTS = {
+    "sqlite": _upsert_on_conflict(sqlite.insert),
+    "postgresql": _upsert_on_conflict(postgresql.insert),
+    "mysql": _upsert_on_duplicate_key,
+}
+
+# ON CONFLICT / ON DUPLICATE KEY 写入不触发ORM事件，启用本地历史库时按新旧值之差记录增量
+def _track_history_changes(db: Session, unique: Dict[Tuple, Dict]):
+    if history_store.get_history_store() is None:
+        return
+    existing = _existing_by_key(db, unique)
+    for key, row in unique.items():
+        old = existing.get(key)
+        old_value, old_cost = (old.reading_value or 0, old.cost or 0) if old is not None else (0, 0)
+        history_store.track_change(db, row["user_id"], row["reading_date"], row["reading_type"], row["device_id"],
+                                   float(row["reading_value"] or 0) - old_value, float(row["cost"] or 0) - old_cost)
+
+# 获取某日之前的当月累计总能耗（用于阶梯电价）
+def get_month_to_date_consumption(db: Session, user_id: int, reading_date: date) -> float:
+    return db.query(func.sum(models.EnergyReading.reading_value)).filter(
+        models.EnergyReading.user_id == user_id,
+        models.EnergyReading.reading_type == models.ReadingType.total,
+        models.EnergyReading.reading_date >= reading_date.replace(day=1),
+        models.EnergyReading.reading_date < reading_date
+    ).scalar() or 0.0
+
+# 批量获取多个用户在日期范围内的每日总读数（成组写入时一次查询算出各读数的当月累计）
+def get_daily_totals_for_users(db: Session, user_ids, start_date: date, end_date: date):
+    return db.query(
+        models.EnergyReading.user_id,
+        models.EnergyReading.reading_date,
+        func.sum(models.EnergyReading.reading_value)
+    ).filter(
+        models.EnergyReading.user_id.in_(user_ids),
+        models.EnergyReading.reading_type == models.ReadingType.total,
+        models.EnergyReading.reading_date >= start_date,
+        models.EnergyReading.reading_date < end_date
+    ).group_by(models.EnergyReading.user_id, models.EnergyReading.reading_date).all()
+
 # 获取月度能耗
 def get_monthly_consumption(db: Session, user_id: int, year: int, month: int):
     return db.query(models.EnergyReading).filter(
@@ -0,0 +1,28 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Dict, List, Type
+from pydantic import BaseModel
+
+# 响应模型 -> 查询列 的缓存
+_columns_cache: Dict[tuple, list] = {}
+
+
+def response_columns(model, schema: Type[BaseModel]) -> list:
+    """按响应模型的字段选取ORM模型对应的列"""
+    key = (model, schema)
+    if key not in _columns_cache:
+        _columns_cache[key] = [getattr(model, field) for field in schema.model_fields]
+    return _columns_cache[key]
+
+
+def select_rows(db: Session, model, schema: Type[BaseModel], *criteria,
+                skip: int = 0, limit: int = 100) -> List[Dict]:
+    """
+        快速读取路径：直接查询Core行并构造为字典，不创建ORM对象、不逐条做Pydantic校验
+
+        返回的字典字段与响应模型一致，可直接交给ORJSONResponse序列化。
+    """
+    stmt = select(*response_columns(model, schema)).where(*criteria).offset(skip).limit(limit)
+    result = db.execute(stmt)
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
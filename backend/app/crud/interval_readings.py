@@ -0,0 +1,6 @@
+from sqlalchemy.orm import Session
+from . import data_versions
+
+# 获取分时读数版本（用于ETag）：上报分时读数时递增，按主键读取用户的版本行
+def get_data_version(db: Session, user_id: int):
+    return data_versions.get_versions(db, user_id, "intervals")[0]
@@ -1,7 +1,9 @@
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import List, Optional, Set, Tuple
 from .. import schemas, models
+from . import data_versions
+from .fast_read import select_rows
 
 # 获取节能建议 by 当前用户
 def get_recommendations_by_user(
@@ -22,19 +24,77 @@ def get_recommendations_by_user(
 
     return query.offset(skip).limit(limit).all()
 
+# 获取节能建议 by 当前用户（快速读取路径，返回字典行）
+def get_recommendation_rows_by_user(
+    db: Session,
+    user_id: int,
+    category: Optional[schemas.RecommendationCategory] = None,
+    is_implemented: Optional[bool] = None,
+    skip: int = 0,
+    limit: int = 100
+):
+    criteria = [models.Recommendation.user_id == user_id]
+
+    if category:
+        criteria.append(models.Recommendation.category == category)
+
+    if is_implemented is not None:
+        criteria.append(models.Recommendation.is_implemented == is_implemented)
+
+    return select_rows(db, models.Recommendation, schemas.RecommendationResponse, *criteria, skip=skip, limit=limit)
+
+# 获取节能建议数据版本（用于ETag）：新增、更新建议时递增
+def get_data_version(db: Session, user_id: int):
+    return data_versions.get_versions(db, user_id, "recommendations")
+
+# 已存在的建议（标题, 来源），用于保存新建议前去重
+def get_existing_recommendation_keys(db: Session, user_id: int, titles: List[str]) -> Set[Tuple[str, str]]:
+    if not titles:
+        return set()
+    return set(db.query(models.Recommendation.title, models.Recommendation.source).filter(
+        models.Recommendation.user_id == user_id,
+        models.Recommendation.title.in_(titles)
+    ).all())
+
+# 已存在的AI建议（用户, 标题），用于批量保存前去重
+def get_existing_ai_recommendation_keys(db: Session, user_ids: List[int]) -> Set[Tuple[int, str]]:
+    if not user_ids:
+        return set()
+    return set(db.query(models.Recommendation.user_id, models.Recommendation.title).filter(
+        models.Recommendation.user_id.in_(user_ids),
+        models.Recommendation.source == "ai_based"
+    ).all())
+
 # 新增节能建议
 def create_recommendation(db: Session, recommendation: schemas.RecommendationCreate, user_id: int):
     db_recommendation = models.Recommendation(**recommendation.model_dump(), user_id=user_id)
 
     db.add(db_recommendation)
+    data_versions.bump(db, [user_id], "recommendations")
     db.commit()
     db.refresh(db_recommendation)
 
     return db_recommendation
 
+# 批量新增节能建议：单次提交，提交后一次查询取回全部行（代替逐条refresh）
+def create_recommendations(db: Session, recommendations: List[schemas.RecommendationCreate], user_id: int) -> List[models.Recommendation]:
+    if not recommendations:
+        return []
+    db_recommendations = [models.Recommendation(**recommendation.model_dump(), user_id=user_id)
+                          for recommendation in recommendations]
+
+    db.add_all(db_recommendations)
+    data_versions.bump(db, [user_id], "recommendations")
+    db.flush()
+    ids = [db_recommendation.id for db_recommendation in db_recommendations]
+    db.commit()
+
+    stored = {row.id: row for row in db.query(models.Recommendation).filter(models.Recommendation.id.in_(ids))}
+    return [stored[recommendation_id] for recommendation_id in ids]
+
 # 更新节能建议
 def update_recommendation(db: Session, recommendation_id: int, recommendation_update: schemas.RecommendationUpdate, user_id: int):
-    db_recommendation = db.query(models.Recommendation).filter(models.Recommendation.id == recommendation_id)
+    db_recommendation = db.query(models.Recommendation).filter(models.Recommendation.id == recommendation_id).first()
 
     if not db_recommendation:
         raise HTTPException(
@@ -51,6 +111,7 @@ def update_recommendation(db: Session, recommendation_id: int, recommendation_up
     update_data = recommendation_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_recommendation, field, value)
+    data_versions.bump(db, [user_id], "recommendations")
 
     db.commit()
     db.refresh(db_recommendation)
@@ -2,13 +2,26 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import time
+import logging
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+
+def make_engine(url: str):
+    """创建引擎；SQLite文件数据库使用 sqlite_profile 中的并发配置"""
+    from .sqlite_profile import configure_engine, engine_options
+    new_engine = create_engine(url, **engine_options(url))
+    configure_engine(new_engine, url)
+    return new_engine
+
+
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -18,4 +31,19 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# 创建数据库表并执行迁移（在应用启动阶段显式调用，而不是在导入时执行）
+def init_db(retries: int = 5, delay: float = 2.0):
+    """创建数据库表、补齐已有库缺少的列和索引，数据库暂时不可用时按间隔重试"""
+    for attempt in range(1, retries + 1):
+        try:
+            # 主库和各分片：create_all + 未执行的迁移
+            from .migrations import upgrade_all
+            upgrade_all()
+            return
+        except Exception as e:
+            if attempt == retries:
+                raise
+            logger.warning("数据库初始化失败（第%s次），%s秒后重试: %s", attempt, delay, e)
+            time.sleep(delay)
@@ -1,12 +1,16 @@
-from fastapi import Depends, HTTPException, status
+import os
+import secrets
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 
-from .database import get_db
+from .database import SessionLocal, get_db
+from .sharding import get_shard_router, user_session
 from . import models
-from .utils import SECRET_KEY, ALGORITHM
+from .utils import SECRET_KEY, ALGORITHM, LIVE_TOKEN_SCOPE
 
 # OAuth2密码Bearer模式
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/users/login")
@@ -14,6 +18,23 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/users/login")
 # 加载环境变量
 load_dotenv()
 
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="无法验证凭据",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _decode_token(token: str, scope: Optional[str] = None) -> dict:
+    """解码JWT令牌并校验用途（登录令牌没有scope），失败时抛出401"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise _credentials_exception()
+    if payload.get("sub") is None or payload.get("scope") != scope:
+        raise _credentials_exception()
+    return payload
+
 # 获取当前用户
 def get_current_user(
     token: str = Depends(oauth2_scheme),
@@ -32,28 +53,73 @@ def get_current_user(
         异常：
         - 401 Unauthorized: 令牌无效或过期
     """
-    # 认证失败异常
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="无法验证凭据",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+    # 解码JWT令牌（实时推送令牌不能用于其他接口）
+    user_id: str = _decode_token(token)["sub"]
 
-    try:
-        # 解码JWT令牌
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
+    # 从数据库获取用户
+    user = db.query(models.User).filter(models.User.id == user_id).first()
 
-        if user_id is None:
-            raise credentials_exception
+    if user is None:
+        raise _credentials_exception()
 
-    except JWTError:
-        raise credentials_exception
+    return user
 
-    # 从数据库获取用户
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+# 获取当前用户（SSE等长连接）
+def get_stream_user(request: Request, access_token: Optional[str] = None):
+    """
+        请求头中的登录令牌，或查询参数 access_token 中的实时推送令牌（浏览器 EventSource 无法设置请求头）
+
+        URL会出现在访问日志和浏览器历史中，查询参数只接受 POST /api/energy-readings/live/token 签发的短期推送令牌；
+        令牌过期时间记录在 request.state.token_expires_at，到期后服务端关闭连接，客户端重新获取令牌后重连。
+        认证使用短暂的会话，不在整个连接期间占用数据库连接
+    """
+    authorization = request.headers.get("Authorization", "")
+    if authorization.lower().startswith("bearer "):
+        payload = _decode_token(authorization[7:])
+    elif access_token:
+        payload = _decode_token(access_token, LIVE_TOKEN_SCOPE)
+    else:
+        raise _credentials_exception()
 
+    with SessionLocal() as db:
+        user = db.query(models.User).filter(models.User.id == payload["sub"]).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    request.state.token_expires_at = payload["exp"]
+    return user
+
+# 用户所属分片的数据库会话
+def get_user_db(user_id: int):
+    """
+        按路径或查询参数中的 user_id 返回其所属分片的会话
+
+        异常：
+        - 503 Service Unavailable: 用户数据正在迁移
+    """
+    yield from user_session(user_id)
+
+def get_current_user_db(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+        当前登录用户所属分片的会话
+
+        未分片时直接复用认证使用的会话；分片时先关闭认证会话（归还连接）再打开分片会话，
+        每个请求同一时刻只占用一个连接
+    """
+    router = get_shard_router()
+    if router.single and router.is_primary(router.names[0]):
+        yield db
+        return
+    db.close()
+    yield from user_session(current_user.id)
 
-    return user
\ No newline at end of file
+# 管理员令牌校验
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """
+        校验请求头 X-Admin-Token 是否与环境变量 ADMIN_TOKEN 一致
+
+        异常：
+        - 403 Forbidden: 未配置管理员令牌或令牌不匹配
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token or not x_admin_token or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="需要管理员权限")
@@ -0,0 +1,31 @@
+import hashlib
+from typing import Optional
+from fastapi import Request, Response
+from .metrics import record_cache
+
+
+def make_etag(*parts) -> str:
+    """根据数据版本等组成部分生成强ETag"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """检查请求头If-None-Match是否与ETag匹配"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match 使用弱比较，忽略 W/ 前缀
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """ETag匹配时返回304响应，否则返回None"""
+    if etag_matches(request, etag):
+        record_cache("etag", hit=True)
+        return Response(status_code=304, headers={"ETag": etag})
+    record_cache("etag", hit=False)
+    return None
@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
+
+# 日志管道说明：
+# 请求线程只把日志记录放入内存队列（QueueHandler），格式化和磁盘写入由后台QueueListener线程完成；
+# 高频日志可按记录器配置采样率，被采样丢弃的记录在入队前就被过滤，不产生任何格式化开销。
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """结构化JSON日志格式"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+        按记录器采样高频日志：对匹配前缀的记录器，级别不高于max_level的记录按比例保留
+
+        rates: {"app.services.data_processing": 0.1} 表示只保留10%的记录（每10条保留1条）
+    """
+
+    def __init__(self, rates: Dict[str, float], max_level: int = logging.INFO):
+        super().__init__()
+        # 最长前缀优先匹配
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+        self.max_level = max_level
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Optional[float]] = {}
+
+    def _rate_for(self, name: str) -> Optional[float]:
+        rate = self._cache.get(name, False)
+        if rate is False:
+            rate = next((r for prefix, r in self.rates if name == prefix or name.startswith(prefix + ".")), None)
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level:
+            return True
+        rate = self._rate_for(record.name)
+        if rate is None or rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        # 按计数确定性采样，避免随机数开销
+        with self._lock:
+            count = self._counters.get(record.name, 0)
+            self._counters[record.name] = count + 1
+        return count % round(1 / rate) == 0
+
+
+class LazyQueueHandler(QueueHandler):
+    """只合并消息参数后入队，完整格式化（时间、JSON等）在监听线程中进行"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 参数可能是之后会被修改的可变对象，入队前先合并为字符串
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """解析采样配置，如 "app.services.data_processing=0.1,app.routers=0.5" """
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+def build_handlers(log_format: str = "text", log_file: Optional[str] = "app.log") -> List[logging.Handler]:
+    """实际执行输出的处理器（在监听线程中运行）"""
+    formatter = JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler(sys.stderr)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8', delay=True))  # 首次写入时才打开文件
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def setup_logging(level: Optional[str] = None, log_format: Optional[str] = None,
+                  log_file: Optional[str] = "app.log", sampling: Optional[str] = None) -> QueueListener:
+    """配置根记录器使用队列日志管道，返回已启动的监听器"""
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    log_format = log_format or os.getenv("LOG_FORMAT", "text")
+    sampling = sampling if sampling is not None else os.getenv("LOG_SAMPLING", "")
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    rates = parse_sampling(sampling)
+    if rates:
+        queue_handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    listener = QueueListener(log_queue, *build_handlers(log_format, log_file), respect_handler_level=True)
+    listener.start()
+    # 进程退出前写完队列中剩余的日志
+    atexit.register(listener.stop)
+    return listener
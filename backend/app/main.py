@@ -1,32 +1,38 @@
-from sys import prefix
+import os
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
-import uvicorn
 
-from .database import engine, Base
-from .routers import users, devices, energy_readings, recommendations
-import logging
-
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
+from .database import init_db
+from .logging_config import setup_logging
+from .metrics import MetricsMiddleware, render_metrics
+from .profiling import ProfilingMiddleware
+from .query_tracker import QueryTrackingMiddleware
+from .routers import users, devices, energy_readings, recommendations, profiling, dashboard
+from .services.ingest_buffer import shutdown_ingest_buffer
+from .services.live_updates import shutdown_live_updates
 
 load_dotenv()
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('app.log', encoding='utf-8')
-    ]
-)
+# 配置日志：队列日志管道，格式化和写盘在后台线程进行
+setup_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建数据库表，关闭时写完读数写入缓冲区、结束实时推送连接"""
+    if os.getenv("AUTO_CREATE_SCHEMA", "true").lower() == "true":
+        init_db()
+    yield
+    shutdown_ingest_buffer()
+    shutdown_live_updates()
 
 app = FastAPI(
     title="家庭能耗体检与节能建议系统",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS配置
@@ -38,12 +44,40 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# 性能指标
+app.add_middleware(MetricsMiddleware)
+
+# 开发模式：记录每个请求的SQL并告警疑似N+1查询
+if os.getenv("QUERY_TRACKING", "false").lower() == "true":
+    app.add_middleware(
+        QueryTrackingMiddleware,
+        threshold=int(os.getenv("QUERY_TRACKING_REPEAT_THRESHOLD", 3)),
+        max_queries=int(os.getenv("QUERY_TRACKING_MAX_QUERIES")) if os.getenv("QUERY_TRACKING_MAX_QUERIES") else None
+    )
+
+# 按需性能分析：管理员令牌触发或按采样率抽取
+if os.getenv("ADMIN_TOKEN") or float(os.getenv("PROFILING_SAMPLE_RATE", 0)) > 0:
+    app.add_middleware(
+        ProfilingMiddleware,
+        admin_token=os.getenv("ADMIN_TOKEN"),
+        sample_rate=float(os.getenv("PROFILING_SAMPLE_RATE", 0)),
+        interval=float(os.getenv("PROFILING_INTERVAL_MS", 5)) / 1000,
+        mode=os.getenv("PROFILING_MODE", "sampling")
+    )
+
 app.include_router(users.router, prefix="/api/users", tags=["用户"])
 app.include_router(devices.router, prefix="/api/devices", tags=["设备"])
 app.include_router(energy_readings.router, prefix="/api/energy-readings", tags=["能耗读取"])
 app.include_router(recommendations.router, prefix="/api/recommendations", tags=["节能建议"])
+app.include_router(dashboard.router, prefix="/api/dashboard", tags=["仪表盘"])
+app.include_router(profiling.router, prefix="/api/admin/profiles", tags=["性能分析"])
 
 
 @app.get("/")
 async def root():
     return {"message": "家庭能耗体检与节能建议系统 API"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus文本格式的性能指标"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
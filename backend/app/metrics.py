@@ -0,0 +1,345 @@
+import time
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 指标实现说明：
+# 每个线程写入自己的分片（threading.local），采样时无需加锁；
+# 仅在线程首次写入某个指标时加锁登记分片，抓取(/metrics)时再汇总所有分片。
+
+Labels = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """按线程分片的指标基类"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def _snapshots(self) -> List[dict]:
+        with self._lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """计数器"""
+
+    kind = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def collect(self) -> Dict[Labels, float]:
+        merged: Dict[Labels, float] = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                merged[labels] = merged.get(labels, 0) + value
+        return merged
+
+    def _render_samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                for labels, value in sorted(self.collect().items())]
+
+
+class Gauge(Counter):
+    """可增减的仪表（各分片求和）"""
+
+    kind = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+
+class CallbackGauge(_Metric):
+    """抓取时通过回调计算值的仪表"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str],
+                 callback: Callable[[], Dict[Labels, float]]):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _render_samples(self) -> List[str]:
+        try:
+            values = self.callback()
+        except Exception:
+            return []
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                for labels, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """直方图"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, labels: Labels = ()):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # [各桶计数..., +Inf计数, 总和]
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def _render_samples(self) -> List[str]:
+        merged: Dict[Labels, list] = {}
+        for shard in self._snapshots():
+            for labels, state in shard.items():
+                state = list(state)
+                if labels in merged:
+                    merged[labels] = [a + b for a, b in zip(merged[labels], state)]
+                else:
+                    merged[labels] = state
+
+        lines = []
+        for labels, state in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {state[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    """生成Prometheus文本格式的指标"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---- HTTP请求指标 ----
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP请求耗时（按路由模板）", ("method", "route", "status")
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "正在处理的HTTP请求数", ("method",)
+)
+
+# ---- 数据库指标 ----
+db_statements = Counter("db_statements_total", "执行的SQL语句总数")
+db_queries_per_request = Histogram(
+    "db_queries_per_request", "每个请求执行的SQL语句数", ("route",), QUERY_COUNT_BUCKETS
+)
+db_time_per_request = Histogram(
+    "db_query_seconds_per_request", "每个请求的SQL执行总耗时", ("route",)
+)
+
+# ---- AI调用指标 ----
+llm_request_duration = Histogram(
+    "llm_request_duration_seconds", "大模型调用耗时", ("provider", "operation", "outcome"),
+    (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+)
+llm_tokens = Counter("llm_tokens_total", "大模型调用消耗的token数", ("provider", "operation", "kind"))
+
+# ---- 准入控制指标 ----
+admission_rejections = Counter("admission_rejections_total", "准入控制拒绝的请求数", ("endpoint_class", "reason"))
+
+# ---- 缓存指标 ----
+cache_requests = Counter("cache_requests_total", "缓存请求数（按结果）", ("cache", "result"))
+
+# ---- 读数写入缓冲指标 ----
+ingest_batch_rows = Histogram(
+    "ingest_batch_rows", "每次成组提交的读数条数", (), (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+ingest_flush_seconds = Histogram("ingest_flush_seconds", "每次成组提交的耗时")
+
+# ---- 实时推送指标 ----
+live_evictions = Counter("live_evictions_total", "实时推送中因消费过慢被断开的订阅数")
+
+
+def _cache_hit_ratio() -> Dict[Labels, float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in cache_requests.collect().items():
+        hits_and_total = totals.setdefault(cache, [0, 0])
+        hits_and_total[1] += value
+        if result == "hit":
+            hits_and_total[0] += value
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+
+CallbackGauge("cache_hit_ratio", "缓存命中率", ("cache",), _cache_hit_ratio)
+
+
+def _prompt_token_stats() -> Dict[Labels, float]:
+    from .services.prompt_builder import prompt_metrics
+    values = {}
+    for kind, stats in prompt_metrics.items():
+        values[(kind, "count")] = stats["count"]
+        values[(kind, "total_tokens")] = stats["total_tokens"]
+        values[(kind, "max_tokens")] = stats["max_tokens"]
+    return values
+
+
+CallbackGauge("ai_prompt_size", "AI提示词大小统计（估算token）", ("prompt", "stat"), _prompt_token_stats)
+
+
+def _db_pool_stats() -> Dict[Labels, float]:
+    from .database import engine
+    pool = engine.pool
+    values = {("checked_out",): pool.checkedout()}
+    if hasattr(pool, "size"):
+        values[("size",)] = pool.size()
+    return values
+
+
+CallbackGauge("db_pool_connections", "数据库连接池状态", ("state",), _db_pool_stats)
+
+
+def _hedging_stats() -> Dict[Labels, float]:
+    from .services.ai_service_factory import _hedging_policy
+    return {(name,): value for name, value in _hedging_policy.stats.items()}
+
+
+CallbackGauge("ai_hedging_requests", "AI对冲请求统计", ("stat",), _hedging_stats)
+
+
+def _ingest_buffer_depth() -> Dict[Labels, float]:
+    from .services.ingest_buffer import _buffer
+    return {(): len(_buffer)} if _buffer is not None else {}
+
+
+CallbackGauge("ingest_buffer_pending", "读数写入缓冲区中等待提交的条数", (), _ingest_buffer_depth)
+
+
+def _live_subscribers() -> Dict[Labels, float]:
+    from .services.live_updates import _live
+    return {(): _live.subscriber_count()} if _live is not None else {}
+
+
+CallbackGauge("live_subscribers", "实时推送的订阅连接数", (), _live_subscribers)
+
+
+def record_cache(cache: str, hit: bool):
+    """记录一次缓存命中/未命中"""
+    cache_requests.inc((cache, "hit" if hit else "miss"))
+
+
+def record_llm_call(provider: str, operation: str, seconds: float, outcome: str,
+                    prompt_tokens: int = 0, completion_tokens: int = 0):
+    """记录一次大模型调用"""
+    llm_request_duration.observe(seconds, (provider, operation, outcome))
+    if prompt_tokens:
+        llm_tokens.inc((provider, operation, "prompt"), prompt_tokens)
+    if completion_tokens:
+        llm_tokens.inc((provider, operation, "completion"), completion_tokens)
+
+
+# ---- SQL执行统计（SQLAlchemy事件） ----
+# 当前请求的SQL统计 [语句数, 总耗时]；同步路由在线程池中执行时会复制上下文，共享同一个列表
+_request_sql_stats: ContextVar[Optional[list]] = ContextVar("request_sql_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    db_statements.inc()
+
+    stats = _request_sql_stats.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+
+
+class MetricsMiddleware:
+    """记录每个请求的耗时、并发数和SQL统计（纯ASGI中间件）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = [500]
+        sql_stats = [0, 0.0]
+        token = _request_sql_stats.set(sql_stats)
+        http_requests_in_flight.inc((method,))
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_flight.dec((method,))
+            _request_sql_stats.reset(token)
+
+            # 使用路由模板作为标签，避免路径参数导致标签基数爆炸
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            http_request_duration.observe(elapsed, (method, route_path, str(status[0])))
+            db_queries_per_request.observe(sql_stats[0], (route_path,))
+            db_time_per_request.observe(sql_stats[1], (route_path,))
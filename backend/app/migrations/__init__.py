@@ -0,0 +1,142 @@
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect as sa_inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from . import v0001_natural_key, v0002_hot_query_indexes
+
+logger = logging.getLogger(__name__)
+
+# 数据库迁移说明：
+# 新库的全部表和索引仍由 create_all 按模型创建；已有库上模型新增的列和索引由这里的迁移补齐。
+# 每个迁移模块定义 VERSION、DESCRIPTION、TRANSACTIONAL 和 upgrade(conn)，已执行的版本记录在 schema_migrations 表中。
+# - 迁移语句都可重复执行（IF NOT EXISTS / 先检查再添加），新库上create_all已建好的索引会直接跳过；
+# - TRANSACTIONAL=False 的迁移在自动提交连接上执行：PostgreSQL 使用 CREATE INDEX CONCURRENTLY，
+#   建索引期间不阻塞读数写入（不能放在事务中）；SQLite 建索引期间写入排队等待，WAL模式下读取不受影响；
+# - PostgreSQL 上用会话级咨询锁保证同一时刻只有一个进程执行迁移（多worker同时启动）。
+# 命令行：python -m app.migrations [status|upgrade]，对每个分片执行。
+
+MIGRATIONS = sorted([v0001_natural_key, v0002_hot_query_indexes], key=lambda module: module.VERSION)
+
+# 任意固定值，同一数据库上的迁移进程共用
+ADVISORY_LOCK_KEY = 7305162
+
+metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations", metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime, default=func.now()),
+)
+
+
+def index_key(dialect: str, columns: Sequence[str]) -> str:
+    """索引键；MySQL 的表达式键（函数索引）需要再加一层括号"""
+    if dialect == "mysql":
+        columns = [f"({column})" if "(" in column else column for column in columns]
+    return ", ".join(columns)
+
+
+def create_index(conn: Connection, name: str, table: str, columns: Sequence[str],
+                 unique: bool = False, include: Sequence[str] = ()):
+    """创建索引（已存在时跳过）。PostgreSQL 上并发创建，需在自动提交连接上调用"""
+    dialect = conn.dialect.name
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    key = index_key(dialect, columns)
+    if dialect == "postgresql":
+        # 并发建索引中途失败会留下无效索引，IF NOT EXISTS 会跳过它，先删除再重建
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": name}).first()
+        if invalid:
+            logger.warning("索引 %s 无效（上次并发创建未完成），删除后重建", name)
+            conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        covering = f" INCLUDE ({', '.join(include)})" if include else ""
+        conn.exec_driver_sql(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({key}){covering}")
+    elif dialect == "sqlite":
+        conn.exec_driver_sql(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({key})")
+    else:
+        if name not in {index["name"] for index in sa_inspect(conn).get_indexes(table)}:
+            conn.exec_driver_sql(f"CREATE {kind} {name} ON {table} ({key})")
+
+
+def add_column(conn: Connection, table: str, name: str, definition: str):
+    """补加列（已存在时跳过）"""
+    if name not in {column["name"] for column in sa_inspect(conn).get_columns(table)}:
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
+@contextmanager
+def _migration_lock(engine: Engine) -> Iterator[None]:
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+
+def applied_versions(engine: Engine) -> Dict[int, str]:
+    metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        return {row.version: row.name for row in conn.execute(select(schema_migrations.c.version, schema_migrations.c.name))}
+
+
+def pending(engine: Engine) -> List:
+    applied = applied_versions(engine)
+    return [module for module in MIGRATIONS if module.VERSION not in applied]
+
+
+def _record(engine: Engine, module):
+    try:
+        with engine.begin() as conn:
+            conn.execute(schema_migrations.insert().values(version=module.VERSION, name=module.DESCRIPTION))
+    except IntegrityError:
+        # 其他数据库（未加锁的方言）上的并发进程已记录
+        pass
+
+
+def upgrade(engine: Engine, target: Optional[int] = None) -> List[int]:
+    """创建缺少的表，再按版本顺序执行未执行的迁移，返回本次执行的版本"""
+    # 导入模型以注册所有表
+    from .. import models
+    models.Base.metadata.create_all(bind=engine)
+
+    done = []
+    with _migration_lock(engine):
+        for module in pending(engine):
+            if target is not None and module.VERSION > target:
+                break
+            started = time.perf_counter()
+            logger.info("执行迁移 %04d %s", module.VERSION, module.DESCRIPTION)
+            if module.TRANSACTIONAL:
+                with engine.begin() as conn:
+                    module.upgrade(conn)
+            else:
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    module.upgrade(conn)
+            _record(engine, module)
+            done.append(module.VERSION)
+            logger.info("迁移 %04d 完成，耗时%.1f秒", module.VERSION, time.perf_counter() - started)
+    return done
+
+
+def upgrade_all(target: Optional[int] = None) -> Dict[str, List[int]]:
+    """对每个分片执行迁移（未配置分片时即主库）；主库不是分片时也执行（分片目录表）"""
+    from ..database import engine as primary_engine
+    from ..sharding import get_shard_router
+
+    router = get_shard_router()
+    results = {name: upgrade(router.engine(name), target) for name in router.names}
+    if not any(router.is_primary(name) for name in router.names):
+        results["primary"] = upgrade(primary_engine, target)
+    return results
@@ -0,0 +1,38 @@
+import sys
+import logging
+import argparse
+
+from . import MIGRATIONS, applied_versions, upgrade_all
+from ..sharding import get_shard_router
+
+# 数据库迁移命令：
+#   python -m app.migrations status
+#   python -m app.migrations upgrade [--target 版本]
+
+
+def status() -> int:
+    router = get_shard_router()
+    for name in router.names:
+        applied = applied_versions(router.engine(name))
+        for module in MIGRATIONS:
+            mark = "已执行" if module.VERSION in applied else "未执行"
+            print(f"[{name}] {module.VERSION:04d} {module.DESCRIPTION:<40} {mark}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库迁移")
+    parser.add_argument("command", nargs="?", choices=["status", "upgrade"], default="upgrade")
+    parser.add_argument("--target", type=int, help="只执行到该版本")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    if args.command == "status":
+        return status()
+    for name, versions in upgrade_all(args.target).items():
+        print(f"[{name}] 执行迁移: {', '.join(f'{v:04d}' for v in versions) or '无'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
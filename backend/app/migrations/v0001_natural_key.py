@@ -0,0 +1,19 @@
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+
+# 读数自然键：revision 列 + (user_id, coalesce(device_id, 0), reading_date, reading_type) 唯一索引
+
+VERSION = 1
+DESCRIPTION = "energy_readings natural key"
+TRANSACTIONAL = False
+
+
+def upgrade(conn: Connection):
+    from . import add_column, create_index
+
+    add_column(conn, "energy_readings", "revision", "INTEGER NOT NULL DEFAULT 1")
+    try:
+        create_index(conn, "uq_energy_readings_natural_key", "energy_readings",
+                     ["user_id", "coalesce(device_id, 0)", "reading_date", "reading_type"], unique=True)
+    except IntegrityError as e:
+        raise RuntimeError("energy_readings 存在自然键重复的读数，请先执行 python -m app.tools.dedup_readings") from e
@@ -0,0 +1,20 @@
+from sqlalchemy.engine import Connection
+
+# 热点查询的组合索引：
+# - 能耗分析、月初至今电费、分时汇总：energy_readings 按 (user_id, reading_type, reading_date) 过滤，
+#   PostgreSQL 上 INCLUDE 设备、读数和电费，按日/按设备汇总只走索引；
+# - 建议去重：recommendations 按 (user_id, title, source) 过滤，同时覆盖"我的建议"按用户查询；
+# - 设备列表和设备能耗汇总：devices 按 user_id 过滤。
+
+VERSION = 2
+DESCRIPTION = "hot query composite indexes"
+TRANSACTIONAL = False
+
+
+def upgrade(conn: Connection):
+    from . import create_index
+
+    create_index(conn, "ix_energy_readings_user_type_date", "energy_readings",
+                 ["user_id", "reading_type", "reading_date"], include=["device_id", "reading_value", "cost"])
+    create_index(conn, "ix_recommendations_user_title_source", "recommendations", ["user_id", "title", "source"])
+    create_index(conn, "ix_devices_user_id", "devices", ["user_id"])
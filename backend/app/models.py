@@ -1,5 +1,5 @@
-from sqlalchemy import Column, JSON, Integer, String,Float, Boolean, DateTime, Text, Enum, ForeignKey, Date
-from sqlalchemy.sql import func
+from sqlalchemy import Column, JSON, Integer, String,Float, Boolean, DateTime, Text, Enum, ForeignKey, Date, LargeBinary, Index
+from sqlalchemy.sql import func, literal_column
 from .database import Base
 import enum
 
@@ -60,6 +60,10 @@ class Device(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=func.now())
 
+    __table_args__ = (
+        Index("ix_devices_user_id", "user_id"),
+    )
+
 class EnergyReading(Base):
     __tablename__ = "energy_readings"
 
@@ -71,6 +75,70 @@ class EnergyReading(Base):
     reading_date = Column(Date, nullable=False)
     cost = Column(Float, comment="电费(元)")
     created_at = Column(DateTime, default=func.now())
+    revision = Column(Integer, nullable=False, default=1, server_default="1", comment="同一自然键被覆盖写入时递增，用于缓存版本")
+
+    __table_args__ = (
+        # 自然键：同一用户、设备（总读数为0）、日期、类型只有一条读数，重复上报时覆盖而不是重复计数
+        Index("uq_energy_readings_natural_key", "user_id", func.coalesce(device_id, literal_column("0")),
+              "reading_date", "reading_type", unique=True),
+        # 分析、月初至今电费等热点查询的过滤条件；PostgreSQL上附带汇总所需列，只扫描索引
+        Index("ix_energy_readings_user_type_date", "user_id", "reading_type", "reading_date",
+              postgresql_include=["device_id", "reading_value", "cost"]),
+    )
+
+class IntervalReading(Base):
+    """智能电表分时读数：每个用户（或设备）每天一行，当天各时段读数打包为float32数组"""
+    __tablename__ = "interval_readings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    device_id = Column(Integer, ForeignKey("devices.id"))
+    reading_date = Column(Date, nullable=False)
+    interval_minutes = Column(Integer, nullable=False, comment="时段长度(分钟)")
+    packed_values = Column(LargeBinary, nullable=False, comment="各时段读数(kWh)，小端float32数组，缺失为NaN")
+    total = Column(Float, nullable=False, comment="当天合计(kWh)")
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_interval_readings_user_date", "user_id", "reading_date"),
+    )
+
+class MonthlyReading(Base):
+    """超过保留期的读数按月汇总（原始读数已归档到本地压缩文件）"""
+    __tablename__ = "monthly_readings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    device_id = Column(Integer, ForeignKey("devices.id"))
+    reading_type = Column(Enum(ReadingType), nullable=False)
+    month = Column(Date, nullable=False, comment="月份（当月第一天）")
+    consumption = Column(Float, nullable=False, comment="当月能耗合计(kWh)")
+    cost = Column(Float, comment="当月电费合计(元)")
+    reading_count = Column(Integer, nullable=False, comment="已归档的原始读数条数")
+
+    __table_args__ = (
+        Index("ix_monthly_readings_user_month", "user_id", "month"),
+    )
+
+class DataVersion(Base):
+    """用户数据版本（用于ETag）：每类数据写入时在同一事务中递增，读取版本只需按主键查这一行"""
+    __tablename__ = "data_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    readings = Column(Integer, nullable=False, default=0, server_default="0", comment="能耗读数")
+    intervals = Column(Integer, nullable=False, default=0, server_default="0", comment="分时读数")
+    devices = Column(Integer, nullable=False, default=0, server_default="0", comment="设备")
+    recommendations = Column(Integer, nullable=False, default=0, server_default="0", comment="节能建议")
+
+class ShardAssignment(Base):
+    """分片目录（仅主库使用）：指定用户所属分片，覆盖一致性哈希的结果"""
+    __tablename__ = "shard_directory"
+
+    user_id = Column(Integer, primary_key=True)
+    shard = Column(String(50), nullable=False)
+    state = Column(String(20), nullable=False, default="active", comment="active / moving")
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
 class Recommendation(Base):
     __tablename__ = "recommendations"
@@ -93,6 +161,11 @@ class Recommendation(Base):
     analysis_end_date = Column(Date, comment="分析结束日期")
     source = Column(String(20), default="rule_based", comment="建议来源: rule_based, ai_based")  # 新增
 
+    __table_args__ = (
+        # 建议去重（同名、同来源）和按用户查询
+        Index("ix_recommendations_user_title_source", "user_id", "title", "source"),
+    )
+
 class EnergyBenchmark(Base):
     __tablename__ = "energy_benchmarks"
 
@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+import logging
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 性能分析说明：
+# 按需开启——请求携带管理员令牌（X-Profile 请求头或 ?profile= 参数），或按采样率随机抽取。
+# 默认使用采样分析器：后台线程定期抓取 sys._current_frames()，只保留包含本应用代码的线程栈，
+# 同步路由在线程池中执行，因此并发请求较多时可能混入同时段其他请求的样本。
+# 不支持帧采样的解释器（或 PROFILING_MODE=cprofile）回退到 cProfile，仅能得到调用者;被调用者两级栈。
+# 结果为火焰图工具可直接使用的折叠栈格式（"帧1;帧2;帧3 样本数"），按请求ID保存。
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(APP_DIR):
+        filename = os.path.relpath(filename, APP_DIR)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """定期采样所有线程的调用栈，累计为折叠栈"""
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True, name="stack-sampler")
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            labels = []
+            in_app = False
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename.startswith(APP_DIR):
+                    in_app = True
+                labels.append(_frame_label(code))
+                frame = frame.f_back
+            # 空闲的工作线程和事件循环不包含应用代码，直接跳过
+            if not in_app:
+                continue
+            stack = ";".join(reversed(labels))
+            self.counts[stack] = self.counts.get(stack, 0) + 1
+            self.samples += 1
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self._sample()
+
+    def stop(self) -> Dict[str, int]:
+        self._stop_event.set()
+        self.join()
+        return self.counts
+
+
+class CProfileSession:
+    """cProfile回退方案：只分析当前线程，输出调用者;被调用者两级折叠栈（单位：微秒）"""
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.samples = 0
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self) -> Dict[str, int]:
+        self.profiler.disable()
+        stats = pstats.Stats(self.profiler)
+        counts: Dict[str, int] = {}
+        for (filename, lineno, name), (_, _, tottime, _, callers) in stats.stats.items():
+            callee = f"{name} ({os.path.basename(filename)}:{lineno})"
+            if not callers:
+                counts[callee] = counts.get(callee, 0) + int(tottime * 1_000_000)
+                continue
+            for (caller_file, caller_line, caller_name), caller_stats in callers.items():
+                caller = f"{caller_name} ({os.path.basename(caller_file)}:{caller_line})"
+                key = f"{caller};{callee}"
+                counts[key] = counts.get(key, 0) + int(caller_stats[2] * 1_000_000)
+        self.samples = sum(counts.values())
+        return {stack: value for stack, value in counts.items() if value > 0}
+
+
+class ProfileStore:
+    """按请求ID保存最近的分析结果，可选同时写入目录"""
+
+    def __init__(self, max_profiles: int = 50, directory: Optional[str] = None):
+        self.max_profiles = max_profiles
+        self.directory = directory
+        self._profiles: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, request_id: str, info: dict, counts: Dict[str, int]):
+        collapsed = "\n".join(f"{stack} {count}" for stack, count in sorted(counts.items())) + "\n"
+        with self._lock:
+            self._profiles[request_id] = {**info, "collapsed": collapsed}
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(os.path.join(self.directory, f"{request_id}.folded"), "w", encoding="utf-8") as f:
+                    f.write(collapsed)
+            except OSError as e:
+                logger.warning("保存性能分析结果失败: %s", e)
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            return [
+                {key: value for key, value in profile.items() if key != "collapsed"}
+                for profile in reversed(self._profiles.values())
+            ]
+
+    def get_collapsed(self, request_id: str) -> Optional[str]:
+        with self._lock:
+            profile = self._profiles.get(request_id)
+        if profile is not None:
+            return profile["collapsed"]
+
+        # 内存中已淘汰时从目录读取（请求ID仅允许十六进制和连字符，防止路径穿越）
+        if self.directory and request_id.replace("-", "").isalnum():
+            path = os.path.join(self.directory, f"{request_id}.folded")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    return f.read()
+        return None
+
+
+profile_store = ProfileStore(
+    max_profiles=int(os.getenv("PROFILING_MAX_PROFILES", 50)),
+    directory=os.getenv("PROFILING_DIR") or None
+)
+
+
+class ProfilingMiddleware:
+    """按需性能分析中间件（纯ASGI中间件）"""
+
+    def __init__(self, app, admin_token: Optional[str] = None, sample_rate: float = 0.0,
+                 interval: float = 0.005, mode: str = "sampling", store: ProfileStore = profile_store):
+        self.app = app
+        self.admin_token = admin_token.encode() if admin_token else None
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.store = store
+        # 解释器不支持帧采样时回退到cProfile
+        self.mode = mode if hasattr(sys, "_current_frames") else "cprofile"
+
+    def _requested(self, scope) -> bool:
+        """请求是否携带了有效的管理员分析令牌"""
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return secrets.compare_digest(value, self.admin_token)
+        query_string = scope.get("query_string", b"")
+        if b"profile=" in query_string:
+            token = parse_qs(query_string.decode("latin-1")).get("profile", [""])[0]
+            return secrets.compare_digest(token.encode("latin-1"), self.admin_token)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # 未开启分析时只做一次判断，开销可忽略
+        triggered = self.admin_token is not None and self._requested(scope)
+        if not triggered and not (self.sample_rate and random.random() < self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = uuid.uuid4().hex
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", request_id.encode())]
+            await send(message)
+
+        if self.mode == "cprofile":
+            session = CProfileSession()
+            session.start()
+        else:
+            session = StackSampler(self.interval)
+            session.start()
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            counts = session.stop()
+            route = getattr(scope.get("route"), "path", scope.get("path"))
+            self.store.save(request_id, {
+                "request_id": request_id,
+                "method": scope["method"],
+                "path": route,
+                "status": status[0],
+                "mode": self.mode,
+                "trigger": "admin" if triggered else "sampled",
+                "duration_ms": round(elapsed * 1000, 2),
+                "samples": session.samples,
+                "created_at": time.time()
+            }, counts)
+            logger.info("已记录性能分析 %s: %s %s %.1fms", request_id, scope["method"], route, elapsed * 1000)
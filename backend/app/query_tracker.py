@@ -0,0 +1,173 @@
+import os
+import re
+import time
+import functools
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import logging
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)", re.IGNORECASE)
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|:\w+|\$\d+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """将SQL语句归一化为语句形状：去掉字面量和参数差异，合并IN列表"""
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("IN (?...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def _stack_summary(limit: int = 6) -> List[str]:
+    """当前调用栈中属于本应用的帧（跳过本模块）"""
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(APP_DIR) and not frame.filename.endswith("query_tracker.py")
+    ]
+    return [f"{os.path.relpath(f.filename, APP_DIR)}:{f.lineno} {f.name}" for f in frames[-limit:]]
+
+
+class QueryBudgetExceeded(AssertionError):
+    """查询数量超出预算"""
+    pass
+
+
+class QueryTracker:
+    """记录一段代码执行的SQL语句，识别重复的语句形状（N+1查询）"""
+
+    def __init__(self, capture_stacks: bool = False):
+        self.capture_stacks = capture_stacks
+        self.statements: List[Tuple[str, float]] = []
+        self.stacks: Dict[str, List[str]] = {}
+
+    def record(self, statement: str, elapsed: float):
+        shape = normalize_statement(statement)
+        self.statements.append((shape, elapsed))
+        if self.capture_stacks and shape not in self.stacks:
+            self.stacks[shape] = _stack_summary()
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def total_time(self) -> float:
+        return sum(elapsed for _, elapsed in self.statements)
+
+    def shape_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for shape, _ in self.statements:
+            counts[shape] = counts.get(shape, 0) + 1
+        return counts
+
+    def repeated(self, threshold: int = 3) -> Dict[str, int]:
+        """执行次数达到阈值的语句形状（疑似循环查询）"""
+        return {shape: count for shape, count in self.shape_counts().items() if count >= threshold}
+
+    def report(self, threshold: int = 3) -> str:
+        lines = [f"共执行{self.count}条SQL，耗时{self.total_time * 1000:.1f}ms"]
+        for shape, count in sorted(self.repeated(threshold).items(), key=lambda item: -item[1]):
+            lines.append(f"  重复{count}次: {shape[:200]}")
+            for frame in self.stacks.get(shape, []):
+                lines.append(f"    at {frame}")
+        return "\n".join(lines)
+
+
+# 当前上下文中生效的跟踪器（支持嵌套）
+_active_trackers: ContextVar[Tuple[QueryTracker, ...]] = ContextVar("active_query_trackers", default=())
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active_trackers.get() and context is not None:
+        context._tracker_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trackers = _active_trackers.get()
+    if not trackers:
+        return
+    started = getattr(context, "_tracker_started", None)
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    for tracker in trackers:
+        tracker.record(statement, elapsed)
+
+
+@contextmanager
+def track_queries(capture_stacks: bool = False):
+    """在上下文内记录执行的SQL语句"""
+    tracker = QueryTracker(capture_stacks)
+    token = _active_trackers.set(_active_trackers.get() + (tracker,))
+    try:
+        yield tracker
+    finally:
+        _active_trackers.reset(token)
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, max_repeats: Optional[int] = None):
+    """
+        断言上下文内执行的SQL数量不超过预算（用于测试），例如：
+
+            with assert_query_budget(2):
+                get_energy_analysis(db, user_id)
+
+        max_repeats: 同一语句形状允许的最大执行次数，用于发现循环查询
+    """
+    with track_queries(capture_stacks=True) as tracker:
+        yield tracker
+
+    problems = []
+    if tracker.count > max_queries:
+        problems.append(f"SQL数量{tracker.count}超出预算{max_queries}")
+    if max_repeats is not None and tracker.repeated(max_repeats + 1):
+        problems.append(f"同一语句形状执行超过{max_repeats}次")
+    if problems:
+        raise QueryBudgetExceeded("；".join(problems) + "\n" + tracker.report(max_repeats + 1 if max_repeats else 2))
+
+
+def query_budget(max_queries: int, max_repeats: Optional[int] = None):
+    """装饰器形式的查询预算断言"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with assert_query_budget(max_queries, max_repeats):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class QueryTrackingMiddleware:
+    """开发模式中间件：记录每个请求的SQL，发现重复语句形状时输出告警及调用栈摘要"""
+
+    def __init__(self, app, threshold: int = 3, max_queries: Optional[int] = None):
+        self.app = app
+        self.threshold = threshold
+        self.max_queries = max_queries
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries(capture_stacks=True) as tracker:
+            await self.app(scope, receive, send)
+
+        repeated = tracker.repeated(self.threshold)
+        too_many = self.max_queries is not None and tracker.count > self.max_queries
+        if repeated or too_many:
+            route = getattr(scope.get("route"), "path", scope.get("path"))
+            logger.warning("疑似N+1查询 %s %s\n%s", scope["method"], route, tracker.report(self.threshold))
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+
+from .. import schemas, dependencies
+from ..admission import admission
+from ..etag import make_etag, not_modified
+from ..services import dashboard as dashboard_service
+from ..sharding import ShardMovingError, shard_moving_exception
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# 仪表盘：一次请求返回所需的全部区块，各区块并发计算
+@router.get("", dependencies=[Depends(admission("analysis"))])
+async def get_dashboard(
+    request: Request,
+    fields: Optional[str] = None,
+    period: schemas.AnalysisPeriod = schemas.AnalysisPeriod.current_month,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    detail: bool = False,
+    limit: int = 100,
+    current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
+    db: Session = Depends(dependencies.get_current_user_db)
+):
+    """
+        获取仪表盘数据
+
+        参数：
+        - fields: 逗号分隔的区块（analysis, benchmark, devices, recommendations, sources），默认全部
+        - period/start_date/end_date/detail: 同能耗分析接口
+        - limit: 设备和建议列表的最大条数
+
+        返回：
+        - {区块名: 数据}；计算失败的区块不返回，并在 errors 中说明
+    """
+    try:
+        names = dashboard_service.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    params = dashboard_service.DashboardParams(period, start_date, end_date, detail, limit)
+
+    def versions():
+        try:
+            return dashboard_service.section_versions(db, current_user.id, names, params)
+        finally:
+            # 各区块使用各自的会话，先归还请求的连接，每个请求最多同时占用区块数个连接
+            db.close()
+
+    # 数据版本 + 所选区块和参数决定ETag，命中时不计算任何区块
+    version = await run_in_threadpool(versions)
+    etag = make_etag("dashboard", current_user.id, ",".join(names), period.value, start_date, end_date, detail, limit, *version)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    results = await asyncio.gather(
+        *(run_in_threadpool(dashboard_service.compute_section, name, current_user.id, params) for name in names),
+        return_exceptions=True
+    )
+
+    content, errors = {}, {}
+    for name, result in zip(names, results):
+        if isinstance(result, HTTPException):
+            raise result
+        if isinstance(result, ShardMovingError):
+            raise shard_moving_exception()
+        if isinstance(result, Exception):
+            logger.error("仪表盘区块[%s]计算失败: user_id=%s, %s", name, current_user.id, result, exc_info=result)
+            errors[name] = "计算失败"
+        else:
+            content[name] = result
+    if errors:
+        # 部分区块失败时不缓存
+        content["errors"] = errors
+        return ORJSONResponse(content)
+    return ORJSONResponse(content, headers={"ETag": etag})
@@ -1,30 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from typing import List
 from .. import schemas, dependencies
-from ..database import get_db
+from ..etag import make_etag, not_modified
 from ..crud import devices as devices_crud
 
 router = APIRouter()
 
 # 获取设备 by 当前用户
-@router.get("/my-devices", response_model=List[schemas.DeviceResponse])
+@router.get("/my-devices", response_model=List[schemas.DeviceResponse], response_class=ORJSONResponse)
 def read_devices(
+    request: Request,
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(dependencies.get_current_user_db)
 ):
     # devices = crud.get_devices_by_user(db, user_id=user_id, skip=skip, limit=limit)
-    devices = devices_crud.get_devices_by_user(db, user_id=current_user.id, skip=skip, limit=limit)
-    return devices
+    # 数据未变化时直接返回304
+    version = devices_crud.get_data_version(db, current_user.id)
+    etag = make_etag("devices", current_user.id, *version, skip, limit)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    # 快速读取路径：直接返回字典行，由orjson序列化，跳过逐条的响应模型校验
+    devices = devices_crud.get_device_rows_by_user(db, user_id=current_user.id, skip=skip, limit=limit)
+    return ORJSONResponse(devices, headers={"ETag": etag})
 
 # 新增设备
 @router.post("/", response_model=schemas.DeviceResponse)
 def create_device(
     device: schemas.DeviceCreate,
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(dependencies.get_current_user_db)
 ):
     return devices_crud.create_device(db, device=device, user_id=current_user.id)
 
@@ -32,13 +42,19 @@ def create_device(
 @router.get("/{device_id}", response_model=schemas.DeviceResponse)
 def read_device(
     device_id: int,
-    db: Session = Depends(get_db)
+    current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
+    db: Session = Depends(dependencies.get_current_user_db)
 ):
+    # 设备ID在各分片上独立分配，只在当前用户所属分片上查找
     db_device = devices_crud.get_device(db, device_id=device_id)
 
     if db_device is None:
         raise HTTPException(status_code=404, detail="设备不存在")
 
+    # 只能查看自己的设备
+    if db_device.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="无权查看此设备")
+
     return db_device
 
 # 更新设备
@@ -46,7 +62,7 @@ def read_device(
 def update_device(
     device_id: int,
     device_update: schemas.DeviceUpdate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(dependencies.get_current_user_db),
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
 ):
     return devices_crud.update_device(db, device_id=device_id, device_update=device_update, user_id=current_user.id)
@@ -54,7 +70,7 @@ def update_device(
 @router.delete("/{device_id}")
 def delete_device(
     device_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(dependencies.get_current_user_db),
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
 ):
     devices_crud.delete_device(db, device_id=device_id, user_id=current_user.id)
\ No newline at end of file
@@ -1,34 +1,152 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import date
+from datetime import date, timedelta
 from .. import schemas, dependencies
-from ..database import get_db
+from ..admission import admission
+from ..etag import make_etag, not_modified
 from ..services import data_processing as data_processing
+from ..services import intervals as intervals_service
+from ..services.ingest_buffer import IngestBufferClosed, IngestBufferFull, get_ingest_buffer
+from ..services import live_updates
+from ..services.tariff import get_tariff
 from ..crud import energy_readings as energy_readings_crud
+from ..sharding import ShardMovingError, shard_moving_exception
+from ..utils import LIVE_TOKEN_EXPIRE_SECONDS, LIVE_TOKEN_SCOPE, create_access_token
 
 router = APIRouter()
 
 # 获取能耗读数 by 当前用户
-@router.get("/my-energy-reading", response_model=List[schemas.EnergyReadingResponse])
+@router.get("/my-energy-reading", response_model=List[schemas.EnergyReadingResponse], response_class=ORJSONResponse)
 def read_energy_readings(
+    request: Request,
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(dependencies.get_current_user_db)
 ):
-    return energy_readings_crud.get_energy_readings_by_user(db, current_user.id, start_date=start_date, end_date=end_date, skip=skip, limit=limit)
+    # 数据未变化时直接返回304
+    version = energy_readings_crud.get_data_version(db, current_user.id)
+    etag = make_etag("readings", current_user.id, *version, start_date, end_date, skip, limit)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    # 快速读取路径：直接返回字典行，由orjson序列化，跳过逐条的响应模型校验
+    readings = energy_readings_crud.get_energy_reading_rows_by_user(db, current_user.id, start_date=start_date, end_date=end_date, skip=skip, limit=limit)
+    return ORJSONResponse(readings, headers={"ETag": etag})
 
 # 新增能耗读数
 @router.post("/", response_model=schemas.EnergyReadingResponse)
-def create_energy_reading(
+async def create_energy_reading(
     reading: schemas.EnergyReadingCreate,
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(dependencies.get_current_user_db)
+):
+    buffer = get_ingest_buffer()
+    if buffer is None:
+        return await run_in_threadpool(energy_readings_crud.create_energy_reading, db, reading=reading, user_id=current_user.id)
+
+    def submit():
+        # 先归还认证时取出的数据库连接，等待批次提交期间不占用连接
+        db.close()
+        return buffer.submit(current_user.id, reading)
+
+    # 成组提交：等待读数所在批次提交后返回，等待期间不占用线程池
+    try:
+        future = await run_in_threadpool(submit)
+    except (IngestBufferFull, IngestBufferClosed):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="读数写入繁忙，请稍后再试",
+            headers={"Retry-After": "1"}
+        )
+    except ShardMovingError:
+        raise shard_moving_exception()
+    return await asyncio.wrap_future(future)
+
+# 批量上报能耗读数：按自然键幂等写入（网关重试不会重复计数），一个事务
+@router.post("/bulk", response_model=List[schemas.EnergyReadingResponse])
+def create_energy_readings_bulk(
+    readings: List[schemas.EnergyReadingCreate],
+    current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
+    db: Session = Depends(dependencies.get_current_user_db)
+):
+    if len(readings) > 5000:
+        raise HTTPException(status_code=400, detail="一次最多上报5000条读数")
+    rows = [dict(reading.model_dump(), user_id=current_user.id) for reading in readings]
+    ids = [reading.id for reading in energy_readings_crud.create_energy_readings(db, rows)]
+    db.commit()
+    live_updates.notify_rows(rows)
+    return energy_readings_crud.get_energy_readings_by_ids(db, ids)
+
+# 签发实时推送令牌：EventSource 只能把令牌放在URL中，使用短期、只能用于推送连接的令牌代替登录令牌
+@router.post("/live/token", response_model=schemas.LiveTokenResponse)
+def create_live_token(current_user: schemas.UserResponse = Depends(dependencies.get_current_user)):
+    token = create_access_token(
+        data={"sub": str(current_user.id), "scope": LIVE_TOKEN_SCOPE},
+        expires_delta=timedelta(seconds=LIVE_TOKEN_EXPIRE_SECONDS)
+    )
+    return {"access_token": token, "expires_in": LIVE_TOKEN_EXPIRE_SECONDS}
+
+# 实时推送（Server-Sent Events）：连接后先推送快照（本月合计、基准比较、数据版本），
+# 之后每次读数变化推送增量（变化日期的日读数、新的合计和基准比较），客户端不再需要轮询分析接口；
+# 认证令牌到期时推送 closed 并断开，客户端重新获取推送令牌后重连
+@router.get("/live")
+async def live_energy_updates(request: Request, current_user: schemas.UserResponse = Depends(dependencies.get_stream_user)):
+    live = live_updates.get_live_updates()
+    try:
+        subscription = live.subscribe(current_user.id)
+    except live_updates.TooManySubscriptions:
+        raise HTTPException(status_code=429, detail="实时推送连接数过多", headers={"Retry-After": "5"})
+
+    try:
+        first = await run_in_threadpool(live_updates.snapshot, current_user.id)
+    except Exception as e:
+        live.unsubscribe(subscription)
+        if isinstance(e, ShardMovingError):
+            raise shard_moving_exception()
+        raise
+
+    heartbeat = float(os.getenv("LIVE_HEARTBEAT_SECONDS", 15))
+    return StreamingResponse(
+        live_updates.event_stream(live, subscription, first, heartbeat, request.state.token_expires_at),
+        media_type="text/event-stream",
+        # 禁止代理缓冲和缓存，事件立即送达
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 上报分时读数（如智能电表15分钟读数），自动汇总为日读数
+@router.post("/intervals", response_model=schemas.IntervalIngestResult)
+def ingest_interval_readings(
+    ingest: schemas.IntervalReadingIngest,
+    current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
+    db: Session = Depends(dependencies.get_current_user_db)
 ):
-    return energy_readings_crud.create_energy_reading(db, reading=reading, user_id=current_user.id)
+    try:
+        return intervals_service.ingest_intervals(db, current_user.id, ingest)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+# 获取分时读数明细
+@router.get("/intervals", response_model=List[schemas.IntervalDayResponse], response_class=ORJSONResponse)
+def read_interval_readings(
+    start_date: date,
+    end_date: date,
+    device_id: Optional[int] = None,
+    current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
+    db: Session = Depends(dependencies.get_current_user_db)
+):
+    if (end_date - start_date).days > 92:
+        raise HTTPException(status_code=400, detail="分时明细一次最多查询92天")
+    return ORJSONResponse(intervals_service.get_interval_days(db, current_user.id, start_date, end_date, device_id))
 
 # 获取能耗分析
 # @router.get("/analysis")
@@ -38,18 +156,35 @@ def create_energy_reading(
 # ):
 #     return data_processing.get_energy_analysis(db, user_id=current_user.id)
 
-@router.get("/analysis")
+@router.get("/analysis", dependencies=[Depends(admission("analysis"))])
 def get_energy_analysis(
+    request: Request,
+    response: Response,
     user_id: int,
     period: schemas.AnalysisPeriod = schemas.AnalysisPeriod.current_month,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db)
+    detail: bool = False,
+    db: Session = Depends(dependencies.get_user_db)
 ):
-    """获取能耗分析 - 支持多时间维度"""
-    return data_processing.get_energy_analysis(
+    """获取能耗分析 - 支持多时间维度，detail=true时附带分时数据的小时平均曲线"""
+
+    # 数据版本 + 实际分析日期范围 决定ETag，命中时不执行任何分析计算
+    analysis_start_date, analysis_end_date = data_processing.get_date_range_for_period(period, start_date, end_date)
+    version = data_processing.get_analysis_data_version(db, user_id)
+    etag = make_etag("analysis", user_id, period.value, analysis_start_date, analysis_end_date,
+                     get_tariff().region, detail, *version)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    response.headers["ETag"] = etag
+    analysis = data_processing.get_energy_analysis(
         db, user_id, period, start_date, end_date
     )
+    if detail:
+        analysis.hourly_profile = intervals_service.get_hourly_profile(db, user_id, analysis_start_date, analysis_end_date)
+    return analysis
 
 @router.get("/periods")
 def get_analysis_periods():
@@ -69,6 +204,6 @@ def get_analysis_periods():
 @router.get("/benchmark-comparison")
 def get_benchmark_comparison(
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(dependencies.get_current_user_db)
 ):
     return data_processing.compare_with_benchmark(db, user_id=current_user.id)
\ No newline at end of file
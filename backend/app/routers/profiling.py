@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from .. import dependencies
+from ..profiling import profile_store
+
+router = APIRouter(dependencies=[Depends(dependencies.require_admin_token)])
+
+# 最近的性能分析记录
+@router.get("/")
+def list_profiles():
+    return profile_store.list()
+
+# 按请求ID获取折叠栈（可直接用于 flamegraph.pl / speedscope）
+@router.get("/{request_id}", response_class=PlainTextResponse)
+def get_profile(request_id: str):
+    collapsed = profile_store.get_collapsed(request_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="性能分析记录不存在")
+    return PlainTextResponse(collapsed)
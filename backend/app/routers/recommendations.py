@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Response
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict
 from .. import schemas, dependencies, models
-from ..database import get_db
+from ..admission import admission
+from ..etag import make_etag, not_modified
 from ..crud import recommendations as recommendations_crud
 from datetime import date
-from ..services.ai_enhanced_recommendation_engine import AIEnhancedRecommendationEngine
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,16 +14,25 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 # 获取建议 by 当前用户
-@router.get("/my-recommendations", response_model=List[schemas.RecommendationResponse])
+@router.get("/my-recommendations", response_model=List[schemas.RecommendationResponse], response_class=ORJSONResponse)
 def read_recommendations(
+    request: Request,
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
     category: Optional[schemas.RecommendationCategory] = None,
     is_implemented: Optional[bool] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(dependencies.get_current_user_db)
 ):
-    return recommendations_crud.get_recommendations_by_user(
+    # 数据未变化时直接返回304
+    version = recommendations_crud.get_data_version(db, current_user.id)
+    etag = make_etag("recommendations", current_user.id, *version, category, is_implemented, skip, limit)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    # 快速读取路径：直接返回字典行，由orjson序列化，跳过逐条的响应模型校验
+    recommendations = recommendations_crud.get_recommendation_rows_by_user(
         db,
         user_id=current_user.id,
         category=category,
@@ -30,13 +40,14 @@ def read_recommendations(
         skip=skip,
         limit=limit
     )
+    return ORJSONResponse(recommendations, headers={"ETag": etag})
 
 # 新增能耗建议
 @router.post("/", response_model=schemas.RecommendationResponse)
 def create_recommendation(
     recommendation: schemas.RecommendationCreate,
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(dependencies.get_current_user_db)
 ):
     return recommendations_crud.create_recommendation(db, recommendation=recommendation, user_id=current_user.id)
 
@@ -46,7 +57,7 @@ def update_recommendation(
     recommendation_id: int,
     recommendation_update: schemas.RecommendationUpdate,
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(dependencies.get_current_user_db)
 ):
     return recommendations_crud.update_recommendation(
         db,
@@ -59,7 +70,7 @@ def update_recommendation(
 @router.post("/{recommendation_id}/implement")
 def mark_recommendation_implemented(
     recommendation_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(dependencies.get_current_user_db),
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user)
 ):
     recommendation = recommendations_crud.update_recommendation(
@@ -73,50 +84,53 @@ def mark_recommendation_implemented(
 
 
 
-@router.post("/ai/generate", response_model=List[schemas.RecommendationResponse])
+@router.post("/ai/generate", response_model=List[schemas.RecommendationResponse], dependencies=[Depends(admission("ai"))])
 async def generate_ai_recommendations(
         user_id: int,
+        response: Response,
         ai_provider: str = "tongyi",
         period: schemas.AnalysisPeriod = schemas.AnalysisPeriod.current_month,
         start_date: Optional[date] = None,
         end_date: Optional[date] = None,
-        db: Session = Depends(get_db)
+        db: Session = Depends(dependencies.get_user_db)
 ):
     """使用AI生成节能建议"""
 
+    # AI相关模块较重，首次使用时再导入
+    from ..services.ai_enhanced_recommendation_engine import AIEnhancedRecommendationEngine
+
     try:
         engine = AIEnhancedRecommendationEngine(db, user_id, ai_provider)
         ai_recommendations = await engine.generate_ai_recommendations(period, start_date, end_date)
+        response.headers["X-AI-Fallback"] = "true" if engine.used_fallback else "false"
+
+        # 一次查询已存在的建议（标题+来源），避免逐条查询
+        existing_keys = recommendations_crud.get_existing_recommendation_keys(
+            db, user_id, [rec.title for rec in ai_recommendations]
+        )
 
-        # 保存AI建议到数据库
-        saved_recommendations = []
+        # 保存AI建议到数据库（一次提交）
+        to_save = []
         for rec_data in ai_recommendations:
             # 检查是否已存在类似建议
-            existing = db.query(models.Recommendation).filter(
-                models.Recommendation.user_id == user_id,
-                models.Recommendation.title == rec_data.title,
-                models.Recommendation.source == rec_data.source
-            ).first()
+            existing = (rec_data.title, rec_data.source) in existing_keys
+            existing_keys.add((rec_data.title, rec_data.source))
 
             # 标记为AI生成
             if not existing:
-                db_rec = recommendations_crud.create_recommendation(db, rec_data, user_id)
-                db_rec.source = "ai_based"
-                db.commit()
-                db.refresh(db_rec)
-                saved_recommendations.append(db_rec)
+                to_save.append(rec_data.model_copy(update={"source": "ai_based"}))
             else:
-                logger.info(f"跳过已存在的建议[{rec_data.source}]: {rec_data.title}")
+                logger.debug("跳过已存在的建议[%s]: %s", rec_data.source, rec_data.title)
 
-        return saved_recommendations
+        return recommendations_crud.create_recommendations(db, to_save, user_id)
 
     except Exception as e:
-        logger.error(f"AI建议生成失败: {e}")
+        logger.error("AI建议生成失败: %s", e)
         raise HTTPException(status_code=500, detail="AI建议生成失败")
 
 
 @router.get("/sources", response_model=Dict)
-def get_recommendation_sources(user_id: int, db: Session = Depends(get_db)):
+def get_recommendation_sources(user_id: int, db: Session = Depends(dependencies.get_user_db)):
     """获取建议来源统计"""
 
     from sqlalchemy import func
@@ -5,7 +5,9 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from typing import List
 from .. import schemas, dependencies
+from ..admission import admission
 from ..database import get_db
+from ..sharding import get_shard_router
 from ..services.recommendation_engine import generate_user_recommendations
 from ..crud import users as users_crud
 from ..utils import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token
@@ -15,7 +17,10 @@ router = APIRouter()
 # 用户注册
 @router.post("/register", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
 def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    return users_crud.create_user(db=db, user=user)
+    db_user = users_crud.create_user(db=db, user=user)
+    # 账号保存在主库，同步镜像到用户所属分片
+    get_shard_router().sync_user(db_user)
+    return db_user
 
 # 用户登录
 @router.post("/login", response_model=schemas.TokenResponse)
@@ -82,11 +87,14 @@ def update_current_user(
         返回：
         - 更新后的用户信息
     """
-    return users_crud.update_user(db, user_id=current_user.id, user_update=user_update)
+    db_user = users_crud.update_user(db, user_id=current_user.id, user_update=user_update)
+    get_shard_router().sync_user(db_user)
+    return db_user
 
-@router.post("/{user_id}/generate-recommendations", response_model=List[schemas.RecommendationResponse])
+@router.post("/{user_id}/generate-recommendations", response_model=List[schemas.RecommendationResponse],
+             dependencies=[Depends(admission("recommendations"))])
 def generate_recommendations(
     current_user: schemas.UserResponse = Depends(dependencies.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(dependencies.get_current_user_db)
 ):
     return generate_user_recommendations(db, current_user.id)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import Optional, List, Dict
 from datetime import date, datetime
 from enum import Enum
@@ -135,6 +135,39 @@ class EnergyReadingResponse(EnergyReadingBase):
     class Config:
         from_attributes = True
 
+# 分时读数 - 单个时间点
+class IntervalPoint(BaseModel):
+    timestamp: datetime
+    value: float
+
+# 分时读数 - 批量上报
+class IntervalReadingIngest(BaseModel):
+    device_id: Optional[int] = None
+    interval_minutes: int = Field(15, description="时段长度(分钟)，需能整除60（如15）或为能整除1440的整小时数（如120）")
+    points: List[IntervalPoint]
+
+    @field_validator("interval_minutes")
+    @classmethod
+    def check_interval(cls, value: int) -> int:
+        # 按小时汇总要求时段不跨越整点：小时内均分，或由整数个小时组成
+        if value <= 0 or 1440 % value != 0 or (60 % value != 0 and value % 60 != 0):
+            raise ValueError("时段长度需能整除60分钟，或为能整除1440分钟的整小时数")
+        return value
+
+# 分时读数 - 上报结果
+class IntervalIngestResult(BaseModel):
+    days: int
+    points: int
+    daily_readings: int
+
+# 分时读数 - 按天响应
+class IntervalDayResponse(BaseModel):
+    reading_date: date
+    device_id: Optional[int] = None
+    interval_minutes: int
+    values: List[Optional[float]]
+    total: float
+
 # 建议模型 - 基础
 class RecommendationBase(BaseModel):
     title: str
@@ -187,6 +220,10 @@ class TokenResponse(BaseModel):
     token_type: str
     user: UserResponse
 
+class LiveTokenResponse(BaseModel):
+    access_token: str
+    expires_in: int
+
 class TokenData(BaseModel):
     username: Optional[str] = None
 
@@ -211,6 +248,7 @@ class EnergyAnalysis(BaseModel):
     start_date: Optional[date] = None
     end_date: Optional[date] = None
     period_comparison: Optional[Dict] = None    # 与上个周期对比
+    hourly_profile: Optional[List[float]] = None  # 分时明细：周期内各小时平均用电量(kWh)，仅在请求明细时返回
 
 class BenchmarkComparison(BaseModel):
     user_consumption: float
@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import asyncio
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Callable, Dict, List, Optional
+from sqlalchemy.orm import Session
+from .. import models, schemas
+from .ai_base_service import ANALYSIS_SYSTEM_PROMPT, RECOMMENDATION_SYSTEM_PROMPT, parse_ai_response
+from .ai_enhanced_recommendation_engine import AIEnhancedRecommendationEngine
+from .prompt_builder import PromptBuilder
+from ..crud import data_versions, recommendations as recommendations_crud
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 批量请求类型
+ANALYSIS = "analysis"
+RECOMMENDATION = "recommendation"
+
+# 各类型请求的系统提示词和温度
+_REQUEST_SETTINGS = {
+    ANALYSIS: (ANALYSIS_SYSTEM_PROMPT, 0.3),
+    RECOMMENDATION: (RECOMMENDATION_SYSTEM_PROMPT, 0.7),
+}
+
+
+def make_custom_id(kind: str, user_id: int) -> str:
+    return f"{kind}-{user_id}"
+
+
+def parse_custom_id(custom_id: str):
+    kind, _, user_id = custom_id.rpartition("-")
+    return kind, int(user_id)
+
+
+class BatchAIProvider(ABC):
+    """AI批量接口基类"""
+
+    model = "batch"
+
+    def build_request(self, custom_id: str, kind: str, prompt: str) -> Dict:
+        """构建批量请求文件中的一行（OpenAI兼容格式）"""
+        system_prompt, temperature = _REQUEST_SETTINGS[kind]
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt}
+                ],
+                "max_tokens": 2000,
+                "temperature": temperature,
+                "response_format": {"type": "json_object"}
+            }
+        }
+
+    @abstractmethod
+    async def submit(self, input_path: str) -> str:
+        """提交批量请求文件，返回批次ID"""
+        pass
+
+    @abstractmethod
+    async def poll(self, batch_id: str) -> str:
+        """查询批次状态: in_progress / completed / failed"""
+        pass
+
+    @abstractmethod
+    async def fetch_results(self, batch_id: str) -> Dict[str, str]:
+        """获取批次结果: custom_id -> 模型返回内容"""
+        pass
+
+
+class TongYiBatchProvider(BatchAIProvider):
+    """通义千问批量接口（OpenAI兼容的Files/Batches接口）"""
+
+    _STATUS_MAPPING = {
+        "completed": "completed",
+        "failed": "failed",
+        "expired": "failed",
+        "cancelled": "failed",
+    }
+
+    def __init__(self):
+        from openai import AsyncOpenAI
+        self.model = os.getenv("DEFAULT_ALI_MODEL", "qwen-plus")
+        self.client = AsyncOpenAI(
+            api_key=os.getenv("DASHSCOPE_API_KEY"),
+            base_url=os.getenv("ALI_BASE_URL")
+        )
+
+    async def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as f:
+            input_file = await self.client.files.create(file=f, purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info("已提交通义千问批量任务: %s", batch.id)
+        return batch.id
+
+    async def poll(self, batch_id: str) -> str:
+        batch = await self.client.batches.retrieve(batch_id)
+        return self._STATUS_MAPPING.get(batch.status, "in_progress")
+
+    async def fetch_results(self, batch_id: str) -> Dict[str, str]:
+        batch = await self.client.batches.retrieve(batch_id)
+        if not batch.output_file_id:
+            return {}
+        content = await self.client.files.content(batch.output_file_id)
+
+        results = {}
+        for line in content.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            results[item["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        return results
+
+
+def _default_local_responder(custom_id: str, body: Dict) -> str:
+    """本地批量接口的默认应答：返回固定的合法JSON"""
+    kind, user_id = parse_custom_id(custom_id)
+    if kind == ANALYSIS:
+        return json.dumps({
+            "overall_assessment": "能耗水平整体正常",
+            "key_insights": ["空调为主要能耗来源"],
+            "efficiency_level": "中",
+            "main_consumption_sources": "空调、热水器",
+            "seasonal_impact": "季节变化对能耗影响明显"
+        }, ensure_ascii=False)
+    return json.dumps({
+        "recommendations": [{
+            "title": "错峰使用大功率电器",
+            "description": "将洗衣、热水等大功率用电安排在低谷时段。",
+            "category": "生活习惯",
+            "estimated_saving": 20.0,
+            "estimated_cost_saving": 10.0,
+            "implementation_difficulty": "低",
+            "reasoning": "主要能耗集中在高峰时段"
+        }]
+    }, ensure_ascii=False)
+
+
+class LocalBatchProvider(BatchAIProvider):
+    """本地批量接口替身 - 离线处理批量文件，用于测试"""
+
+    def __init__(self, responder: Optional[Callable[[str, Dict], str]] = None, polls_until_done: int = 1):
+        self.responder = responder or _default_local_responder
+        self.polls_until_done = polls_until_done
+        self.batches: Dict[str, Dict] = {}
+
+    async def submit(self, input_path: str) -> str:
+        with open(input_path, encoding="utf-8") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        batch_id = f"local-batch-{len(self.batches) + 1}"
+        self.batches[batch_id] = {"requests": requests, "polls": 0}
+        return batch_id
+
+    async def poll(self, batch_id: str) -> str:
+        batch = self.batches[batch_id]
+        batch["polls"] += 1
+        return "completed" if batch["polls"] >= self.polls_until_done else "in_progress"
+
+    async def fetch_results(self, batch_id: str) -> Dict[str, str]:
+        return {
+            request["custom_id"]: self.responder(request["custom_id"], request["body"])
+            for request in self.batches[batch_id]["requests"]
+        }
+
+
+class AIBatchRunner:
+    """
+        AI批量生成任务（用于夜间为全部用户刷新建议）
+
+        将所有用户的提示词写入JSONL批量请求文件，通过批量接口提交并轮询结果，
+        再将结果映射回用户并批量保存。
+    """
+
+    def __init__(self, db: Session, provider: BatchAIProvider,
+                 poll_interval: float = 30, max_wait: float = 24 * 3600,
+                 work_dir: Optional[str] = None):
+        self.db = db
+        self.provider = provider
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self.work_dir = work_dir or tempfile.gettempdir()
+        self.prompt_builder = PromptBuilder()
+
+    async def run(self, user_ids: List[int],
+                  period: schemas.AnalysisPeriod = schemas.AnalysisPeriod.current_month,
+                  start_date: Optional[date] = None,
+                  end_date: Optional[date] = None) -> Dict[int, List[models.Recommendation]]:
+        """执行批量生成，返回每个用户新保存的建议"""
+
+        # 构建每个用户的分析提示词
+        engines: Dict[int, AIEnhancedRecommendationEngine] = {}
+        analyses: Dict[int, schemas.EnergyAnalysis] = {}
+        analysis_prompts: Dict[int, str] = {}
+        for user_id in user_ids:
+            engine = AIEnhancedRecommendationEngine(self.db, user_id, offline=True)
+            inputs = engine.build_ai_inputs(period, start_date, end_date)
+            if inputs is None:
+                continue
+            energy_analysis, user_data, energy_data = inputs
+            if energy_analysis.total_consumption <= 0:
+                continue
+            engines[user_id] = engine
+            analyses[user_id] = energy_analysis
+            analysis_prompts[user_id] = self.prompt_builder.build_analysis_prompt(user_data, energy_data)
+
+        logger.info("批量分析请求数量: %d", len(analysis_prompts))
+        analysis_contents = await self._run_batch(ANALYSIS, analysis_prompts)
+
+        # 根据分析结果构建建议提示词
+        recommendation_prompts: Dict[int, str] = {}
+        for user_id, content in analysis_contents.items():
+            analysis_result = parse_ai_response(content)
+            if "error" in analysis_result:
+                logger.warning("用户%s的批量分析结果无效", user_id)
+                continue
+            recommendation_prompts[user_id] = self.prompt_builder.build_recommendation_prompt(analysis_result)
+
+        logger.info("批量建议请求数量: %d", len(recommendation_prompts))
+        recommendation_contents = await self._run_batch(RECOMMENDATION, recommendation_prompts)
+
+        # 转换为系统推荐格式
+        converted: Dict[int, List[schemas.RecommendationCreate]] = {}
+        for user_id, content in recommendation_contents.items():
+            ai_recommendations = parse_ai_response(content).get("recommendations", [])
+            engine = engines[user_id]
+            converted[user_id] = [
+                rec for rec in (
+                    engine._convert_ai_recommendation(ai_rec, energy_analysis=analyses[user_id])
+                    for ai_rec in ai_recommendations
+                ) if rec
+            ]
+
+        return self._bulk_persist(converted)
+
+    async def _run_batch(self, kind: str, prompts: Dict[int, str]) -> Dict[int, str]:
+        """写入批量文件、提交并轮询，返回 user_id -> 模型返回内容"""
+        if not prompts:
+            return {}
+
+        fd, input_path = tempfile.mkstemp(prefix=f"ai_batch_{kind}_", suffix=".jsonl", dir=self.work_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for user_id, prompt in prompts.items():
+                    request = self.provider.build_request(make_custom_id(kind, user_id), kind, prompt)
+                    f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+            batch_id = await self.provider.submit(input_path)
+            deadline = time.monotonic() + self.max_wait
+            while True:
+                status = await self.provider.poll(batch_id)
+                if status == "completed":
+                    break
+                if status == "failed":
+                    logger.error("批量任务失败: %s", batch_id)
+                    return {}
+                if time.monotonic() > deadline:
+                    logger.error("批量任务超时: %s", batch_id)
+                    return {}
+                await asyncio.sleep(self.poll_interval)
+
+            results = await self.provider.fetch_results(batch_id)
+        finally:
+            os.remove(input_path)
+
+        contents = {}
+        for custom_id, content in results.items():
+            result_kind, user_id = parse_custom_id(custom_id)
+            if result_kind == kind and user_id in prompts:
+                contents[user_id] = content
+        return contents
+
+    def _bulk_persist(self, converted: Dict[int, List[schemas.RecommendationCreate]]) -> Dict[int, List[models.Recommendation]]:
+        """批量保存建议（跳过已存在的同名AI建议），单次提交"""
+        if not converted:
+            return {}
+
+        existing = recommendations_crud.get_existing_ai_recommendation_keys(self.db, list(converted.keys()))
+
+        saved: Dict[int, List[models.Recommendation]] = {}
+        for user_id, recommendations in converted.items():
+            for rec_data in recommendations:
+                if (user_id, rec_data.title) in existing:
+                    continue
+                existing.add((user_id, rec_data.title))
+                db_rec = models.Recommendation(**rec_data.model_dump(), user_id=user_id)
+                self.db.add(db_rec)
+                saved.setdefault(user_id, []).append(db_rec)
+
+        data_versions.bump(self.db, saved.keys(), "recommendations")
+        self.db.commit()
+        logger.info("批量保存AI建议: %d条，涉及%d个用户", sum(len(v) for v in saved.values()), len(saved))
+        return saved
+
+
+def create_batch_provider(name: str) -> BatchAIProvider:
+    """创建批量接口实例"""
+    if name == "tongyi":
+        return TongYiBatchProvider()
+    if name == "local":
+        return LocalBatchProvider()
+    raise ValueError(f"未知的批量接口: {name}")
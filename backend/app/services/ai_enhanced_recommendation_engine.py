@@ -1,9 +1,11 @@
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from .. import schemas, models
 from .recommendation_engine import RecommendationEngine
 import logging
 from .ai_service_factory import AIServiceFactory
+from .ai_base_service import AIBaseService
+from .tariff import get_tariff
 
 logger = logging.getLogger(__name__)
 
@@ -11,11 +13,14 @@ logger = logging.getLogger(__name__)
 class AIEnhancedRecommendationEngine(RecommendationEngine):
     """AI增强的推荐引擎 - 支持多时间维度"""
 
-    def __init__(self, db: Session, user_id: int, ai_provider: str = "tongyi"):
+    def __init__(self, db: Session, user_id: int, ai_provider: str = "tongyi",
+                 ai_service: Optional[AIBaseService] = None, offline: bool = False):
         super().__init__(db, user_id)
-        self.ai_service = AIServiceFactory.create_service(ai_provider)
+        # offline：批量任务只构建输入和转换结果，不创建交互式AI服务
+        self.ai_service = None if offline else (ai_service or AIServiceFactory.create_service(ai_provider))
         self.use_ai = self.ai_service is not None
-        logger.info(f"AI服务初始化: 使用{ai_provider}，可用性: {self.use_ai}")
+        self.used_fallback = False  # 最近一次生成是否回退到规则引擎
+        logger.debug("AI服务初始化: 使用%s，可用性: %s", ai_provider, self.use_ai)
 
     async def generate_ai_recommendations(
             self,
@@ -25,80 +30,43 @@ class AIEnhancedRecommendationEngine(RecommendationEngine):
     ) -> List[schemas.RecommendationCreate]:
         """使用AI生成推荐建议 - 支持多时间维度"""
 
-        logger.info(f"开始生成AI建议，AI服务可用: {self.use_ai}，分析周期: {period}")
+        logger.info("开始生成AI建议，AI服务可用: %s，分析周期: %s", self.use_ai, period)
+        self.used_fallback = True
 
         if not self.use_ai:
             logger.warning("AI服务不可用，回退到规则引擎")
             return self.generate_recommendations(period, start_date, end_date)
 
         try:
-            # 获取用户数据
-            user = self.db.query(models.User).filter(models.User.id == self.user_id).first()
-            if not user:
-                logger.warning("未找到用户，无法生成AI建议")
+            inputs = self.build_ai_inputs(period, start_date, end_date)
+            if inputs is None:
                 return []
-
-            # 获取能耗分析数据（支持多时间维度）
-            from .data_processing import get_energy_analysis
-            energy_analysis = get_energy_analysis(self.db, self.user_id, period, start_date, end_date)
-
-            logger.info(f"获取到{energy_analysis.analysis_period}能耗分析数据: 总能耗{energy_analysis.total_consumption}kWh")
-
-            # 添加详细的类型和属性检查
-            logger.info(f"energy_analysis 对象类型: {type(energy_analysis)}")
+            energy_analysis, user_data, energy_data = inputs
 
             # 检查数据有效性
             if energy_analysis.total_consumption <= 0:
                 logger.warning("能耗数据为零或无效，无法生成AI建议")
                 return self._generate_fallback_recommendations()
 
-            # 构建时间范围信息
-            time_range_info = self._build_time_range_info(energy_analysis)
-
-            # 构建用户数据
-            user_data = {
-                "family_size": user.family_size,
-                "house_size": user.house_size,
-                "full_name": user.full_name,
-                "season": self._get_current_season(),
-                "analysis_period": energy_analysis.analysis_period,
-                "period_days": energy_analysis.period_days,
-                "start_date": energy_analysis.start_date.isoformat() if energy_analysis.start_date else None,
-                "end_date": energy_analysis.end_date.isoformat() if energy_analysis.end_date else None,
-                "time_range_description": time_range_info["description"]
-            }
-
-            # 转换能耗数据为字典
-            energy_data = {
-                "total_consumption": energy_analysis.total_consumption,
-                "average_daily_consumption": energy_analysis.average_daily_consumption,
-                "cost_analysis": energy_analysis.cost_analysis,
-                "comparison_with_benchmark": energy_analysis.comparison_with_benchmark,
-                "device_breakdown": energy_analysis.device_breakdown,
-                "monthly_trend": energy_analysis.monthly_trend,
-                "period_comparison": energy_analysis.period_comparison,
-                "time_range": time_range_info
-            }
-
             # 使用AI分析能耗
-            logger.info("开始调用AI分析能耗...")
+            logger.debug("开始调用AI分析能耗...")
             analysis_result = await self.ai_service.analyze_energy_consumption(
                 user_data, energy_data
             )
 
-            logger.info(f"AI分析结果: {analysis_result}")
+            logger.debug("AI分析结果: %s", analysis_result)
 
             if "error" in analysis_result:
-                logger.error(f"AI分析失败: {analysis_result['error']}")
+                logger.error("AI分析失败: %s", analysis_result['error'])
                 return self.generate_recommendations(period, start_date, end_date)
 
             # 使用AI生成建议
-            logger.info("开始调用AI生成建议...")
+            logger.debug("开始调用AI生成建议...")
             ai_recommendations = await self.ai_service.generate_recommendations(
                 analysis_result
             )
 
-            logger.info(f"AI生成建议数量: {len(ai_recommendations)}")
+            logger.debug("AI生成建议数量: %d", len(ai_recommendations))
 
             # 转换为系统推荐格式
             recommendations = []
@@ -108,16 +76,18 @@ class AIEnhancedRecommendationEngine(RecommendationEngine):
                 if recommendation:
                     recommendations.append(recommendation)
 
-            logger.info(f"转换后的AI建议数量: {len(recommendations)}")
+            logger.info("转换后的AI建议数量: %d", len(recommendations))
 
             # 如果AI没有生成建议，回退到规则引擎
             if not recommendations:
                 logger.warning("AI未生成有效建议，回退到规则引擎")
                 return self.generate_recommendations(period, start_date, end_date)
 
+            self.used_fallback = False
+
             # 合并AI建议和规则建议
             rule_based_recommendations = self.generate_recommendations(period, start_date, end_date)
-            logger.info(f"规则引擎生成建议数量: {len(rule_based_recommendations)}")
+            logger.debug("规则引擎生成建议数量: %d", len(rule_based_recommendations))
 
             all_recommendations = recommendations + rule_based_recommendations
 
@@ -125,10 +95,60 @@ class AIEnhancedRecommendationEngine(RecommendationEngine):
             return self._deduplicate_and_rank(all_recommendations)
 
         except Exception as e:
-            logger.error(f"AI推荐生成失败: {e}")
+            logger.error("AI推荐生成失败: %s", e)
             # 出错时回退到规则引擎
             return self.generate_recommendations(period, start_date, end_date)
 
+    def build_ai_inputs(
+            self,
+            period: schemas.AnalysisPeriod = schemas.AnalysisPeriod.current_month,
+            start_date: schemas.date = None,
+            end_date: schemas.date = None
+    ) -> Optional[Tuple[schemas.EnergyAnalysis, Dict, Dict]]:
+        """构建AI分析所需的能耗分析结果、用户数据和能耗数据"""
+
+        # 获取用户数据
+        user = self.db.query(models.User).filter(models.User.id == self.user_id).first()
+        if not user:
+            logger.warning("未找到用户，无法生成AI建议")
+            return None
+
+        # 获取能耗分析数据（支持多时间维度）
+        from .data_processing import get_energy_analysis
+        energy_analysis = get_energy_analysis(self.db, self.user_id, period, start_date, end_date)
+
+        logger.debug("获取到%s能耗分析数据: 总能耗%skWh", energy_analysis.analysis_period, energy_analysis.total_consumption)
+
+        # 构建时间范围信息
+        time_range_info = self._build_time_range_info(energy_analysis)
+
+        # 构建用户数据
+        user_data = {
+            "family_size": user.family_size,
+            "house_size": user.house_size,
+            "full_name": user.full_name,
+            "season": self._get_current_season(),
+            "analysis_period": energy_analysis.analysis_period,
+            "period_days": energy_analysis.period_days,
+            "start_date": energy_analysis.start_date.isoformat() if energy_analysis.start_date else None,
+            "end_date": energy_analysis.end_date.isoformat() if energy_analysis.end_date else None,
+            "time_range_description": time_range_info["description"]
+        }
+
+        # 转换能耗数据为字典
+        energy_data = {
+            "total_consumption": energy_analysis.total_consumption,
+            "average_daily_consumption": energy_analysis.average_daily_consumption,
+            "cost_analysis": energy_analysis.cost_analysis,
+            "comparison_with_benchmark": energy_analysis.comparison_with_benchmark,
+            "device_breakdown": energy_analysis.device_breakdown,
+            "monthly_trend": energy_analysis.monthly_trend,
+            "period_comparison": energy_analysis.period_comparison,
+            "time_range": time_range_info
+        }
+
+        return energy_analysis, user_data, energy_data
+
     def _build_time_range_info(self, energy_analysis: schemas.EnergyAnalysis) -> Dict:
         """构建时间范围信息"""
         start_date = energy_analysis.start_date
@@ -177,7 +197,7 @@ class AIEnhancedRecommendationEngine(RecommendationEngine):
                 description="建议养成随手关灯、合理使用家电的良好习惯。",
                 category=schemas.RecommendationCategory.lifestyle,
                 estimated_saving=15.0,
-                estimated_cost_saving=7.5,
+                estimated_cost_saving=15.0 * get_tariff().marginal_price(0),
                 implementation_difficulty=schemas.DifficultyLevel.low,
                 source="rule_based"
             )
@@ -215,12 +235,19 @@ class AIEnhancedRecommendationEngine(RecommendationEngine):
             # 构建时间范围描述
             time_range_desc = self._build_time_range_info(energy_analysis)["description"]
 
+            # 节省金额按本地电价由节省电量计算，AI未给出节省电量时沿用其估算金额
+            estimated_saving = ai_rec.get("estimated_saving", 0)
+            if estimated_saving:
+                estimated_cost_saving = round(estimated_saving * self._electricity_price(energy_analysis), 2)
+            else:
+                estimated_cost_saving = ai_rec.get("estimated_cost_saving", 0)
+
             return schemas.RecommendationCreate(
                 title=ai_rec.get("title", "节能建议"),
                 description=ai_rec.get("description", ""),
                 category=category,
-                estimated_saving=ai_rec.get("estimated_saving", 0),
-                estimated_cost_saving=ai_rec.get("estimated_cost_saving", 0),
+                estimated_saving=estimated_saving,
+                estimated_cost_saving=estimated_cost_saving,
                 implementation_difficulty=difficulty,
                 source="ai_based",
                 analysis_period=energy_analysis.analysis_period,
@@ -229,7 +256,7 @@ class AIEnhancedRecommendationEngine(RecommendationEngine):
             )
 
         except Exception as e:
-            logger.error(f"转换AI建议失败: {e}")
+            logger.error("转换AI建议失败: %s", e)
             return None
             # return self.generate_recommendations()
 
@@ -1,38 +1,90 @@
 import os
-from typing import Optional
+from typing import Callable, Dict, Optional
 from .ai_base_service import AIBaseService
-from .tongyi_service import TongYiService
+from .fake_ai_service import FakeAIService, parse_latency_spec
+from .stub_ai_service import StubAIService
+from .hedged_ai_service import HedgedAIService, HedgingPolicy
+
+# 全局对冲策略（在多次请求间共享延迟统计）
+_hedging_policy = HedgingPolicy(
+    default_budget=float(os.getenv("AI_HEDGE_BUDGET_MS", 3000)) / 1000,
+    percentile=float(os.getenv("AI_HEDGE_PERCENTILE", 0.95))
+)
+
+
+def _create_tongyi_service() -> AIBaseService:
+    """通义千问服务依赖openai客户端，首次使用时再导入"""
+    from .tongyi_service import TongYiService
+    return TongYiService()
+
+
+def _create_fake_service() -> AIBaseService:
+    """根据环境变量创建本地模拟服务"""
+    return FakeAIService(
+        latency=parse_latency_spec(os.getenv("AI_FAKE_LATENCY", "constant:0")),
+        seed=int(os.getenv("AI_FAKE_SEED")) if os.getenv("AI_FAKE_SEED") else None
+    )
+
+
+_stub_service: Optional[AIBaseService] = None
+
+
+def _get_stub_service() -> AIBaseService:
+    """桩服务在进程内共享，使错误率和抖动按同一随机序列分布"""
+    global _stub_service
+    if _stub_service is None:
+        _stub_service = StubAIService()
+    return _stub_service
+
 
 class AIServiceFactory:
     """AI服务工厂"""
 
-    @staticmethod
-    def create_service(provider: str = "tongyi") -> Optional[AIBaseService]:
-        """创建AI服务实例"""
-
-        # 优先使用通义千问
-        if provider == "tongyi" and os.getenv("DASHSCOPE_API_KEY"):
-            return TongYiService()
-        # 注释掉原有的付费服务选项
-        # elif provider == "openai" and os.getenv("OPENAI_API_KEY"):
-        #    return OpenAIService()
-        else:
+    # 已注册的服务提供商: 名称 -> (构造函数, 可用性检查)
+    _providers: Dict[str, tuple] = {}
+
+    @classmethod
+    def register_provider(cls, name: str,
+                          builder: Callable[[], AIBaseService],
+                          is_available: Callable[[], bool] = lambda: True):
+        """注册AI服务提供商"""
+        cls._providers[name] = (builder, is_available)
+
+    @classmethod
+    def _create_single(cls, provider: str) -> Optional[AIBaseService]:
+        if provider not in cls._providers:
+            return None
+        builder, is_available = cls._providers[provider]
+        if not is_available():
+            return None
+        return builder()
+
+    @classmethod
+    def create_service(cls, provider: str = "tongyi") -> Optional[AIBaseService]:
+        """创建AI服务实例（配置了AI_PROVIDER时优先使用配置的提供商）"""
+
+        provider = os.getenv("AI_PROVIDER") or provider
+        service = cls._create_single(provider)
+        if service is None:
             # 默认回退到通义千问
-            if os.getenv("DASHSCOPE_API_KEY"):
-                return TongYiService()
+            provider = "tongyi"
+            service = cls._create_single(provider)
+        if service is None:
+            return None
 
-        return None
+        # 配置了备用服务时，使用对冲策略包装
+        secondary_provider = os.getenv("AI_HEDGE_SECONDARY")
+        if secondary_provider and secondary_provider != provider:
+            secondary = cls._create_single(secondary_provider)
+            if secondary is not None:
+                return HedgedAIService(service, secondary, _hedging_policy)
 
-    @staticmethod
-    def get_available_providers() -> list:
+        return service
+
+    @classmethod
+    def get_available_providers(cls) -> list:
         """获取可用的AI服务提供商"""
-        providers = []
-        if os.getenv("DASHSCOPE_API_KEY"):
-            providers.append("tongyi")  # 添加通义千问
-        # 注释掉其他付费服务
-        # if os.getenv("OPENAI_API_KEY"):
-        #     providers.append("openai")
-        return providers
+        return [name for name, (_, is_available) in cls._providers.items() if is_available()]
 
     @staticmethod
     def get_provider_info() -> dict:
@@ -43,5 +95,31 @@ class AIServiceFactory:
                 "type": "优惠付费",
                 "description": "阿里云提供，新用户有免费额度，成本效益高",
                 "models": ["qwen-turbo", "qwen-plus", "qwen-max"]
+            },
+            "stub": {
+                "name": "确定性桩服务",
+                "type": "压测",
+                "description": "返回结构合法的确定性结果，延迟、抖动和错误率可配置",
+                "models": []
+            },
+            "fake": {
+                "name": "本地模拟服务",
+                "type": "测试",
+                "description": "按配置的延迟分布返回固定结果，用于离线测试",
+                "models": []
             }
-        }
\ No newline at end of file
+        }
+
+
+# 优先使用通义千问
+AIServiceFactory.register_provider(
+    "tongyi", _create_tongyi_service, lambda: bool(os.getenv("DASHSCOPE_API_KEY"))
+)
+# 本地模拟服务仅在显式开启时可用
+AIServiceFactory.register_provider(
+    "fake", _create_fake_service, lambda: os.getenv("AI_FAKE_ENABLED", "false").lower() == "true"
+)
+# 压测用桩服务，通过AI_PROVIDER=stub选择
+AIServiceFactory.register_provider(
+    "stub", _get_stub_service, lambda: os.getenv("AI_PROVIDER") == "stub"
+)
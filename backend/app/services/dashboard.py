@@ -0,0 +1,101 @@
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..crud import devices as devices_crud
+from ..crud import recommendations as recommendations_crud
+from ..sharding import get_shard_router
+from . import data_processing
+from . import intervals as intervals_service
+from .tariff import get_tariff
+
+logger = logging.getLogger(__name__)
+
+# 仪表盘聚合说明：
+# 仪表盘原先分别请求能耗分析、基准比较、设备、建议和建议来源统计，每个请求各自认证并查询用户。
+# /api/dashboard 只认证一次，各区块在线程池中并发计算，每个区块使用用户所属分片的独立会话
+# （同一个Session不能跨线程使用）。fields 参数选择需要的区块，未选择的区块不做任何查询。
+# ETag 由所选区块的数据版本组成，数据未变化时直接返回304。
+
+
+@dataclass
+class DashboardParams:
+    """区块计算参数（能耗分析相关）"""
+    period: schemas.AnalysisPeriod = schemas.AnalysisPeriod.current_month
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    detail: bool = False
+    limit: int = 100
+
+
+def _analysis(db: Session, user_id: int, params: DashboardParams):
+    analysis = data_processing.get_energy_analysis(db, user_id, params.period, params.start_date, params.end_date)
+    if params.detail:
+        analysis.hourly_profile = intervals_service.get_hourly_profile(db, user_id, analysis.start_date, analysis.end_date)
+    return analysis.model_dump(mode="json")
+
+
+def _benchmark(db: Session, user_id: int, params: DashboardParams):
+    comparison = data_processing.compare_with_benchmark(db, user_id)
+    return comparison.model_dump(mode="json") if comparison is not None else None
+
+
+def _devices(db: Session, user_id: int, params: DashboardParams):
+    return devices_crud.get_device_rows_by_user(db, user_id, limit=params.limit)
+
+
+def _recommendations(db: Session, user_id: int, params: DashboardParams):
+    return recommendations_crud.get_recommendation_rows_by_user(db, user_id, limit=params.limit)
+
+
+def _sources(db: Session, user_id: int, params: DashboardParams):
+    rows = db.query(models.Recommendation.source, func.count(models.Recommendation.id)).filter(
+        models.Recommendation.user_id == user_id
+    ).group_by(models.Recommendation.source).all()
+    return {source: count for source, count in rows}
+
+
+# 区块名 -> fn(db, user_id, params)
+SECTIONS: Dict[str, Callable[[Session, int, DashboardParams], object]] = {
+    "analysis": _analysis,
+    "benchmark": _benchmark,
+    "devices": _devices,
+    "recommendations": _recommendations,
+    "sources": _sources,
+}
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """逗号分隔的区块名，为空时返回全部区块；包含未知区块时抛出ValueError"""
+    if not fields:
+        return list(SECTIONS)
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in SECTIONS]
+    if unknown or not names:
+        raise ValueError(f"未知的区块: {', '.join(unknown)}，可选: {', '.join(SECTIONS)}")
+    return names
+
+
+def section_versions(db: Session, user_id: int, names: List[str], params: DashboardParams) -> tuple:
+    """所选区块的数据版本（用于ETag）"""
+    version = []
+    if "analysis" in names or "benchmark" in names:
+        start_date, end_date = data_processing.get_date_range_for_period(params.period, params.start_date, params.end_date)
+        version += [start_date, end_date, get_tariff().region, date.today(),
+                    *data_processing.get_analysis_data_version(db, user_id)]
+    if "devices" in names:
+        version += devices_crud.get_data_version(db, user_id)
+    if "recommendations" in names or "sources" in names:
+        version += recommendations_crud.get_data_version(db, user_id)
+    return tuple(version)
+
+
+def compute_section(name: str, user_id: int, params: DashboardParams):
+    """在独立会话中计算一个区块（线程池中调用）"""
+    with get_shard_router().session_for_user(user_id) as db:
+        return SECTIONS[name](db, user_id, params)
@@ -1,12 +1,32 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract, text
+from sqlalchemy import func, extract, text, select
 from .. import models, schemas
 from typing import List, Dict, Optional, Tuple
 from datetime import date, datetime, timedelta
+import numpy as np
 import logging
+import os
+
+from . import history, history_store
+from .tariff import get_tariff
+from ..crud import data_versions
 
 logger = logging.getLogger(__name__)
 
+# 不短于该天数的分析周期优先读取本地历史库（需配置 HISTORY_STORE_DIR）
+HISTORY_STORE_MIN_DAYS = int(os.getenv("HISTORY_STORE_MIN_DAYS", 60))
+
+def _history_view(user_id: int, start_date: date, end_date: date) -> Optional[history_store.HistoryView]:
+    """长周期分析读取本地历史库的零拷贝视图；未启用、周期较短或该用户尚未建库时返回None"""
+    if (end_date - start_date).days + 1 < HISTORY_STORE_MIN_DAYS:
+        return None
+    return history_store.get_view(user_id, start_date, end_date)
+
+def _daily_series(view: history_store.HistoryView) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """视图中有总读数的日期及其能耗、电费"""
+    present = view.has_total
+    return view.dates[present], view.total[present].astype(float), np.nan_to_num(view.cost[present]).astype(float)
+
 def get_date_range_for_period(period: schemas.AnalysisPeriod,
                               start_date: Optional[date] = None,
                               end_date: Optional[date] = None) -> Tuple[date, date]:
@@ -76,7 +96,20 @@ def get_date_range_for_period(period: schemas.AnalysisPeriod,
 
 def get_device_breakdown(db: Session, user_id: int, start_date: date, end_date: date) -> List[Dict]:
     """获取设备能耗分解"""
+    view = _history_view(user_id, start_date, end_date)
+    if view is not None:
+        totals = view.device_totals()
+        return [
+            {
+                'device_name': device.name,
+                'device_type': device.device_type.value,
+                'consumption': totals[device.id]
+            }
+            for device in db.query(models.Device).filter(models.Device.id.in_(list(totals))).order_by(models.Device.id)
+        ]
+
     device_data = db.query(
+        models.Device.id,
         models.Device.name,
         models.Device.device_type,
         func.sum(models.EnergyReading.reading_value).label('total_consumption')
@@ -92,12 +125,23 @@ def get_device_breakdown(db: Session, user_id: int, start_date: date, end_date:
     ).all()
 
     breakdown = []
+    by_device = {}
     for data in device_data:
-        breakdown.append({
+        by_device[data.id] = {
             'device_name': data.name,
             'device_type': data.device_type.value,
             'consumption': float(data.total_consumption)
-        })
+        }
+        breakdown.append(by_device[data.id])
+
+    # 已归档的历史读数
+    archived = history.archived_device_totals(db, user_id, start_date, end_date)
+    if archived:
+        for device in db.query(models.Device).filter(models.Device.id.in_(list(archived))):
+            if device.id not in by_device:
+                by_device[device.id] = {'device_name': device.name, 'device_type': device.device_type.value, 'consumption': 0.0}
+                breakdown.append(by_device[device.id])
+            by_device[device.id]['consumption'] += archived[device.id]
 
     return breakdown
 
@@ -207,6 +251,32 @@ def get_house_size_range(house_size: float) -> str:
 #         device_breakdown=device_breakdown
 #     )
 
+def get_analysis_data_version(db: Session, user_id: int) -> tuple:
+    """获取能耗分析依赖的数据版本（读数、分时读数和设备版本，用户资料更新时间），单次查询"""
+    user_version = select(models.User.updated_at).where(models.User.id == user_id).scalar_subquery()
+    return tuple(db.execute(select(*data_versions.version_subqueries(user_id, "readings", "intervals", "devices"),
+                                  user_version)).one())
+
+def _query_daily_totals(db: Session, user_id: int, start_date: date, end_date: date) -> Tuple[np.ndarray, np.ndarray]:
+    """从数据库（及已归档读数）读取每日总能耗"""
+    daily_totals = db.query(
+        models.EnergyReading.reading_date,
+        func.sum(models.EnergyReading.reading_value)
+    ).filter(
+        models.EnergyReading.user_id == user_id,
+        models.EnergyReading.reading_date >= start_date,
+        models.EnergyReading.reading_date <= end_date,
+        models.EnergyReading.reading_type == models.ReadingType.total
+    ).group_by(models.EnergyReading.reading_date).all()
+
+    # 已归档的历史读数与原始表不重叠，直接拼接
+    daily_totals += [(day, consumption) for day, consumption, _ in
+                     history.archived_daily_totals(db, user_id, start_date, end_date)]
+
+    dates = np.array([row[0] for row in daily_totals], dtype="datetime64[D]")
+    values = np.array([row[1] or 0 for row in daily_totals], dtype=float)
+    return dates, values
+
 def get_energy_analysis(db: Session, user_id: int,
                         period: schemas.AnalysisPeriod = schemas.AnalysisPeriod.current_month,
                         start_date: Optional[date] = None,
@@ -214,27 +284,24 @@ def get_energy_analysis(db: Session, user_id: int,
                         ) -> schemas.EnergyAnalysis:
     """获取完整的能耗分析 - 支持多时间维度"""
 
-    logger.info(f"get_energy_analysis 调用参数: user_id={user_id}, period={period}, start_date={start_date}, end_date={end_date}")
+    logger.debug("get_energy_analysis 调用参数: user_id=%s, period=%s, start_date=%s, end_date=%s", user_id, period, start_date, end_date)
 
     # 获取日期范围
     analysis_start_date, analysis_end_date = get_date_range_for_period(period, start_date, end_date)
     period_days = (analysis_end_date - analysis_start_date).days + 1
 
-    logger.info(f"分析周期: {period}, 日期范围: {analysis_start_date} 到 {analysis_end_date}, 天数: {period_days}")
+    logger.debug("分析周期: %s, 日期范围: %s 到 %s, 天数: %s", period, analysis_start_date, analysis_end_date, period_days)
 
-    # 总能耗
-    total_consumption_result = db.query(
-        func.sum(models.EnergyReading.reading_value).label('total_consumption'),
-        func.sum(models.EnergyReading.cost).label('total_cost')
-    ).filter(
-        models.EnergyReading.user_id == user_id,
-        models.EnergyReading.reading_date >= analysis_start_date,
-        models.EnergyReading.reading_date <= analysis_end_date,
-        models.EnergyReading.reading_type == models.ReadingType.total
-    ).first()
-
-    total_consumption = float(total_consumption_result.total_consumption or 0)
-    total_cost = float(total_consumption_result.total_cost or 0)
+    # 总能耗与电费：按日读取（从起始日所在月的月初开始，用于计算阶梯电价的当月累计）
+    billing_start = analysis_start_date.replace(day=1)
+    view = _history_view(user_id, billing_start, analysis_end_date)
+    if view is not None:
+        dates, values, _ = _daily_series(view)
+    else:
+        dates, values = _query_daily_totals(db, user_id, billing_start, analysis_end_date)
+    in_period = dates >= np.datetime64(analysis_start_date)
+    total_consumption = float(values[in_period].sum())
+    total_cost = get_tariff().cost_for_period(dates, values, analysis_start_date)
     average_daily = total_consumption / period_days if period_days > 0 else 0
 
     # 基准比较
@@ -295,18 +362,36 @@ def calculate_daily_trend(db: Session, user_id: int, start_date: date, end_date:
         models.EnergyReading.reading_date
     ).order_by(models.EnergyReading.reading_date).all()
 
+    archived = history.archived_daily_totals(db, user_id, start_date, end_date)
+    if archived:
+        daily_data = history.merge_totals(daily_data, archived)
+
     trend = []
-    for data in daily_data:
+    for reading_date, total_consumption, total_cost in daily_data:
         trend.append({
-            'period': data.reading_date.strftime('%m-%d'),
-            'consumption': float(data.total_consumption),
-            'cost': float(data.total_cost) if data.total_cost else 0
+            'period': reading_date.strftime('%m-%d'),
+            'consumption': float(total_consumption),
+            'cost': float(total_cost) if total_cost else 0
         })
 
     return trend
 
+def _week_key(day: date, sqlite: bool) -> Tuple[int, int]:
+    """周序号与数据库的 extract('week') 保持一致：SQLite为%W，其他数据库为ISO周"""
+    return day.year, int(day.strftime('%W')) if sqlite else day.isocalendar()[1]
+
 def calculate_weekly_trend(db: Session, user_id: int, start_date: date, end_date: date) -> List[Dict]:
     """计算周趋势"""
+    sqlite = db.get_bind().dialect.name == "sqlite"
+    view = _history_view(user_id, start_date, end_date)
+    if view is not None:
+        dates, consumption, cost = _daily_series(view)
+        weekly_data = history.merge_totals(
+            (_week_key(day, sqlite), value, day_cost)
+            for day, value, day_cost in zip(dates.tolist(), consumption.tolist(), cost.tolist())
+        )
+        return _format_trend(weekly_data, lambda key: f"{key[0]}-W{key[1]:02d}")
+
     weekly_data = db.query(
         extract('year', models.EnergyReading.reading_date).label('year'),
         extract('week', models.EnergyReading.reading_date).label('week'),
@@ -318,19 +403,31 @@ def calculate_weekly_trend(db: Session, user_id: int, start_date: date, end_date
         models.EnergyReading.reading_date <= end_date,
         models.EnergyReading.reading_type == models.ReadingType.total
     ).group_by(text('year'), text('week')).order_by(text('year'), text('week')).all()
+    weekly_data = [((int(data.year), int(data.week)), data.total_consumption, data.total_cost) for data in weekly_data]
 
-    trend = []
-    for data in weekly_data:
-        trend.append({
-            'period': f"{int(data.year)}-W{int(data.week):02d}",
-            'consumption': float(data.total_consumption),
-            'cost': float(data.total_cost) if data.total_cost else 0
-        })
+    archived = history.archived_daily_totals(db, user_id, start_date, end_date)
+    if archived:
+        weekly_data = history.merge_totals(weekly_data, [
+            (_week_key(day, sqlite), consumption, cost) for day, consumption, cost in archived
+        ])
 
-    return trend
+    return _format_trend(weekly_data, lambda key: f"{key[0]}-W{key[1]:02d}")
 
 def calculate_monthly_trend(db: Session, user_id: int, start_date: date, end_date: date) -> List[Dict]:
     """计算月趋势"""
+    view = _history_view(user_id, start_date, end_date)
+    if view is not None:
+        dates, consumption, cost = _daily_series(view)
+        months, inverse = np.unique(dates.astype("datetime64[M]"), return_inverse=True)
+        monthly_data = [
+            ((month.year, month.month), value, month_cost) for month, value, month_cost in zip(
+                months.astype("datetime64[D]").tolist(),
+                np.bincount(inverse, weights=consumption, minlength=len(months)).tolist(),
+                np.bincount(inverse, weights=cost, minlength=len(months)).tolist()
+            )
+        ]
+        return _format_trend(monthly_data, lambda key: f"{key[0]}-{key[1]:02d}")
+
     monthly_data = db.query(
         extract('year', models.EnergyReading.reading_date).label('year'),
         extract('month', models.EnergyReading.reading_date).label('month'),
@@ -342,17 +439,44 @@ def calculate_monthly_trend(db: Session, user_id: int, start_date: date, end_dat
         models.EnergyReading.reading_date <= end_date,
         models.EnergyReading.reading_type == models.ReadingType.total
     ).group_by(text('year'), text('month')).order_by(text('year'), text('month')).all()
+    monthly_data = [((int(data.year), int(data.month)), data.total_consumption, data.total_cost) for data in monthly_data]
 
+    # 已归档的月份优先读月汇总表
+    archived = history.archived_monthly_totals(db, user_id, start_date, end_date)
+    if archived:
+        monthly_data = history.merge_totals(monthly_data, [
+            ((month.year, month.month), consumption, cost) for month, consumption, cost in archived
+        ])
+
+    return _format_trend(monthly_data, lambda key: f"{key[0]}-{key[1]:02d}")
+
+def _format_trend(rows, label) -> List[Dict]:
+    """[(键, 能耗, 电费)] 转为趋势数据，label把键转为显示的周期"""
     trend = []
-    for data in monthly_data:
+    for key, total_consumption, total_cost in rows:
         trend.append({
-            'period': f"{int(data.year)}-{int(data.month):02d}",
-            'consumption': float(data.total_consumption),
-            'cost': float(data.total_cost) if data.total_cost else 0
+            'period': label(key),
+            'consumption': float(total_consumption),
+            'cost': float(total_cost) if total_cost else 0
         })
-
     return trend
 
+def _total_consumption(db: Session, user_id: int, start_date: date, end_date: date) -> float:
+    """日期范围内的总能耗"""
+    view = _history_view(user_id, start_date, end_date)
+    if view is not None:
+        return float(np.nansum(view.total, dtype=float))
+
+    total = db.query(
+        func.sum(models.EnergyReading.reading_value).label('total_consumption')
+    ).filter(
+        models.EnergyReading.user_id == user_id,
+        models.EnergyReading.reading_date >= start_date,
+        models.EnergyReading.reading_date <= end_date,
+        models.EnergyReading.reading_type == models.ReadingType.total
+    ).scalar()
+    return float(total or 0) + history.archived_total(db, user_id, start_date, end_date)
+
 def calculate_period_comparison(db: Session, user_id: int, period: schemas.AnalysisPeriod,
                                 current_start: date, current_end: date) -> Optional[Dict]:
     """计算与上个周期的对比"""
@@ -360,16 +484,7 @@ def calculate_period_comparison(db: Session, user_id: int, period: schemas.Analy
     try:
         # 计算当前周期的日均能耗
         current_days = (current_end - current_start).days + 1
-        current_consumption_result = db.query(
-            func.sum(models.EnergyReading.reading_value).label('total_consumption')
-        ).filter(
-            models.EnergyReading.user_id == user_id,
-            models.EnergyReading.reading_date >= current_start,
-            models.EnergyReading.reading_date <= current_end,
-            models.EnergyReading.reading_type == models.ReadingType.total
-        ).first()
-
-        current_total = float(current_consumption_result.total_consumption or 0)
+        current_total = _total_consumption(db, user_id, current_start, current_end)
         current_daily = current_total / current_days if current_days > 0 else 0
 
         # 计算上个周期的日期范围
@@ -398,16 +513,7 @@ def calculate_period_comparison(db: Session, user_id: int, period: schemas.Analy
             return None
 
         prev_days = (prev_end - prev_start).days + 1
-        prev_consumption_result = db.query(
-            func.sum(models.EnergyReading.reading_value).label('total_consumption')
-        ).filter(
-            models.EnergyReading.user_id == user_id,
-            models.EnergyReading.reading_date >= prev_start,
-            models.EnergyReading.reading_date <= prev_end,
-            models.EnergyReading.reading_type == models.ReadingType.total
-        ).first()
-
-        prev_total = float(prev_consumption_result.total_consumption or 0)
+        prev_total = _total_consumption(db, user_id, prev_start, prev_end)
         prev_daily = prev_total / prev_days if prev_days > 0 else 0
 
         # 计算变化百分比
@@ -425,7 +531,7 @@ def calculate_period_comparison(db: Session, user_id: int, period: schemas.Analy
         }
 
     except Exception as e:
-        logger.error(f"周期对比计算失败: {e}")
+        logger.error("周期对比计算失败: %s", e)
         return None
 
 def generate_period_description(period: schemas.AnalysisPeriod, start_date: date, end_date: date) -> str:
@@ -463,6 +569,7 @@ def compare_with_benchmark(db: Session, user_id: int, target_date: date = None)
         models.EnergyReading.reading_date <= end_date,
         models.EnergyReading.reading_type == models.ReadingType.total
     ).scalar() or 0
+    monthly_consumption += history.archived_total(db, user_id, start_date, end_date)
 
     # 获取对应的基准数据
     season = get_season_from_date(target_date)
@@ -0,0 +1,93 @@
+import asyncio
+import random
+from typing import Callable, Dict, List, Optional
+from .ai_base_service import AIBaseService
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 延迟分布: 返回一次调用的延迟（秒）
+LatencyDistribution = Callable[[random.Random], float]
+
+
+def constant_latency(ms: float) -> LatencyDistribution:
+    """固定延迟"""
+    return lambda rng: ms / 1000
+
+
+def uniform_latency(low_ms: float, high_ms: float) -> LatencyDistribution:
+    """均匀分布延迟"""
+    return lambda rng: rng.uniform(low_ms, high_ms) / 1000
+
+
+def lognormal_latency(median_ms: float, sigma: float = 0.5) -> LatencyDistribution:
+    """对数正态分布延迟（长尾），median_ms为中位数"""
+    import math
+    mu = math.log(median_ms / 1000)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+def parse_latency_spec(spec: str) -> LatencyDistribution:
+    """
+        解析延迟分布配置字符串
+
+        格式：
+        - constant:200
+        - uniform:100,500
+        - lognormal:800,0.6
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+
+    if kind == "constant":
+        return constant_latency(*values)
+    elif kind == "uniform":
+        return uniform_latency(*values)
+    elif kind == "lognormal":
+        return lognormal_latency(*values)
+
+    raise ValueError(f"未知的延迟分布: {spec}")
+
+
+class FakeAIService(AIBaseService):
+    """本地模拟AI服务 - 按配置的延迟分布返回固定结果，用于离线测试"""
+
+    def __init__(self, name: str = "fake",
+                 latency: Optional[LatencyDistribution] = None,
+                 seed: Optional[int] = None):
+        super().__init__()
+        self.name = name
+        self.latency = latency or constant_latency(0)
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    async def _sleep(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency(self.rng))
+
+    async def analyze_energy_consumption(self, user_data: Dict, energy_data: Dict) -> Dict:
+        """返回模拟的能耗分析结果"""
+        await self._sleep()
+        return {
+            "overall_assessment": f"[{self.name}] 能耗水平整体正常",
+            "key_insights": ["空调为主要能耗来源"],
+            "efficiency_level": "中",
+            "main_consumption_sources": "空调、热水器",
+            "seasonal_impact": "夏季制冷需求较高",
+            "provider": self.name
+        }
+
+    async def generate_recommendations(self, analysis_result: Dict) -> List[Dict]:
+        """返回模拟的节能建议"""
+        await self._sleep()
+        return [
+            {
+                "title": f"[{self.name}] 调高空调温度",
+                "description": "将空调温度设置在26℃以上，可减少约10%的制冷能耗。",
+                "category": "设备使用",
+                "estimated_saving": 20.0,
+                "estimated_cost_saving": 10.0,
+                "implementation_difficulty": "低",
+                "reasoning": "空调为主要能耗来源"
+            }
+        ]
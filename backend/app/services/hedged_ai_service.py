@@ -0,0 +1,149 @@
+import asyncio
+import math
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from .ai_base_service import AIBaseService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """滑动窗口延迟统计，用于估算p95延迟"""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+
+class HedgingPolicy:
+    """
+        对冲请求策略
+
+        先向主服务发送请求，若在延迟预算（默认取主服务近期p95延迟）内未返回，
+        则向备用服务发送同样的请求，取先返回的可用结果，并取消另一个请求。
+    """
+
+    def __init__(self, default_budget: float = 3.0, percentile: float = 0.95,
+                 window: int = 200, min_samples: int = 20):
+        self.default_budget = default_budget  # 样本不足时使用的预算（秒）
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.trackers: Dict[str, LatencyTracker] = {}
+        self.stats = {"requests": 0, "hedged": 0, "secondary_wins": 0}
+
+    def _tracker(self, operation: str) -> LatencyTracker:
+        if operation not in self.trackers:
+            self.trackers[operation] = LatencyTracker(self.window)
+        return self.trackers[operation]
+
+    def budget(self, operation: str) -> float:
+        """当前的对冲延迟预算（秒）"""
+        tracker = self._tracker(operation)
+        if len(tracker.samples) < self.min_samples:
+            return self.default_budget
+        return tracker.percentile(self.percentile)
+
+    async def run(self, operation: str,
+                  primary: Callable[[], Awaitable[Any]],
+                  secondary: Callable[[], Awaitable[Any]],
+                  is_usable: Callable[[Any], bool] = lambda result: True) -> Any:
+        """执行对冲请求，返回最先到达的可用结果"""
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        tracker = self._tracker(operation)
+        self.stats["requests"] += 1
+
+        primary_task = asyncio.ensure_future(primary())
+        names = {primary_task: "primary"}
+        pending = {primary_task}
+        last_result, last_error = None, None
+
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.budget(operation))
+
+            # 预算内主服务返回可用结果，直接使用
+            for task in done:
+                tracker.observe(loop.time() - started)
+                last_result, last_error = self._outcome(task)
+                if last_error is None and is_usable(last_result):
+                    return last_result
+
+            # 超出预算或主服务结果不可用，向备用服务发起对冲请求
+            self.stats["hedged"] += 1
+            logger.info("AI请求[%s]超出延迟预算，发起对冲请求", operation)
+            secondary_task = asyncio.ensure_future(secondary())
+            names[secondary_task] = "secondary"
+            pending = set(pending) | {secondary_task}
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task is primary_task:
+                        tracker.observe(loop.time() - started)
+                    last_result, last_error = self._outcome(task)
+                    if last_error is None and is_usable(last_result):
+                        if names[task] == "secondary":
+                            self.stats["secondary_wins"] += 1
+                        return last_result
+
+            # 两个服务都没有可用结果
+            if last_error is not None:
+                raise last_error
+            return last_result
+
+        finally:
+            for task in pending:
+                task.cancel()
+                # 被取消的主服务请求至少耗时到当前时刻，记录该下界（真实耗时更长，p95仍略偏低）；
+                # 不记录的话只剩完成的较快请求，p95会被低估得更多
+                if task is primary_task:
+                    tracker.observe(loop.time() - started)
+
+    @staticmethod
+    def _outcome(task: asyncio.Future):
+        if task.cancelled():
+            return None, asyncio.CancelledError()
+        if task.exception() is not None:
+            return None, task.exception()
+        return task.result(), None
+
+
+class HedgedAIService(AIBaseService):
+    """带对冲策略的AI服务 - 组合主服务与备用服务"""
+
+    def __init__(self, primary: AIBaseService, secondary: AIBaseService,
+                 policy: Optional[HedgingPolicy] = None):
+        super().__init__()
+        self.primary = primary
+        self.secondary = secondary
+        self.policy = policy or HedgingPolicy()
+
+    async def analyze_energy_consumption(self, user_data: Dict, energy_data: Dict) -> Dict:
+        """对冲方式分析能耗数据"""
+        return await self.policy.run(
+            "analysis",
+            lambda: self.primary.analyze_energy_consumption(user_data, energy_data),
+            lambda: self.secondary.analyze_energy_consumption(user_data, energy_data),
+            is_usable=lambda result: isinstance(result, dict) and "error" not in result
+        )
+
+    async def generate_recommendations(self, analysis_result: Dict) -> List[Dict]:
+        """对冲方式生成节能建议"""
+        return await self.policy.run(
+            "recommendations",
+            lambda: self.primary.generate_recommendations(analysis_result),
+            lambda: self.secondary.generate_recommendations(analysis_result),
+            is_usable=lambda result: bool(result)
+        )
@@ -0,0 +1,213 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# 历史读数说明：
+# 保留期（RETENTION_RAW_DAYS）之前的原始读数由 app.tools.retention 定期迁出：
+# 按(用户, 月, 类型, 设备)汇总写入 monthly_readings，原始行按用户追加到本地压缩列存文件（.npz）后从表中删除。
+# 原始表与归档互不重叠，分析时对涉及归档的日期范围把两部分结果相加即可，未涉及归档时不产生任何额外开销。
+
+ARCHIVE_COLUMNS = ("id", "reading_date", "reading_type", "device_id", "reading_value", "cost")
+TYPE_CODES = {models.ReadingType.total: 0, models.ReadingType.device: 1}
+NO_DEVICE = -1
+
+
+def archive_dir() -> str:
+    return os.getenv("ARCHIVE_DIR", "archive")
+
+
+def archive_path(user_id: int) -> str:
+    """按用户ID分目录，避免单个目录下文件过多"""
+    return os.path.join(archive_dir(), f"{user_id // 1000:04d}", f"user_{user_id}.npz")
+
+
+class _ArchiveCache:
+    """已加载归档文件的LRU缓存，以文件修改时间判断是否失效"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[int, Dict[str, np.ndarray]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> Optional[Dict[str, np.ndarray]]:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(path)
+                return entry[1]
+
+        with np.load(path) as data:
+            columns = {name: data[name] for name in ARCHIVE_COLUMNS}
+        with self._lock:
+            self._entries[path] = (mtime, columns)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return columns
+
+
+_cache = _ArchiveCache(int(os.getenv("ARCHIVE_CACHE_SIZE", 256)))
+
+
+def load_archive(user_id: int) -> Optional[Dict[str, np.ndarray]]:
+    return _cache.get(archive_path(user_id))
+
+
+def append_archive(user_id: int, columns: Dict[str, np.ndarray]) -> int:
+    """
+        追加归档读数（按id去重，重复执行是幂等的），返回文件中的读数总数
+
+        先写临时文件再原子替换，读取方不会看到写了一半的文件。
+    """
+    path = archive_path(user_id)
+    existing = load_archive(user_id)
+    if existing is not None:
+        columns = {name: np.concatenate([existing[name], columns[name]]) for name in ARCHIVE_COLUMNS}
+    _, unique = np.unique(columns["id"], return_index=True)
+    columns = {name: columns[name][unique] for name in ARCHIVE_COLUMNS}
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(temp_path, **columns)
+    os.replace(temp_path, path)
+    return len(columns["id"])
+
+
+def remap_archive_devices(user_id: int, device_map: Dict[int, int]):
+    """
+        用户迁移到其他分片后改写归档中的设备ID
+
+        读数id改为负数序号：目标分片上的读数id与源分片无关，避免之后追加归档时按id去重误删。
+    """
+    columns = load_archive(user_id)
+    if columns is None:
+        return
+    columns = dict(columns)
+    device_ids = columns["device_id"]
+    columns["device_id"] = np.array([device_map.get(device_id, NO_DEVICE) if device_id != NO_DEVICE else NO_DEVICE
+                                     for device_id in device_ids.tolist()], dtype=device_ids.dtype)
+    columns["id"] = -np.arange(1, len(columns["id"]) + 1, dtype=columns["id"].dtype)
+
+    path = archive_path(user_id)
+    temp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(temp_path, **columns)
+    os.replace(temp_path, path)
+
+
+def archived_until(db: Session, user_id: int) -> Optional[date]:
+    """该用户归档覆盖到的日期（不含），没有归档时返回None；同一会话内只查询一次"""
+    cache = db.info.setdefault("archived_until", {})
+    if user_id not in cache:
+        last_month = db.query(func.max(models.MonthlyReading.month)).filter(
+            models.MonthlyReading.user_id == user_id
+        ).scalar()
+        cache[user_id] = (last_month.replace(day=28) + timedelta(days=4)).replace(day=1) if last_month else None
+    return cache[user_id]
+
+
+def _archived_rows(db: Session, user_id: int, start_date: date, end_date: date,
+                   reading_type: models.ReadingType) -> Optional[Dict[str, np.ndarray]]:
+    until = archived_until(db, user_id)
+    if until is None or start_date >= until:
+        return None
+    columns = load_archive(user_id)
+    if columns is None:
+        return None
+
+    dates = columns["reading_date"]
+    mask = (dates >= np.datetime64(start_date)) & (dates <= np.datetime64(end_date)) \
+        & (columns["reading_type"] == TYPE_CODES[reading_type])
+    return {name: values[mask] for name, values in columns.items()}
+
+
+def archived_daily_totals(db: Session, user_id: int, start_date: date,
+                          end_date: date) -> List[Tuple[date, float, float]]:
+    """归档中的每日总读数合计 [(日期, 能耗, 电费)]，按日期排序"""
+    rows = _archived_rows(db, user_id, start_date, end_date, models.ReadingType.total)
+    if rows is None or len(rows["id"]) == 0:
+        return []
+
+    days, inverse = np.unique(rows["reading_date"], return_inverse=True)
+    consumption = np.bincount(inverse, weights=rows["reading_value"])
+    cost = np.bincount(inverse, weights=np.nan_to_num(rows["cost"]))
+    return list(zip(days.tolist(), consumption.tolist(), cost.tolist()))
+
+
+def archived_total(db: Session, user_id: int, start_date: date, end_date: date) -> float:
+    """归档中的总读数合计"""
+    return sum(consumption for _, consumption, _ in archived_daily_totals(db, user_id, start_date, end_date))
+
+
+def archived_monthly_totals(db: Session, user_id: int, start_date: date,
+                            end_date: date) -> List[Tuple[date, float, float]]:
+    """归档中的每月总读数合计 [(月初, 能耗, 电费)]：整月直接读月汇总表，不完整的月份读归档文件"""
+    until = archived_until(db, user_id)
+    if until is None or start_date >= until:
+        return []
+
+    first_full = start_date if start_date.day == 1 else (start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+    last_full = min(until, end_date + timedelta(days=1)).replace(day=1)
+
+    totals: Dict[date, List[float]] = {}
+    if first_full < last_full:
+        for month, consumption, cost in db.query(
+            models.MonthlyReading.month,
+            func.sum(models.MonthlyReading.consumption),
+            func.sum(models.MonthlyReading.cost)
+        ).filter(
+            models.MonthlyReading.user_id == user_id,
+            models.MonthlyReading.reading_type == models.ReadingType.total,
+            models.MonthlyReading.month >= first_full,
+            models.MonthlyReading.month < last_full
+        ).group_by(models.MonthlyReading.month):
+            totals[month] = [float(consumption or 0), float(cost or 0)]
+
+    # 首尾不完整的月份
+    partial_ranges = [(start_date, min(first_full - timedelta(days=1), end_date))]
+    if last_full >= first_full:
+        partial_ranges.append((last_full, end_date))
+    for range_start, range_end in partial_ranges:
+        if range_start > range_end:
+            continue
+        for day, consumption, cost in archived_daily_totals(db, user_id, range_start, range_end):
+            month_total = totals.setdefault(day.replace(day=1), [0.0, 0.0])
+            month_total[0] += consumption
+            month_total[1] += cost
+
+    return [(month, consumption, cost) for month, (consumption, cost) in sorted(totals.items())]
+
+
+def archived_device_totals(db: Session, user_id: int, start_date: date, end_date: date) -> Dict[int, float]:
+    """归档中的各设备能耗合计 {设备ID: 能耗}"""
+    rows = _archived_rows(db, user_id, start_date, end_date, models.ReadingType.device)
+    if rows is None or len(rows["id"]) == 0:
+        return {}
+
+    devices, inverse = np.unique(rows["device_id"], return_inverse=True)
+    consumption = np.bincount(inverse, weights=rows["reading_value"])
+    return {device_id: value for device_id, value in zip(devices.tolist(), consumption.tolist())
+            if device_id != NO_DEVICE}
+
+
+def merge_totals(*sources) -> List[Tuple]:
+    """合并多个 [(键, 能耗, 电费)] 列表，相同键相加，按键排序"""
+    merged: Dict = {}
+    for source in sources:
+        for key, consumption, cost in source:
+            total = merged.setdefault(key, [0.0, 0.0])
+            total[0] += float(consumption or 0)
+            total[1] += float(cost or 0)
+    return [(key, consumption, cost) for key, (consumption, cost) in sorted(merged.items())]
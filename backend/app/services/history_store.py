@@ -0,0 +1,375 @@
+import os
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from .. import models
+
+try:
+    import fcntl
+except ImportError:  # Windows：只保证单进程内的写入互斥
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 本地历史库说明：
+# 每个用户一个文件：文件头（魔数、起始日期、设备槽位数、设备ID表）+ 定长日记录，
+# 第i条记录对应起始日期后第i天，按日期即可算出偏移，不需要额外索引。
+# 每条记录为 总读数kWh、总读数电费、各设备kWh（float32，无读数为NaN）。
+# 读取时用numpy内存映射整个文件，任意日期范围都是零拷贝视图；多个worker进程共享操作系统页缓存，
+# 数据不会复制到每个进程。写入在提交事务后按读数增量追加或原地更新，跨进程用文件锁互斥；
+# 需要改变文件布局（更早的日期、新设备超出槽位）时写临时文件后原子替换，已映射旧文件的读取方不受影响。
+
+MAGIC = b"EHIST001"
+HEADER = struct.Struct("<8sqq")  # 魔数, 起始日期(距1970-01-01天数), 设备槽位数
+MISSING = np.float32(np.nan)
+
+
+def record_dtype(slots: int) -> np.dtype:
+    return np.dtype([("total", "<f4"), ("cost", "<f4"), ("devices", "<f4", (slots,))])
+
+
+def _slot_capacity(count: int) -> int:
+    """设备槽位按2的幂预留，新增设备时很少需要重写文件"""
+    capacity = 8
+    while capacity < count:
+        capacity *= 2
+    return capacity
+
+
+def _header_size(slots: int) -> int:
+    # 对齐到8字节
+    return HEADER.size + 8 * slots
+
+
+@dataclass
+class HistoryView:
+    """一个用户某段日期的日数据，各数组都是内存映射文件上的只读视图"""
+    start_date: date
+    total: np.ndarray       # (天数,) 总读数kWh
+    cost: np.ndarray        # (天数,) 总读数电费
+    devices: np.ndarray     # (天数, 槽位数) 各设备kWh
+    device_ids: np.ndarray  # (槽位数,) 槽位对应的设备ID，-1为空槽位
+
+    @property
+    def dates(self) -> np.ndarray:
+        return np.datetime64(self.start_date) + np.arange(len(self.total))
+
+    @property
+    def has_total(self) -> np.ndarray:
+        return ~np.isnan(self.total)
+
+    def device_totals(self) -> Dict[int, float]:
+        """各设备在视图范围内的能耗合计（没有读数的设备不返回）"""
+        used = self.device_ids >= 0
+        has_reading = (~np.isnan(self.devices[:, used])).any(axis=0)
+        sums = np.nansum(self.devices[:, used], axis=0, dtype=float)
+        return {device_id: value for device_id, value, present in
+                zip(self.device_ids[used].tolist(), sums.tolist(), has_reading.tolist()) if present}
+
+
+class _Mapping:
+    """已映射的用户文件"""
+
+    def __init__(self, path: str):
+        stat = os.stat(path)
+        self.key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with open(path, "rb") as f:
+            magic, base_day, slots = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"不是历史库文件: {path}")
+        # 设备ID表也是映射视图，其他进程原地登记新设备后立即可见
+        self.device_ids = np.memmap(path, dtype="<i8", mode="r", offset=HEADER.size, shape=(slots,))
+        self.base_date = date(1970, 1, 1) + timedelta(days=base_day)
+        self.slots = slots
+        dtype = record_dtype(slots)
+        rows = (stat.st_size - _header_size(slots)) // dtype.itemsize
+        self.records = np.memmap(path, dtype=dtype, mode="r", offset=_header_size(slots), shape=(rows,)) \
+            if rows > 0 else np.zeros(0, dtype=dtype)
+
+
+class HistoryStore:
+    """按用户存放日数据的本地内存映射历史库"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._mappings: Dict[int, _Mapping] = {}
+        self._lock = threading.Lock()
+
+    def path(self, user_id: int) -> str:
+        return os.path.join(self.directory, f"{user_id // 1000:04d}", f"user_{user_id}.hist")
+
+    # ---- 读取 ----
+
+    def _mapping(self, user_id: int) -> Optional[_Mapping]:
+        path = self.path(user_id)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            mapping = self._mappings.get(user_id)
+            # 文件被替换或追加了新记录时重新映射；原地更新已通过共享映射可见
+            if mapping is None or mapping.key[:2] != key[:2]:
+                mapping = self._mappings[user_id] = _Mapping(path)
+        return mapping
+
+    def view(self, user_id: int, start_date: date, end_date: date) -> Optional[HistoryView]:
+        """返回[start_date, end_date]的零拷贝视图；该用户尚未建库时返回None"""
+        mapping = self._mapping(user_id)
+        if mapping is None:
+            return None
+
+        first = max((start_date - mapping.base_date).days, 0)
+        last = min((end_date - mapping.base_date).days + 1, len(mapping.records))
+        records = mapping.records[first:max(first, last)]
+        return HistoryView(
+            start_date=mapping.base_date + timedelta(days=first),
+            total=records["total"],
+            cost=records["cost"],
+            devices=records["devices"],
+            device_ids=mapping.device_ids
+        )
+
+    # ---- 写入 ----
+
+    @contextmanager
+    def _user_lock(self, user_id: int):
+        path = self.path(user_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def write(self, user_id: int, base_date: date, device_ids: Sequence[int], records: np.ndarray):
+        """整体写入一个用户的文件（写临时文件后原子替换）"""
+        path = self.path(user_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        slots = records.dtype["devices"].shape[0]
+        ids = np.full(slots, -1, dtype="<i8")
+        ids[:len(device_ids)] = device_ids
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, (base_date - date(1970, 1, 1)).days, slots))
+            f.write(ids.tobytes())
+            f.write(records.tobytes())
+        os.replace(temp_path, path)
+
+    def apply(self, user_id: int, changes: Iterable[Tuple[date, Optional[int], float, float]]):
+        """
+            按增量更新日数据
+
+            changes: [(日期, 设备ID（总读数为None）, kWh增量, 电费增量)]
+        """
+        changes = list(changes)
+        if not changes:
+            return
+
+        with self._user_lock(user_id):
+            mapping = self._mapping(user_id)
+            days = [change[0] for change in changes]
+            new_devices = {change[1] for change in changes if change[1] is not None}
+
+            if mapping is None:
+                base_date, device_ids, records = min(days), [], np.zeros(0, dtype=record_dtype(8))
+            else:
+                base_date, records = mapping.base_date, mapping.records
+                device_ids = [device_id for device_id in mapping.device_ids.tolist() if device_id >= 0]
+            new_devices -= set(device_ids)
+
+            needs_rewrite = mapping is None or min(days) < base_date \
+                or len(device_ids) + len(new_devices) > records.dtype["devices"].shape[0]
+            if needs_rewrite:
+                base_date, device_ids, records = self._relayout(
+                    min(min(days), base_date), base_date, device_ids + sorted(new_devices), records
+                )
+
+            rows_needed = (max(days) - base_date).days + 1
+            if needs_rewrite:
+                records = self._grow(records, rows_needed)
+                self._apply_changes(records, base_date, device_ids, changes)
+                self.write(user_id, base_date, device_ids, records)
+                return
+
+            path = self.path(user_id)
+            if new_devices:
+                # 槽位足够：在文件头登记新设备
+                with open(path, "r+b") as f:
+                    f.seek(HEADER.size + 8 * len(device_ids))
+                    f.write(np.array(sorted(new_devices), dtype="<i8").tobytes())
+                device_ids = device_ids + sorted(new_devices)
+
+            if rows_needed > len(records):
+                # 新的日期：在文件末尾追加空记录
+                with open(path, "ab") as f:
+                    f.write(self._grow(np.zeros(0, dtype=records.dtype), rows_needed - len(records)).tobytes())
+
+            # 原地更新：只写入受影响的记录
+            writable = np.memmap(path, dtype=records.dtype, mode="r+", offset=_header_size(len(mapping.device_ids)),
+                                 shape=(max(rows_needed, len(records)),))
+            self._apply_changes(writable, base_date, device_ids, changes)
+            writable.flush()
+            del writable
+
+    @staticmethod
+    def _relayout(base_date: date, old_base: date, device_ids: List[int], records: np.ndarray):
+        """把旧记录搬到新的起始日期和槽位数下"""
+        dtype = record_dtype(_slot_capacity(len(device_ids)))
+        shift = (old_base - base_date).days
+        relaid = np.zeros(shift + len(records), dtype=dtype)
+        relaid["total"] = relaid["cost"] = MISSING
+        relaid["devices"] = MISSING
+        if len(records):
+            relaid["total"][shift:] = records["total"]
+            relaid["cost"][shift:] = records["cost"]
+            old_slots = records.dtype["devices"].shape[0]
+            relaid["devices"][shift:, :old_slots] = records["devices"]
+        return base_date, device_ids, relaid
+
+    @staticmethod
+    def _grow(records: np.ndarray, rows: int) -> np.ndarray:
+        if rows <= len(records):
+            return np.array(records)
+        grown = np.zeros(rows, dtype=records.dtype)
+        grown["total"] = grown["cost"] = MISSING
+        grown["devices"] = MISSING
+        grown[:len(records)] = records
+        return grown
+
+    @staticmethod
+    def _apply_changes(records: np.ndarray, base_date: date, device_ids: List[int], changes):
+        """把增量累加到记录上（同一天/同一设备的多条增量先合并）"""
+        slot_of = {device_id: slot for slot, device_id in enumerate(device_ids)}
+        base = base_date.toordinal()
+        index = np.array([change[0].toordinal() - base for change in changes], dtype=np.int64)
+        slot = np.array([-1 if change[1] is None else slot_of[change[1]] for change in changes], dtype=np.int64)
+        kwh = np.array([change[2] for change in changes], dtype=float)
+        cost = np.array([change[3] for change in changes], dtype=float)
+
+        is_total = slot < 0
+        if is_total.any():
+            days, inverse = np.unique(index[is_total], return_inverse=True)
+            records["total"][days] = np.nan_to_num(records["total"][days]) + np.bincount(inverse, weights=kwh[is_total])
+            records["cost"][days] = np.nan_to_num(records["cost"][days]) + np.bincount(inverse, weights=cost[is_total])
+
+        if not is_total.all():
+            slots = records.dtype["devices"].shape[0]
+            keys, inverse = np.unique(index[~is_total] * slots + slot[~is_total], return_inverse=True)
+            days, cells = keys // slots, keys % slots
+            devices = records["devices"]
+            devices[days, cells] = np.nan_to_num(devices[days, cells]) + np.bincount(inverse, weights=kwh[~is_total])
+
+    def build(self, user_id: int, rows: Iterable[Tuple[date, Optional[int], float, float]]):
+        """按完整的日汇总数据重建一个用户的文件"""
+        rows = list(rows)
+        if not rows:
+            return
+        with self._user_lock(user_id):
+            base_date = min(row[0] for row in rows)
+            device_ids = sorted({row[1] for row in rows if row[1] is not None})
+            _, _, records = self._relayout(base_date, base_date, device_ids, np.zeros(0, dtype=record_dtype(8)))
+            records = self._grow(records, (max(row[0] for row in rows) - base_date).days + 1)
+            self._apply_changes(records, base_date, device_ids, rows)
+            self.write(user_id, base_date, device_ids, records)
+
+
+_store: Optional[HistoryStore] = None
+if os.getenv("HISTORY_STORE_DIR"):
+    _store = HistoryStore(os.getenv("HISTORY_STORE_DIR"))
+
+
+def get_history_store() -> Optional[HistoryStore]:
+    """未配置 HISTORY_STORE_DIR 时返回None"""
+    return _store
+
+
+def get_view(user_id: int, start_date: date, end_date: date) -> Optional[HistoryView]:
+    if _store is None:
+        return None
+    try:
+        return _store.view(user_id, start_date, end_date)
+    except (OSError, ValueError) as e:
+        logger.warning("读取历史库失败，改为查询数据库: user_id=%s, %s", user_id, e)
+        return None
+
+
+# ---- 写入同步：记录ORM对读数的修改，事务提交后按增量写入历史库 ----
+
+def _pending(session: Session) -> Dict[int, list]:
+    return session.info.setdefault("history_store_changes", {})
+
+
+def _track(target: models.EnergyReading, sign: float, value: float, cost: Optional[float],
+           reading_date=None, reading_type=None, device_id=None):
+    session = object_session(target)
+    if session is None:
+        return
+    reading_type = reading_type or target.reading_type
+    device_id = None if reading_type == models.ReadingType.total else (device_id or target.device_id)
+    if reading_type == models.ReadingType.device and device_id is None:
+        return
+    _pending(session).setdefault(target.user_id, []).append(
+        (reading_date or target.reading_date, device_id, sign * float(value or 0), sign * float(cost or 0))
+    )
+
+
+def track_change(session: Session, user_id: int, reading_date: date, reading_type: models.ReadingType,
+                 device_id: Optional[int], value_delta: float, cost_delta: float):
+    """记录不经过ORM对象的写入（如批量upsert）的增量，事务提交后写入历史库"""
+    if _store is None:
+        return
+    device_id = None if reading_type == models.ReadingType.total else device_id
+    if reading_type == models.ReadingType.device and device_id is None:
+        return
+    _pending(session).setdefault(user_id, []).append((reading_date, device_id, value_delta, cost_delta))
+
+
+def _old_value(state, name: str):
+    history = state.attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(state.object, name)
+
+
+if _store is not None:
+    @event.listens_for(models.EnergyReading, "after_insert")
+    def _after_insert(mapper, connection, target):
+        _track(target, 1, target.reading_value, target.cost)
+
+    @event.listens_for(models.EnergyReading, "after_update")
+    def _after_update(mapper, connection, target):
+        state = inspect(target)
+        _track(target, -1, _old_value(state, "reading_value"), _old_value(state, "cost"),
+               _old_value(state, "reading_date"), _old_value(state, "reading_type"), _old_value(state, "device_id"))
+        _track(target, 1, target.reading_value, target.cost)
+
+    @event.listens_for(models.EnergyReading, "after_delete")
+    def _after_delete(mapper, connection, target):
+        _track(target, -1, target.reading_value, target.cost)
+
+    @event.listens_for(Session, "after_commit")
+    def _after_commit(session):
+        changes = session.info.pop("history_store_changes", None)
+        for user_id, user_changes in (changes or {}).items():
+            try:
+                _store.apply(user_id, user_changes)
+            except Exception as e:
+                logger.error("历史库同步失败 user_id=%s: %s（可运行 python -m app.tools.history_store rebuild 重建）",
+                             user_id, e)
+
+    @event.listens_for(Session, "after_rollback")
+    def _after_rollback(session):
+        session.info.pop("history_store_changes", None)
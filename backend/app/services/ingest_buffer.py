@@ -0,0 +1,193 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, Dict, List, Optional
+
+from .. import schemas
+from ..crud.energy_readings import create_energy_readings
+from ..metrics import ingest_batch_rows, ingest_flush_seconds
+from ..sharding import get_shard_router
+from . import live_updates
+
+logger = logging.getLogger(__name__)
+
+# 读数写入缓冲说明：
+# 逐条写入时每个请求都要单独提交一次（一次fsync），吞吐量受磁盘同步延迟限制。
+# 启用 INGEST_BUFFER_ENABLED 后，新增读数请求把读数放入缓冲区并等待确认：
+# 后台线程每 INGEST_BUFFER_FLUSH_MS 毫秒或攒够 INGEST_BUFFER_MAX_ROWS 条时，按分片在一个事务中写入，
+# 提交成功后立即完成各请求的 Future（响应在提交前由写入语句返回的行生成，与逐条写入相同，包含id和created_at），
+# 实时推送通知在全部提交完成后、重试逻辑之外发送，通知出错不会导致已提交的读数被再次写入。
+# 请求在放入缓冲区前关闭自己的数据库会话，等待提交期间不占用连接。
+# 缓冲区已满（INGEST_BUFFER_CAPACITY 条）时，新请求最多等待 INGEST_BUFFER_SUBMIT_TIMEOUT 秒，仍无空位则返回503。
+# 批量提交失败时回滚并逐条重试，只有出错的读数返回错误。应用关闭时停止接收并写完缓冲区中的全部读数。
+
+
+class IngestBufferFull(Exception):
+    """缓冲区已满"""
+
+
+class IngestBufferClosed(Exception):
+    """缓冲区已关闭"""
+
+
+class _Pending:
+    __slots__ = ("shard", "user_id", "reading", "future")
+
+    def __init__(self, shard: str, user_id: int, reading: schemas.EnergyReadingCreate):
+        self.shard = shard
+        self.user_id = user_id
+        self.reading = reading
+        self.future: Future = Future()
+
+
+class IngestBuffer:
+    """按时间或条数成组提交的读数写入缓冲区"""
+
+    def __init__(self, flush_interval: float = 0.02, max_rows: int = 500, capacity: int = 5000,
+                 submit_timeout: float = 1.0):
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.capacity = capacity
+        self.submit_timeout = submit_timeout
+        self._pending: Deque[_Pending] = deque()
+        self._lock = threading.Lock()
+        # 有新读数时唤醒写入线程；写入线程取走读数后唤醒等待空位的请求
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="ingest-buffer", daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, user_id: int, reading: schemas.EnergyReadingCreate) -> Future:
+        """放入缓冲区，返回提交后完成的 Future（结果为 EnergyReadingResponse）"""
+        item = _Pending(get_shard_router().shard_for(user_id), user_id, reading)
+        deadline = time.monotonic() + self.submit_timeout
+        with self._lock:
+            while len(self._pending) >= self.capacity and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise IngestBufferFull()
+                self._not_full.wait(remaining)
+            if self._closed:
+                raise IngestBufferClosed()
+            self._pending.append(item)
+            if len(self._pending) == 1 or len(self._pending) >= self.max_rows:
+                self._not_empty.notify()
+        return item.future
+
+    def close(self, timeout: Optional[float] = None):
+        """停止接收新读数，写完缓冲区后返回"""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify()
+            self._not_full.notify_all()
+        self._thread.join(timeout)
+
+    # ---- 写入线程 ----
+
+    def _take_batch(self) -> List[_Pending]:
+        with self._lock:
+            while not self._pending and not self._closed:
+                self._not_empty.wait()
+            # 第一条读数到达后最多再等 flush_interval，期间攒够 max_rows 条则立即写入
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._pending) < self.max_rows and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._not_empty.wait(remaining)
+            batch = [self._pending.popleft() for _ in range(min(self.max_rows, len(self._pending)))]
+            self._not_full.notify_all()
+        # 客户端断开时请求等待的 Future 会被取消：不再写入这些读数（客户端未收到确认，重试时按自然键覆盖）；
+        # 其余标记为运行中，之后不能再被取消，提交后设置结果不会出错
+        return [item for item in batch if item.future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                if self._closed and not self._pending:
+                    return
+                # 整批读数的请求都已取消
+                continue
+            started = time.perf_counter()
+            by_shard: Dict[str, List[_Pending]] = {}
+            for item in batch:
+                by_shard.setdefault(item.shard, []).append(item)
+            for shard, items in by_shard.items():
+                try:
+                    self._flush(shard, items)
+                except Exception:
+                    logger.exception("读数批量写入失败（分片 %s，%d条）", shard, len(items))
+                    for item in items:
+                        if not item.future.done():
+                            item.future.set_exception(RuntimeError("读数写入失败"))
+            ingest_batch_rows.observe(len(batch))
+            ingest_flush_seconds.observe(time.perf_counter() - started)
+
+    def _flush(self, shard: str, items: List[_Pending]):
+        committed: List[_Pending] = []
+        with get_shard_router().session(shard) as db:
+            try:
+                responses = self._write(db, items)
+            except Exception as e:
+                db.rollback()
+                logger.warning("读数批量提交失败，逐条重试（%d条）: %s", len(items), e)
+                for item in items:
+                    try:
+                        response = self._write(db, [item])[0]
+                    except Exception as item_error:
+                        db.rollback()
+                        item.future.set_exception(item_error)
+                        continue
+                    item.future.set_result(response)
+                    committed.append(item)
+            else:
+                for item, response in zip(items, responses):
+                    item.future.set_result(response)
+                committed = items
+        live_updates.notify_rows({"user_id": item.user_id, "reading_date": item.reading.reading_date} for item in committed)
+
+    @staticmethod
+    def _write(db, items: List[_Pending]) -> List[schemas.EnergyReadingResponse]:
+        """在一个事务中按自然键写入并提交；响应由写入返回的行在提交前生成，提交后不再查询"""
+        rows = [dict(item.reading.model_dump(), user_id=item.user_id) for item in items]
+        responses = [schemas.EnergyReadingResponse.model_validate(reading) for reading in create_energy_readings(db, rows)]
+        db.commit()
+        return responses
+
+
+_buffer: Optional[IngestBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_ingest_buffer() -> Optional[IngestBuffer]:
+    """未启用时返回None（逐条写入）"""
+    global _buffer
+    if os.getenv("INGEST_BUFFER_ENABLED", "false").lower() != "true":
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = IngestBuffer(
+                    flush_interval=float(os.getenv("INGEST_BUFFER_FLUSH_MS", 20)) / 1000,
+                    max_rows=int(os.getenv("INGEST_BUFFER_MAX_ROWS", 500)),
+                    capacity=int(os.getenv("INGEST_BUFFER_CAPACITY", 5000)),
+                    submit_timeout=float(os.getenv("INGEST_BUFFER_SUBMIT_TIMEOUT", 1))
+                )
+    return _buffer
+
+
+def shutdown_ingest_buffer():
+    """应用关闭时调用：写完缓冲区中的读数"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is not None:
+            _buffer.close()
+            _buffer = None
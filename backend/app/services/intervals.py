@@ -0,0 +1,197 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..crud import data_versions
+from . import live_updates
+from .tariff import get_tariff
+
+# 分时读数说明：
+# 每个用户（或设备）每天一行，当天各时段的读数打包成小端float32数组存放，缺失时段为NaN，
+# 存储和扫描开销只与天数成正比。上报后自动汇总为当天的日读数（energy_readings），
+# 能耗分析默认只读日读数，仅在请求分时明细时才读取本表。
+
+VALUE_DTYPE = np.dtype("<f4")
+
+
+def pack_values(values: np.ndarray) -> bytes:
+    return np.asarray(values, dtype=VALUE_DTYPE).tobytes()
+
+
+def unpack_values(data: bytes) -> np.ndarray:
+    """零拷贝还原时段数组（只读）"""
+    return np.frombuffer(data, dtype=VALUE_DTYPE)
+
+
+def to_hourly(values: np.ndarray, interval_minutes: int) -> np.ndarray:
+    """将一天的时段读数汇总为24个小时读数"""
+    values = np.asarray(values, dtype=float)
+    if interval_minutes <= 60:
+        return np.nansum(values.reshape(24, 60 // interval_minutes), axis=1)
+    hours = interval_minutes // 60
+    return np.repeat(np.nan_to_num(values) / hours, hours)
+
+
+def _local_naive(timestamp: datetime) -> datetime:
+    """带时区的时间先转换为服务器本地时间"""
+    return timestamp.astimezone().replace(tzinfo=None) if timestamp.tzinfo else timestamp
+
+
+def _device_filter(device_id: Optional[int]):
+    return models.IntervalReading.device_id.is_(None) if device_id is None else models.IntervalReading.device_id == device_id
+
+
+def ingest_intervals(db: Session, user_id: int, ingest: schemas.IntervalReadingIngest) -> schemas.IntervalIngestResult:
+    """写入分时读数（同一天的已有时段会被覆盖），并汇总为日读数"""
+    interval = ingest.interval_minutes
+    slots = 1440 // interval
+
+    # 按天分组
+    by_day: Dict[date, List] = {}
+    for point in ingest.points:
+        timestamp = _local_naive(point.timestamp)
+        slot = (timestamp.hour * 60 + timestamp.minute) // interval
+        by_day.setdefault(timestamp.date(), []).append((slot, point.value))
+
+    existing = {
+        row.reading_date: row
+        for row in db.query(models.IntervalReading).filter(
+            models.IntervalReading.user_id == user_id,
+            _device_filter(ingest.device_id),
+            models.IntervalReading.reading_date.in_(list(by_day))
+        )
+    }
+
+    rows = []
+    for day, points in sorted(by_day.items()):
+        row = existing.get(day)
+        if row is not None and row.interval_minutes != interval:
+            raise ValueError(f"{day} 已有{row.interval_minutes}分钟时段的读数，不能按{interval}分钟写入")
+
+        values = unpack_values(row.packed_values).copy() if row is not None else np.full(slots, np.nan, dtype=VALUE_DTYPE)
+        slot_index, slot_values = zip(*points)
+        values[list(slot_index)] = slot_values
+
+        if row is None:
+            row = models.IntervalReading(user_id=user_id, device_id=ingest.device_id, reading_date=day,
+                                         interval_minutes=interval)
+            db.add(row)
+        row.packed_values = pack_values(values)
+        row.total = float(np.nansum(values))
+        rows.append(row)
+
+    daily_readings = downsample_to_daily(db, user_id, ingest.device_id, rows)
+    dates = [row.reading_date for row in rows]
+    # 汇总会新增或覆盖日读数，两类版本一起递增
+    data_versions.bump(db, [user_id], "intervals", "readings")
+    db.commit()
+    live_updates.notify(user_id, dates)
+
+    return schemas.IntervalIngestResult(days=len(rows), points=len(ingest.points), daily_readings=daily_readings)
+
+
+def downsample_to_daily(db: Session, user_id: int, device_id: Optional[int],
+                        rows: List[models.IntervalReading]) -> int:
+    """将分时读数汇总写入日读数：新增或更新当天的总读数/设备读数，并按分时电价计算电费"""
+    if not rows:
+        return 0
+
+    tariff = get_tariff()
+    dates = [row.reading_date for row in rows]
+    hourly = np.stack([to_hourly(unpack_values(row.packed_values), row.interval_minutes) for row in rows])
+    totals = hourly.sum(axis=1)
+    reading_type = models.ReadingType.total if device_id is None else models.ReadingType.device
+
+    if device_id is None:
+        # 总读数：同月其他日期的日读数一起参与阶梯计算
+        month_start = min(dates).replace(day=1)
+        month_end = (max(dates).replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        others = db.query(
+            models.EnergyReading.reading_date,
+            func.sum(models.EnergyReading.reading_value)
+        ).filter(
+            models.EnergyReading.user_id == user_id,
+            models.EnergyReading.reading_type == models.ReadingType.total,
+            models.EnergyReading.reading_date >= month_start,
+            models.EnergyReading.reading_date <= month_end,
+            models.EnergyReading.reading_date.notin_(dates)
+        ).group_by(models.EnergyReading.reading_date).all()
+
+        other_kwh = np.array([value or 0 for _, value in others], dtype=float)
+        all_dates = np.array(dates + [day for day, _ in others], dtype="datetime64[D]")
+        all_kwh = np.concatenate([totals, other_kwh])
+        all_hourly = np.vstack([hourly, tariff.spread_daily(other_kwh)])
+        costs = tariff.compute_costs(np.zeros(len(all_dates), dtype=np.int64), all_dates, all_kwh, all_hourly)[:len(rows)]
+    else:
+        # 设备读数：只按分时电价计费，阶梯按家庭总用电量计算
+        costs = hourly @ tariff.hourly_prices
+
+    daily_filter = models.EnergyReading.device_id.is_(None) if device_id is None else models.EnergyReading.device_id == device_id
+    existing = {}
+    for reading in db.query(models.EnergyReading).filter(
+        models.EnergyReading.user_id == user_id,
+        models.EnergyReading.reading_type == reading_type,
+        daily_filter,
+        models.EnergyReading.reading_date.in_(dates)
+    ):
+        existing.setdefault(reading.reading_date, reading)
+
+    for day, total, cost in zip(dates, totals.tolist(), np.round(costs, 2).tolist()):
+        reading = existing.get(day)
+        if reading is None:
+            db.add(models.EnergyReading(user_id=user_id, device_id=device_id, reading_type=reading_type,
+                                        reading_date=day, reading_value=round(total, 3), cost=cost))
+        else:
+            reading.reading_value = round(total, 3)
+            reading.cost = cost
+    return len(rows)
+
+
+def get_interval_days(db: Session, user_id: int, start_date: date, end_date: date,
+                      device_id: Optional[int] = None) -> List[Dict]:
+    """按天返回分时读数"""
+    rows = db.query(
+        models.IntervalReading.reading_date,
+        models.IntervalReading.device_id,
+        models.IntervalReading.interval_minutes,
+        models.IntervalReading.packed_values,
+        models.IntervalReading.total
+    ).filter(
+        models.IntervalReading.user_id == user_id,
+        _device_filter(device_id),
+        models.IntervalReading.reading_date >= start_date,
+        models.IntervalReading.reading_date <= end_date
+    ).order_by(models.IntervalReading.reading_date).all()
+
+    return [
+        {
+            "reading_date": row.reading_date,
+            "device_id": row.device_id,
+            "interval_minutes": row.interval_minutes,
+            "values": [None if np.isnan(v) else round(v, 4) for v in unpack_values(row.packed_values).tolist()],
+            "total": row.total
+        }
+        for row in rows
+    ]
+
+
+def get_hourly_profile(db: Session, user_id: int, start_date: date, end_date: date) -> Optional[List[float]]:
+    """周期内家庭总用电的小时平均曲线（24个值），没有分时数据时返回None"""
+    rows = db.query(
+        models.IntervalReading.interval_minutes,
+        models.IntervalReading.packed_values
+    ).filter(
+        models.IntervalReading.user_id == user_id,
+        models.IntervalReading.device_id.is_(None),
+        models.IntervalReading.reading_date >= start_date,
+        models.IntervalReading.reading_date <= end_date
+    ).all()
+    if not rows:
+        return None
+
+    hourly = np.stack([to_hourly(unpack_values(packed), interval) for interval, packed in rows])
+    return np.round(hourly.mean(axis=0), 4).tolist()
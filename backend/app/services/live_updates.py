@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..etag import make_etag
+from ..metrics import live_evictions
+from ..sharding import get_shard_router
+
+logger = logging.getLogger(__name__)
+
+# 实时推送说明：
+# 客户端通过 GET /api/energy-readings/live（Server-Sent Events）订阅自己的数据变化，不再轮询能耗分析接口。
+# - 读数写入（单条、写入缓冲、批量）和分时读数汇总在提交后调用 notify(user_id, 日期)；
+#   该用户没有订阅者时立即返回，不做任何查询；
+# - 有订阅者时交给后台线程计算增量：变化日期的日读数、本月合计、与基准的比较，以及数据版本；
+#   同一用户尚未处理的通知合并为一次计算，数据版本与上次推送相同时不推送；
+# - 每个订阅者一个有界队列（LIVE_QUEUE_SIZE），队列满说明客户端消费过慢，直接断开（evicted），
+#   客户端重连后从快照重新开始，慢客户端不会让服务端无限积压消息；
+# - 连接在认证令牌到期时关闭（closed），客户端重新获取推送令牌后重连，令牌失效后连接不会一直保持；
+# - 发布订阅在进程内，多worker部署时客户端只收到其所连worker上的写入，需要配合粘性会话或按用户路由写入。
+
+# 订阅被关闭时放入队列的标记
+EVICTED = "evicted"
+CLOSED = "closed"
+
+
+class Subscription:
+    """一个SSE连接的订阅：事件循环中的有界队列"""
+
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def offer(self, event) -> bool:
+        """在事件循环线程中调用；队列已满返回False"""
+        if self.closed:
+            return True
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self, reason: str):
+        """清空队列并放入关闭标记（在事件循环线程中调用）"""
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(reason)
+
+
+class TooManySubscriptions(Exception):
+    pass
+
+
+class LiveUpdates:
+    """进程内按用户的发布订阅"""
+
+    def __init__(self, queue_size: int, max_per_user: int, workers: int):
+        self.queue_size = queue_size
+        self.max_per_user = max_per_user
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._pending: Dict[int, Set[date]] = {}
+        self._versions: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="live-updates")
+
+    # ---- 订阅 ----
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """在事件循环中调用"""
+        subscription = Subscription(user_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            subscribers = self._subscribers.setdefault(user_id, set())
+            if len(subscribers) >= self.max_per_user:
+                raise TooManySubscriptions(user_id)
+            subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+                self._versions.pop(subscription.user_id, None)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def has_subscribers(self, user_id: int) -> bool:
+        # 写入路径上的快速判断，不加锁（字典成员检查是原子的）
+        return user_id in self._subscribers
+
+    # ---- 发布 ----
+
+    def notify(self, user_id: int, dates: Iterable[date]):
+        """读数提交后调用（任意线程）：有订阅者时在后台计算并推送增量"""
+        if not self.has_subscribers(user_id):
+            return
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending is not None:
+                pending.update(dates)
+                return
+            self._pending[user_id] = set(dates)
+        self._executor.submit(self._compute_and_publish, user_id)
+
+    def notify_rows(self, rows: Iterable[Dict]):
+        """按用户分组通知（批量写入的行，含 user_id 和 reading_date）"""
+        by_user: Dict[int, Set[date]] = {}
+        for row in rows:
+            by_user.setdefault(row["user_id"], set()).add(row["reading_date"])
+        for user_id, dates in by_user.items():
+            self.notify(user_id, dates)
+
+    def _compute_and_publish(self, user_id: int):
+        with self._lock:
+            dates = self._pending.pop(user_id, set())
+        try:
+            with get_shard_router().session_for_user(user_id) as db:
+                update = build_update(db, user_id, sorted(dates))
+        except Exception as e:
+            logger.warning("计算实时推送增量失败: user_id=%s, %s", user_id, e)
+            return
+        with self._lock:
+            if self._versions.get(user_id) == update["version"]:
+                return
+            self._versions[user_id] = update["version"]
+        self.publish(user_id, update)
+
+    def publish(self, user_id: int, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(self._deliver, subscription, event)
+
+    def _deliver(self, subscription: Subscription, event):
+        if not subscription.offer(event):
+            # 慢客户端：断开而不是积压
+            logger.info("实时推送订阅者消费过慢，断开: user_id=%s", subscription.user_id)
+            live_evictions.inc()
+            self.unsubscribe(subscription)
+            subscription.close(EVICTED)
+
+    def close(self):
+        """关闭全部订阅和后台线程"""
+        with self._lock:
+            subscriptions = [s for subscribers in self._subscribers.values() for s in subscribers]
+            self._subscribers.clear()
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.close, CLOSED)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def build_update(db: Session, user_id: int, dates: List[date]) -> Dict:
+    """增量：变化日期的日读数、本月合计、与基准的比较和数据版本（dates为空时即快照）"""
+    from . import data_processing
+
+    days = []
+    if dates:
+        rows = db.query(
+            models.EnergyReading.reading_date,
+            func.sum(models.EnergyReading.reading_value),
+            func.sum(models.EnergyReading.cost)
+        ).filter(
+            models.EnergyReading.user_id == user_id,
+            models.EnergyReading.reading_type == models.ReadingType.total,
+            models.EnergyReading.reading_date.in_(dates)
+        ).group_by(models.EnergyReading.reading_date).all()
+        found = {day: (consumption, cost) for day, consumption, cost in rows}
+        for day in dates:
+            consumption, cost = found.get(day, (None, None))
+            days.append({"date": day.isoformat(), "consumption": consumption, "cost": cost})
+
+    today = date.today()
+    month_start = today.replace(day=1)
+    consumption, cost, day_count = db.query(
+        func.sum(models.EnergyReading.reading_value),
+        func.sum(models.EnergyReading.cost),
+        func.count(models.EnergyReading.reading_date.distinct())
+    ).filter(
+        models.EnergyReading.user_id == user_id,
+        models.EnergyReading.reading_type == models.ReadingType.total,
+        models.EnergyReading.reading_date >= month_start,
+        models.EnergyReading.reading_date <= today
+    ).one()
+
+    benchmark = data_processing.compare_with_benchmark(db, user_id)
+    version = data_processing.get_analysis_data_version(db, user_id)
+    return {
+        # 不透明的数据版本标识，数据不变时相同
+        "version": make_etag("live", user_id, *version).strip('"'),
+        "days": days,
+        "month": {
+            "month": month_start.isoformat()[:7],
+            "consumption": float(consumption or 0),
+            "cost": float(cost or 0),
+            "days": day_count,
+            "average_daily_consumption": float(consumption or 0) / day_count if day_count else 0.0,
+        },
+        "benchmark": benchmark.model_dump(mode="json") if benchmark is not None else None,
+    }
+
+
+def snapshot(user_id: int) -> Dict:
+    """连接建立时的完整状态（本月合计、基准比较和数据版本）"""
+    with get_shard_router().session_for_user(user_id) as db:
+        return build_update(db, user_id, [])
+
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def event_stream(live: LiveUpdates, subscription: Subscription, first: Dict,
+                       heartbeat: float, expires_at: Optional[float] = None) -> AsyncIterator[str]:
+    """SSE消息流：先推送快照，之后推送增量；空闲时发送注释行保持连接，到 expires_at（时间戳）时关闭"""
+    try:
+        yield format_event("snapshot", first)
+        while True:
+            timeout = heartbeat
+            if expires_at is not None:
+                remaining = expires_at - time.time()
+                if remaining <= 0:
+                    # 令牌到期：客户端重新获取令牌后重连
+                    yield format_event(CLOSED, {"reconnect": True})
+                    return
+                timeout = min(heartbeat, remaining)
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event in (EVICTED, CLOSED):
+                # 客户端收到后重新连接，从新的快照开始
+                yield format_event(event, {"reconnect": True})
+                return
+            yield format_event("update", event)
+    finally:
+        live.unsubscribe(subscription)
+
+
+_live: Optional[LiveUpdates] = None
+_live_lock = threading.Lock()
+
+
+def get_live_updates() -> LiveUpdates:
+    global _live
+    if _live is None:
+        with _live_lock:
+            if _live is None:
+                _live = LiveUpdates(
+                    queue_size=int(os.getenv("LIVE_QUEUE_SIZE", 32)),
+                    max_per_user=int(os.getenv("LIVE_MAX_STREAMS_PER_USER", 5)),
+                    workers=int(os.getenv("LIVE_UPDATE_WORKERS", 2))
+                )
+    return _live
+
+
+def notify(user_id: int, dates: Iterable[date]):
+    """未创建发布订阅（无人订阅过）时直接返回"""
+    if _live is not None:
+        _live.notify(user_id, dates)
+
+
+def notify_rows(rows: Iterable[Dict]):
+    if _live is not None:
+        _live.notify_rows(rows)
+
+
+def shutdown_live_updates():
+    """应用关闭时调用：结束所有订阅"""
+    global _live
+    with _live_lock:
+        if _live is not None:
+            _live.close()
+            _live = None
@@ -0,0 +1,164 @@
+import os
+import json
+import math
+import re
+from typing import Dict, List, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 中日韩字符（通常每个字符约1个token）
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+# 提示词大小统计（按提示词类型）
+prompt_metrics: Dict[str, Dict[str, int]] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    """本地近似计算token数量：中文按每字1个token，其余字符按每4个字符1个token"""
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    return cjk_count + math.ceil(other_count / 4)
+
+
+def minify_json(data: Any) -> str:
+    """紧凑JSON序列化"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def record_prompt_size(kind: str, prompt: str) -> int:
+    """记录提示词大小，返回估算的token数量"""
+    tokens = estimate_tokens(prompt)
+    stats = prompt_metrics.setdefault(kind, {"count": 0, "total_tokens": 0, "total_chars": 0, "max_tokens": 0})
+    stats["count"] += 1
+    stats["total_tokens"] += tokens
+    stats["total_chars"] += len(prompt)
+    stats["max_tokens"] = max(stats["max_tokens"], tokens)
+    return tokens
+
+
+def compact_device_breakdown(device_breakdown: List[Dict], top_n: int) -> List[Dict]:
+    """保留能耗最高的top_n个设备，其余合并为“其他”"""
+    ordered = sorted(device_breakdown, key=lambda d: d.get('consumption', 0), reverse=True)
+    top, rest = ordered[:top_n], ordered[top_n:]
+
+    if rest:
+        top = top + [{
+            'device_name': f"其他{len(rest)}台设备",
+            'device_type': 'other',
+            'consumption': sum(d.get('consumption', 0) for d in rest)
+        }]
+    return top
+
+
+def summarize_trend(trend: List[Dict], points: int) -> str:
+    """生成紧凑的趋势摘要：最近几个点 + 整体最低/最高/平均值"""
+    if not trend:
+        return "无"
+
+    values = [t.get('consumption', 0) for t in trend]
+    recent = ", ".join(f"{t['period']}:{t['consumption']:.1f}" for t in trend[-points:]) if points > 0 else ""
+    summary = f"共{len(values)}期, 最低{min(values):.1f}, 最高{max(values):.1f}, 平均{sum(values) / len(values):.1f} kWh"
+    return f"{recent}; {summary}" if recent else summary
+
+
+def _fit_lines(lines: List[str], max_tokens: int) -> str:
+    """按行拼接数据部分，超出预算时整行舍弃靠后的行（不截断单行）"""
+    kept: List[str] = []
+    for line in lines:
+        if estimate_tokens("\n".join(kept + [line])) > max_tokens:
+            break
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def _fit_json(data: Any, max_tokens: int) -> str:
+    """紧凑JSON超出预算时按顶层字段整体舍弃，保证仍是完整的JSON"""
+    text = minify_json(data)
+    if estimate_tokens(text) <= max_tokens or not isinstance(data, dict):
+        return text
+    kept: Dict[str, Any] = {}
+    for key, value in data.items():
+        if estimate_tokens(minify_json({**kept, key: value})) <= max_tokens:
+            kept[key] = value
+    return minify_json(kept)
+
+
+def _shrink(data: Any, max_items: int, max_chars: int) -> Any:
+    """缩减分析结果：截断过长列表和字符串"""
+    if isinstance(data, dict):
+        return {k: _shrink(v, max_items, max_chars) for k, v in data.items()}
+    if isinstance(data, list):
+        return [_shrink(v, max_items, max_chars) for v in data[:max_items]]
+    if isinstance(data, str) and len(data) > max_chars:
+        return data[:max_chars] + "…"
+    return data
+
+
+# 提示词的固定部分：说明和输出格式要求不计入数据预算，也从不截断
+ANALYSIS_HEAD = "请作为能源管理专家，分析以下家庭能耗数据："
+ANALYSIS_TAIL = """分析角度: 能效水平、主要耗能设备、用电习惯、季节影响、同类家庭对比。
+以JSON返回: overall_assessment, key_insights(列表), efficiency_level(高/中/低), main_consumption_sources, seasonal_impact"""
+
+RECOMMENDATION_HEAD = "基于以下能耗分析结果，生成3-5条具体可行的个性化节能建议（针对发现的问题，考虑家庭实际情况，含预计效果）："
+RECOMMENDATION_TAIL = "以JSON返回建议列表，每条包含: title, description, category(设备使用/生活习惯/设备升级), estimated_saving(kWh/月), estimated_cost_saving(元/月), implementation_difficulty(低/中/高), reasoning"
+
+
+class PromptBuilder:
+    """带token预算的提示词构建器"""
+
+    def __init__(self, max_tokens: Optional[int] = None,
+                 top_devices: Optional[int] = None,
+                 trend_points: int = 3):
+        self.max_tokens = max_tokens or int(os.getenv("AI_PROMPT_MAX_TOKENS", 1200))
+        self.top_devices = top_devices if top_devices is not None else int(os.getenv("AI_PROMPT_TOP_DEVICES", 5))
+        self.trend_points = trend_points
+
+    def build_analysis_prompt(self, user_data: Dict, energy_data: Dict) -> str:
+        """构建能耗分析提示词，超出预算时逐步减少设备和趋势明细；预算只作用于数据部分，输出格式要求始终完整"""
+        top_devices, trend_points = self.top_devices, self.trend_points
+        budget = self.max_tokens - estimate_tokens(ANALYSIS_HEAD + ANALYSIS_TAIL)
+
+        while True:
+            lines = self._render_analysis_data(user_data, energy_data, top_devices, trend_points)
+            if estimate_tokens("\n".join(lines)) <= budget or (top_devices <= 1 and trend_points <= 0):
+                break
+            if top_devices > 1:
+                top_devices -= 1
+            else:
+                trend_points -= 1
+
+        prompt = "\n".join([ANALYSIS_HEAD, _fit_lines(lines, budget), ANALYSIS_TAIL])
+        tokens = record_prompt_size("analysis", prompt)
+        logger.debug("分析提示词: %d字符, 约%d tokens", len(prompt), tokens)
+        return prompt
+
+    def build_recommendation_prompt(self, analysis_result: Dict) -> str:
+        """构建建议生成提示词，分析结果使用紧凑JSON，超出预算时截断列表和长文本，仍超出时舍弃顶层字段"""
+        budget = self.max_tokens - estimate_tokens(RECOMMENDATION_HEAD + RECOMMENDATION_TAIL)
+        shrunk = analysis_result
+        max_items, max_chars = 10, 400
+
+        while estimate_tokens(minify_json(shrunk)) > budget and max_chars > 50:
+            max_items, max_chars = max(1, max_items // 2), max_chars // 2
+            shrunk = _shrink(analysis_result, max_items, max_chars)
+
+        prompt = "\n".join([RECOMMENDATION_HEAD, _fit_json(shrunk, budget), RECOMMENDATION_TAIL])
+        tokens = record_prompt_size("recommendation", prompt)
+        logger.debug("建议生成提示词: %d字符, 约%d tokens", len(prompt), tokens)
+        return prompt
+
+    @staticmethod
+    def _render_analysis_data(user_data: Dict, energy_data: Dict, top_devices: int, trend_points: int) -> List[str]:
+        """数据部分，每行一个元素，按重要性排列（预算不足时从末尾整行舍弃）"""
+        devices = compact_device_breakdown(energy_data.get('device_breakdown', []), top_devices)
+        devices_info = "; ".join(
+            f"{d['device_name']}({d['device_type']}):{d['consumption']:.1f}" for d in devices
+        ) or "无"
+
+        return [
+            f"用户: {user_data.get('family_size', 1)}人, {user_data.get('house_size', 0)}平方米, 季节{user_data.get('season', '未知')}",
+            f"能耗: 总{energy_data.get('total_consumption', 0):.1f} kWh, 日均{energy_data.get('average_daily_consumption', 0):.1f} kWh, 电费¥{energy_data.get('cost_analysis', 0):.0f}, 基准对比{energy_data.get('comparison_with_benchmark', 0):.1f}%",
+            f"设备(kWh): {devices_info}",
+            f"趋势(kWh): {summarize_trend(energy_data.get('monthly_trend', []), trend_points)}",
+        ]
@@ -3,6 +3,7 @@ from .. import models, schemas
 from typing import List
 from datetime import date, timedelta
 from . import data_processing as data_processing
+from .tariff import get_tariff
 from ..crud import recommendations as recommendations_crud
 # from .ai_enhanced_recommendation_engine import AIEnhancedRecommendationEngine
 
@@ -11,6 +12,10 @@ class RecommendationEngine:
         self.db = db
         self.user_id = user_id
 
+    def _electricity_price(self, analysis: schemas.EnergyAnalysis) -> float:
+        """按用户月用电量所在阶梯估算每节省1kWh的电费"""
+        return get_tariff().marginal_price(analysis.average_daily_consumption * 30)
+
     def generate_recommendations(
             self,
             period: schemas.AnalysisPeriod = schemas.AnalysisPeriod.current_month,
@@ -64,7 +69,7 @@ class RecommendationEngine:
             description=f"您的家庭能耗比相似家庭高出{excess_percentage:.1f}%。建议检查家中大功率电器的使用情况，并考虑优化用电习惯。",
             category=schemas.RecommendationCategory.lifestyle,
             estimated_saving=50.0,
-            estimated_cost_saving=25.0,
+            estimated_cost_saving=50.0 * self._electricity_price(energy_analysis),
             implementation_difficulty=schemas.DifficultyLevel.medium,
             source="rule_based",
             analysis_period=energy_analysis.analysis_period,
@@ -84,13 +89,16 @@ class RecommendationEngine:
         from .ai_enhanced_recommendation_engine import AIEnhancedRecommendationEngine
         time_range_desc = AIEnhancedRecommendationEngine._build_time_range_info(self, energy_analysis=analysis)["description"]
 
+        # 按设备名称汇总能耗，避免对每个设备重复扫描分解列表
+        consumption_by_name = {}
+        for item in analysis.device_breakdown:
+            consumption_by_name[item['device_name']] = consumption_by_name.get(item['device_name'], 0) + item['consumption']
+
         # 分析高能耗设备
+        price = self._electricity_price(analysis)
         high_consumption_devices = []
         for device in devices:
-            device_consumption = sum(
-                item['consumption'] for item in analysis.device_breakdown
-                if item['device_name'] == device.name
-            )
+            device_consumption = consumption_by_name.get(device.name, 0)
 
             # 根据分析周期的天数调整阈值
             daily_threshold = 50  # 基础阈值
@@ -109,7 +117,7 @@ class RecommendationEngine:
                     description=f"您的{device.name}月耗电{consumption:.1f}kWh。建议将温度设置在26℃以上，定期清理过滤网，并在外出时关闭空调。",
                     category=schemas.RecommendationCategory.device_usage,
                     estimated_saving=consumption * 0.2,
-                    estimated_cost_saving=consumption * 0.2 * 0.5,
+                    estimated_cost_saving=consumption * 0.2 * price,
                     implementation_difficulty=schemas.DifficultyLevel.low,
                     device_id=device.id,
                     source="rule_based",
@@ -123,7 +131,7 @@ class RecommendationEngine:
                     description=f"您的{device.name}月耗电{consumption:.1f}kWh。建议将水温设置在45~50℃，使用前1小时开启，使用后及时关闭。",
                     category=schemas.RecommendationCategory.device_usage,
                     estimated_saving=consumption * 0.15,
-                    estimated_cost_saving=consumption * 0.15 * 0.5,
+                    estimated_cost_saving=consumption * 0.15 * price,
                     implementation_difficulty=schemas.DifficultyLevel.low,
                     device_id=device.id,
                     source="rule_based"
@@ -134,7 +142,7 @@ class RecommendationEngine:
                     description=f"您的{device.name}月耗电{consumption:.1f}kWh。建议：1. 冷藏室温度设为4~5℃，冷冻室设为-18℃；2. 减少开门次数，每次开门时间控制在30秒内；3. 定期清理冷凝器灰尘；4. 食材不要堆放过满",
                     category=schemas.RecommendationCategory.device_usage,
                     estimated_saving=consumption * 0.12,
-                    estimated_cost_saving=consumption * 0.12 * 0.5,
+                    estimated_cost_saving=consumption * 0.12 * price,
                     implementation_difficulty=schemas.DifficultyLevel.low,
                     device_id=device.id,
                     source="rule_based",
@@ -148,7 +156,7 @@ class RecommendationEngine:
                     description=f"您的{device.name}月耗电{consumption:.1f}kWh。建议：1. 将屏幕亮度调至50%-70%; 2. 音量控制在50%以内；3. 看完电视后直接关闭电源",
                     category=schemas.RecommendationCategory.device_usage,
                     estimated_saving=consumption * 0.15,
-                    estimated_cost_saving=consumption * 0.15 * 0.5,
+                    estimated_cost_saving=consumption * 0.15 * price,
                     implementation_difficulty=schemas.DifficultyLevel.low,
                     device_id=device.id,
                     source="ruled_based",
@@ -162,7 +170,7 @@ class RecommendationEngine:
                     description=f"您的{device.name}月耗电{consumption:.1f}kWh。建议：1. 尽量积攒足量衣物（80%负载）再洗，避免少量衣物多次运行；2. 优先用冷水洗（仅油污严重时用温水），可减少50%以上加热能耗；3. 选择节能程序（如‘ eco 模式’），缩短洗涤时间并降低转速；4. 定期清理过滤器（防止堵塞增加电机负担），脱水后及时断电。",
                     category=schemas.RecommendationCategory.device_usage,
                     estimated_saving=consumption * 0.2,  # 预计节省20%（基于行业数据）
-                    estimated_cost_saving=consumption * 0.2 * 0.5,  # 按0.5元/kWh计算
+                    estimated_cost_saving=consumption * 0.2 * price,
                     implementation_difficulty=schemas.DifficultyLevel.low,
                     device_id=device.id,
                     source="rule_based",
@@ -176,7 +184,7 @@ class RecommendationEngine:
                     description=f"您的{device.name}月耗电{consumption:.1f}kWh。建议：1. 将传统白炽灯/节能灯更换为LED灯（节能80%，寿命延长5-10倍）；2. 安装智能开关或调光器，人走灯灭，亮度按需调节（如客厅50%-70%，卧室30%-50%）；3. 优先利用自然光，白天减少开灯时间；4. 定期清洁灯具（积灰会降低30%亮度，导致不自觉调亮）。",
                     category=schemas.RecommendationCategory.device_usage,
                     estimated_saving=consumption * 0.3,  # 预计节省30%（LED替换+习惯优化）
-                    estimated_cost_saving=consumption * 0.3 * 0.5,
+                    estimated_cost_saving=consumption * 0.3 * price,
                     implementation_difficulty=schemas.DifficultyLevel.low,
                     device_id=device.id,
                     source="rule_based",
@@ -190,7 +198,7 @@ class RecommendationEngine:
                     description=f"您的{device.name}月耗电{consumption:.1f}kWh。建议：1. 启用电源管理（台式机设为10分钟无操作进入休眠，笔记本设为5分钟）；2. 不用时直接关机（避免待机，台式机待机功率约5-15W，笔记本2-5W）；3. 降低屏幕亮度至50%-70%，关闭键盘背光（若有）；4. 运行大型程序时集中处理，避免后台闲置进程过多。",
                     category=schemas.RecommendationCategory.device_usage,
                     estimated_saving=consumption * 0.25,  # 预计节省25%（电源管理+习惯优化）
-                    estimated_cost_saving=consumption * 0.25 * 0.5,
+                    estimated_cost_saving=consumption * 0.25 * price,
                     implementation_difficulty=schemas.DifficultyLevel.low,
                     device_id=device.id,
                     source="rule_based",
@@ -210,6 +218,8 @@ class RecommendationEngine:
         """基于生活习惯生成建议"""
         recommendations = []
 
+        price = self._electricity_price(analysis)
+
         # 根据周期调整建议内容
         period_note = f"(基于{analysis.analysis_period}数据)"
         from .ai_enhanced_recommendation_engine import AIEnhancedRecommendationEngine
@@ -222,7 +232,7 @@ class RecommendationEngine:
                 description="考虑到您家庭成员较多，建议合理安排用电时间，避免高峰时段同时使用多个大功率电器。",
                 category=schemas.RecommendationCategory.lifestyle,
                 estimated_saving=30.0,
-                estimated_cost_saving=15.0,
+                estimated_cost_saving=30.0 * price,
                 implementation_difficulty=schemas.DifficultyLevel.medium,
                 source="rule_based",
                 analysis_period=analysis.analysis_period,
@@ -236,7 +246,7 @@ class RecommendationEngine:
                 description="考虑到您的房屋面积较大，建议实施分区用电，不使用的房间及时关闭空调和照明。",
                 category=schemas.RecommendationCategory.lifestyle,
                 estimated_saving=40.0,
-                estimated_cost_saving=20.0,
+                estimated_cost_saving=40.0 * price,
                 implementation_difficulty=schemas.DifficultyLevel.medium,
                 source="rule_based",
                 analysis_period=analysis.analysis_period,
@@ -251,7 +261,7 @@ class RecommendationEngine:
                 description="将传统白炽灯更换为LED节能灯，可节省约80%的照明用电。",
                 category=schemas.RecommendationCategory.device_upgrade,
                 estimated_saving=15.0,
-                estimated_cost_saving=7.5,
+                estimated_cost_saving=15.0 * price,
                 implementation_difficulty=schemas.DifficultyLevel.low,
                 source="rule_based",
                 analysis_period=analysis.analysis_period,
@@ -263,7 +273,7 @@ class RecommendationEngine:
                 description="不使用电器时完全关闭电源，避免待机功耗。可使用智能插座辅助管理。",
                 category=schemas.RecommendationCategory.device_usage,
                 estimated_saving=10.0,
-                estimated_cost_saving=5.0,
+                estimated_cost_saving=10.0 * price,
                 implementation_difficulty=schemas.DifficultyLevel.low,
                 source="rule_based",
                 analysis_period=analysis.analysis_period,
@@ -279,17 +289,19 @@ def generate_user_recommendations(db: Session, user_id: int) -> List[schemas.Rec
     engine = RecommendationEngine(db, user_id)
     new_recommendations = engine.generate_recommendations()
 
-    saved_recommendations = []
+    # 一次查询已存在的建议标题，避免逐条查询
+    existing_titles = {
+        title for title, _ in recommendations_crud.get_existing_recommendation_keys(
+            db, user_id, [rec.title for rec in new_recommendations]
+        )
+    }
+
+    # 同一批次内同名建议只保存第一条，全部新建议一次提交
+    to_save = []
     for rec_data in new_recommendations:
         # 检查是否已存在类似建议
-        existing = db.query(models.Recommendation).filter(
-            models.Recommendation.title == rec_data.title,
-            models.Recommendation.user_id == user_id
-        ).first()
-
-        if not existing:
-            # saved_rec = crud.create_recommendation(db, rec_data, user_id)
-            saved_rec = recommendations_crud.create_recommendation(db, rec_data, user_id)
-            saved_recommendations.append(saved_rec)
+        if rec_data.title not in existing_titles:
+            existing_titles.add(rec_data.title)
+            to_save.append(rec_data)
 
-    return saved_recommendations
\ No newline at end of file
+    return recommendations_crud.create_recommendations(db, to_save, user_id)
@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+import random
+from typing import Dict, List, Optional
+from .fake_ai_service import FakeAIService, uniform_latency
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 设备类型对应的建议模板: (标题, 描述, 类别, 节能比例)
+_DEVICE_TEMPLATES = {
+    "air_conditioner": ("空调温度优化", "将空调温度设置在26℃以上，并定期清洗滤网。", "设备使用", 0.2),
+    "water_heater": ("热水器定时加热", "使用定时功能，仅在用水前1小时加热，水温设为45~50℃。", "设备使用", 0.15),
+    "refrigerator": ("冰箱节能设置", "冷藏室设为4~5℃，减少开门次数，定期清理冷凝器。", "设备使用", 0.1),
+    "lighting": ("更换LED照明", "将白炽灯和节能灯更换为LED灯具。", "设备升级", 0.3),
+    "computer": ("电脑电源管理", "启用休眠策略，不用时关机而不是待机。", "设备使用", 0.25),
+}
+
+
+class StubAIService(FakeAIService):
+    """
+        确定性桩AI服务（用于压测，不产生真实调用费用）
+
+        返回结构合法的分析和建议JSON，内容只由输入数据决定；
+        延迟、抖动和错误率可配置，随机序列由种子决定，可重复。
+    """
+
+    def __init__(self, latency_ms: Optional[float] = None,
+                 jitter_ms: Optional[float] = None,
+                 error_rate: Optional[float] = None,
+                 seed: Optional[int] = None):
+        latency_ms = latency_ms if latency_ms is not None else float(os.getenv("AI_STUB_LATENCY_MS", 500))
+        jitter_ms = jitter_ms if jitter_ms is not None else float(os.getenv("AI_STUB_JITTER_MS", 100))
+        seed = seed if seed is not None else int(os.getenv("AI_STUB_SEED", 0))
+
+        super().__init__(
+            name="stub",
+            latency=uniform_latency(max(0.0, latency_ms - jitter_ms), latency_ms + jitter_ms),
+            seed=seed
+        )
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv("AI_STUB_ERROR_RATE", 0))
+
+    def _should_fail(self) -> bool:
+        return self.rng.random() < self.error_rate
+
+    @staticmethod
+    def _digest(data) -> int:
+        payload = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str)
+        return int(hashlib.md5(payload.encode("utf-8")).hexdigest()[:8], 16)
+
+    async def analyze_energy_consumption(self, user_data: Dict, energy_data: Dict) -> Dict:
+        """返回由输入决定的能耗分析结果"""
+        await self._sleep()
+        if self._should_fail():
+            return {"error": "桩服务模拟分析失败"}
+
+        devices = sorted(energy_data.get('device_breakdown', []), key=lambda d: d['consumption'], reverse=True)
+        comparison = energy_data.get('comparison_with_benchmark', 0)
+        efficiency_level = "低" if comparison > 20 else ("高" if comparison < -10 else "中")
+
+        return {
+            "overall_assessment": f"总能耗{energy_data.get('total_consumption', 0):.1f}kWh，较基准{comparison:+.1f}%",
+            "key_insights": [f"{d['device_name']}耗电{d['consumption']:.1f}kWh" for d in devices[:3]],
+            "efficiency_level": efficiency_level,
+            "main_consumption_sources": [d['device_type'] for d in devices[:3]],
+            "seasonal_impact": f"{user_data.get('season', '未知')}季用电特征",
+            "digest": self._digest([user_data, energy_data])
+        }
+
+    async def generate_recommendations(self, analysis_result: Dict) -> List[Dict]:
+        """返回由分析结果决定的节能建议"""
+        await self._sleep()
+        if self._should_fail():
+            return []
+
+        digest = analysis_result.get("digest", self._digest(analysis_result))
+        rng = random.Random(digest)
+        device_types = analysis_result.get("main_consumption_sources") or []
+        if not isinstance(device_types, list):
+            device_types = []
+
+        recommendations = []
+        for device_type in device_types:
+            if device_type not in _DEVICE_TEMPLATES:
+                continue
+            title, description, category, ratio = _DEVICE_TEMPLATES[device_type]
+            saving = round(rng.uniform(10, 60) * ratio * 5, 1)
+            recommendations.append({
+                "title": title,
+                "description": description,
+                "category": category,
+                "estimated_saving": saving,
+                "estimated_cost_saving": round(saving * 0.5, 1),
+                "implementation_difficulty": rng.choice(["低", "中"]),
+                "reasoning": f"{device_type}为主要能耗来源"
+            })
+
+        recommendations.append({
+            "title": "待机功耗管理",
+            "description": "不使用电器时完全断电，可使用智能插座辅助管理。",
+            "category": "生活习惯",
+            "estimated_saving": 10.0,
+            "estimated_cost_saving": 5.0,
+            "implementation_difficulty": "低",
+            "reasoning": "待机功耗普遍存在"
+        })
+        return recommendations
@@ -0,0 +1,173 @@
+import os
+import json
+import threading
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# 电价说明：
+# 电价 = 分时电价（谷/平/峰，按小时划分时段） + 阶梯加价（按用户当月累计用电量分档）。
+# 日读数没有小时明细，按典型家庭日负荷曲线分摊到各小时；有小时数据时直接按小时计价。
+# 所有计算都基于numpy数组，一次处理任意多个用户、任意多天的读数。
+
+VALLEY, FLAT, PEAK = 0, 1, 2
+
+# 典型居民日负荷曲线（各小时占全天用电比例），早晚两个高峰
+DEFAULT_LOAD_PROFILE = (
+    0.025, 0.022, 0.020, 0.020, 0.020, 0.024, 0.035, 0.045, 0.042, 0.036, 0.035, 0.040,
+    0.045, 0.040, 0.036, 0.036, 0.040, 0.050, 0.065, 0.072, 0.070, 0.062, 0.046, 0.036,
+)
+
+
+@dataclass
+class Tariff:
+    """一个地区的电价方案"""
+    region: str
+    name: str
+    tou_prices: Tuple[float, float, float]           # 谷/平/峰 电价(元/kWh)
+    hour_periods: Tuple[int, ...] = (FLAT,) * 24      # 每小时所属时段
+    tier_limits: Tuple[float, ...] = ()               # 月度阶梯上限(kWh)，升序
+    tier_surcharges: Tuple[float, ...] = (0.0,)       # 各档加价(元/kWh)，比阶梯上限多一档
+    load_profile: Tuple[float, ...] = field(default=DEFAULT_LOAD_PROFILE)
+
+    def __post_init__(self):
+        if len(self.hour_periods) != 24 or len(self.load_profile) != 24:
+            raise ValueError(f"电价方案{self.region}的时段划分和负荷曲线必须是24小时")
+        if len(self.tier_surcharges) != len(self.tier_limits) + 1:
+            raise ValueError(f"电价方案{self.region}的阶梯加价数量应比阶梯上限多一个")
+        self.hourly_prices = np.asarray(self.tou_prices, dtype=float)[np.asarray(self.hour_periods)]
+        profile = np.asarray(self.load_profile, dtype=float)
+        # 日读数的等效分时电价（按负荷曲线加权）
+        self.daily_price = float(profile @ self.hourly_prices / profile.sum())
+        self._profile = profile / profile.sum()
+        self._tier_bounds = np.array((0.0,) + tuple(self.tier_limits) + (np.inf,))
+        self._surcharges = np.asarray(self.tier_surcharges, dtype=float)
+
+    def spread_daily(self, kwh: np.ndarray) -> np.ndarray:
+        """没有小时明细的日读数按负荷曲线分摊为(n, 24)的小时用电量"""
+        return np.asarray(kwh, dtype=float)[:, None] * self._profile
+
+    def tier_surcharge(self, monthly_kwh: float) -> float:
+        """当月累计用电量所在档位的加价"""
+        return float(self._surcharges[np.searchsorted(self._tier_bounds[1:-1], monthly_kwh, side="right")])
+
+    def marginal_price(self, monthly_kwh: float) -> float:
+        """在给定月用电量下，每少用1kWh节省的电费（用于估算建议的节省金额）"""
+        return round(self.daily_price + self.tier_surcharge(monthly_kwh), 4)
+
+    def reading_cost(self, kwh: float, month_to_date: float = 0.0) -> float:
+        """单条日读数的电费，month_to_date为该日之前的当月累计用电量"""
+        before, after = month_to_date, month_to_date + kwh
+        in_tier = np.clip(np.minimum(after, self._tier_bounds[1:]) - np.maximum(before, self._tier_bounds[:-1]), 0, None)
+        return round(float(kwh * self.daily_price + in_tier @ self._surcharges), 2)
+
+    def compute_costs(self, group_ids: np.ndarray, dates: np.ndarray, kwh: np.ndarray,
+                      hourly: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+            批量计算电费
+
+            group_ids: 每条读数所属的计费主体（用户ID）
+            dates: 读数日期（datetime64[D]）
+            kwh: 每条读数的用电量
+            hourly: 可选，形状为(n, 24)的小时用电量，提供时按实际小时计价
+            返回与输入顺序一致的电费数组
+        """
+        kwh = np.asarray(kwh, dtype=float)
+        if len(kwh) == 0:
+            return np.zeros(0)
+        group_ids = np.asarray(group_ids)
+        dates = np.asarray(dates, dtype="datetime64[D]")
+
+        # 分时部分
+        if hourly is not None:
+            tou_cost = np.asarray(hourly, dtype=float) @ self.hourly_prices
+        else:
+            tou_cost = kwh * self.daily_price
+
+        if len(self.tier_limits) == 0:
+            return tou_cost + kwh * self._surcharges[0]
+
+        # 阶梯部分：按(用户, 月份)计算当月累计用电量，再把每条读数拆分到各档
+        order = np.lexsort((dates, group_ids))
+        sorted_kwh = kwh[order]
+        months = dates[order].astype("datetime64[M]")
+        groups = group_ids[order]
+        segment_start = np.ones(len(order), dtype=bool)
+        segment_start[1:] = (groups[1:] != groups[:-1]) | (months[1:] != months[:-1])
+
+        cumulative = np.cumsum(sorted_kwh)
+        before_segment = (cumulative - sorted_kwh)[segment_start]
+        after = cumulative - before_segment[np.cumsum(segment_start) - 1]
+        before = after - sorted_kwh
+
+        lower, upper = self._tier_bounds[:-1], self._tier_bounds[1:]
+        in_tier = np.clip(np.minimum(after[:, None], upper) - np.maximum(before[:, None], lower), 0, None)
+        surcharge = np.empty(len(order))
+        surcharge[order] = in_tier @ self._surcharges
+
+        return tou_cost + surcharge
+
+    def cost_for_period(self, dates: np.ndarray, kwh: np.ndarray, start: date) -> float:
+        """单个用户的电费合计；dates需从start所在月的月初开始，以便正确计算阶梯"""
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        costs = self.compute_costs(np.zeros(len(dates), dtype=np.int64), dates, kwh)
+        return float(costs[dates >= np.datetime64(start)].sum())
+
+
+# 示例费率：实际部署时请按当地电网公布的价格通过 TARIFF_CONFIG 配置
+_VALLEY_23_7 = tuple(VALLEY if hour >= 23 or hour < 7 else FLAT for hour in range(24))
+BUILTIN_TARIFFS = {
+    # 默认：与原先估算一致的固定电价0.5元/kWh
+    "default": Tariff("default", "固定电价", (0.5, 0.5, 0.5)),
+    "beijing": Tariff(
+        "beijing", "北京居民阶梯+峰谷电价",
+        tou_prices=(0.3, 0.4883, 0.5883),
+        hour_periods=tuple(PEAK if 10 <= hour < 15 or 18 <= hour < 21 else period
+                           for hour, period in enumerate(_VALLEY_23_7)),
+        tier_limits=(240, 400), tier_surcharges=(0.0, 0.05, 0.3)
+    ),
+    "shanghai": Tariff(
+        "shanghai", "上海居民阶梯+峰谷电价",
+        tou_prices=(0.307, 0.617, 0.617),
+        hour_periods=tuple(VALLEY if hour >= 22 or hour < 6 else PEAK for hour in range(24)),
+        tier_limits=(260, 400), tier_surcharges=(0.0, 0.05, 0.3)
+    ),
+    "guangdong": Tariff(
+        "guangdong", "广东居民阶梯+峰谷电价",
+        tou_prices=(0.28, 0.59, 0.95),
+        hour_periods=tuple(PEAK if 10 <= hour < 12 or 14 <= hour < 19 else period
+                           for hour, period in enumerate(tuple(VALLEY if hour < 8 else FLAT for hour in range(24)))),
+        tier_limits=(200, 400), tier_surcharges=(0.0, 0.05, 0.3)
+    ),
+}
+
+
+def _load_tariffs() -> Dict[str, Tariff]:
+    """内置费率 + TARIFF_CONFIG 指定的JSON文件（地区 -> Tariff字段）"""
+    tariffs = dict(BUILTIN_TARIFFS)
+    config_path = os.getenv("TARIFF_CONFIG")
+    if config_path:
+        with open(config_path, encoding="utf-8") as f:
+            for region, spec in json.load(f).items():
+                spec = {key: tuple(value) if isinstance(value, list) else value for key, value in spec.items()}
+                tariffs[region] = Tariff(region=region, **spec)
+    return tariffs
+
+
+_tariffs: Optional[Dict[str, Tariff]] = None
+_tariffs_lock = threading.Lock()
+
+
+def get_tariff(region: Optional[str] = None) -> Tariff:
+    """获取地区电价方案，未指定时使用 TARIFF_REGION"""
+    global _tariffs
+    if _tariffs is None:
+        with _tariffs_lock:
+            if _tariffs is None:
+                _tariffs = _load_tariffs()
+    region = region or os.getenv("TARIFF_REGION", "default")
+    if region not in _tariffs:
+        raise ValueError(f"未知的电价地区: {region}")
+    return _tariffs[region]
@@ -1,10 +1,13 @@
 import os
+import asyncio
 from openai import AsyncOpenAI
 from typing import Dict, List, Any
 import json
-from .ai_base_service import AIBaseService
+import time
+from .ai_base_service import AIBaseService, ANALYSIS_SYSTEM_PROMPT, RECOMMENDATION_SYSTEM_PROMPT
 # from ..routers.recommendations import logger
 import logging
+from ..metrics import record_llm_call
 logger = logging.getLogger(__name__)
 
 class TongYiService(AIBaseService):
@@ -22,29 +25,22 @@ class TongYiService(AIBaseService):
             api_key=self.api_key,
             base_url=self.base_url
         )
-        logger.info(f"通义千问服务初始化成功，模型: {self.model}")
+        logger.debug("通义千问服务初始化成功，模型: %s", self.model)
 
     async def analyze_energy_consumption(self, user_data: Dict, energy_data: Dict) -> Dict:
         """使用通义千问分析能耗数据"""
 
         prompt = self.build_analysis_prompt(user_data, energy_data)
-        logger.info(f"分析提示词长度: {len(prompt)}")
 
+        started = time.perf_counter()
         try:
-            logger.info(f"调用通义千问API, 模型: {self.model}")
+            logger.debug("调用通义千问API, 模型: %s", self.model)
             response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {
                         "role": "system",
-                        "content": """你是一个专业的能源管理专家，擅长分析家庭能耗数据并提供专业的节能建议。
-请严格按照JSON格式返回分析结果，包含以下字段：
-- overall_assessment: 整体评估
-- key_insights: 关键发现列表
-- efficiency_level: 能效等级(高/中/低)
-- main_consumption_sources: 主要能耗来源分析
-- seasonal_impact: 季节性影响分析
-请确保返回纯JSON格式，不要包含其他文本。"""
+                        "content": ANALYSIS_SYSTEM_PROMPT
                     },
                     {
                         "role": "user",
@@ -56,36 +52,32 @@ class TongYiService(AIBaseService):
                 response_format={"type": "json_object"}  # 要求返回JSON格式
             )
 
+            self._record_call("analysis", started, "success", response)
+
             result = response.choices[0].message.content
             return self.parse_ai_response(result)
 
+        except asyncio.CancelledError:
+            self._record_call("analysis", started, "cancelled")
+            raise
         except Exception as e:
+            self._record_call("analysis", started, "error")
             return {"error": f"通义千问分析失败: {str(e)}"}
 
     async def generate_recommendations(self, analysis_result: Dict) -> List[Dict]:
         """使用通义千问生成节能建议"""
 
         prompt = self.build_recommendation_prompt(analysis_result)
-        logger.info(f"建议生成提示词长度: {len(prompt)}")
 
+        started = time.perf_counter()
         try:
-            logger.info(f"调用通义千问生成模型，模型: {self.model}")
+            logger.debug("调用通义千问生成模型，模型: %s", self.model)
             response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {
                         "role": "system",
-                        "content": """你是一个专业的节能顾问，能够提供具体可行的家庭节能建议。
-请严格按照JSON格式返回建议列表，包含以下字段：
-- recommendations: 建议列表，每个建议包含：
-  - title: 建议标题
-  - description: 详细描述
-  - category: 类别(设备使用/生活习惯/设备升级)
-  - estimated_saving: 预计节省能耗(kWh/月)
-  - estimated_cost_saving: 预计节省费用(元/月)
-  - implementation_difficulty: 实施难度(低/中/高)
-  - reasoning: 建议依据
-请确保返回纯JSON格式，不要包含其他文本。"""
+                        "content": RECOMMENDATION_SYSTEM_PROMPT
                     },
                     {
                         "role": "user",
@@ -97,13 +89,29 @@ class TongYiService(AIBaseService):
                 response_format={"type": "json_object"}  # 要求返回JSON格式
             )
 
+            self._record_call("recommendations", started, "success", response)
+
             result = response.choices[0].message.content
             parsed_result = self.parse_ai_response(result)
-            logger.info(f"解析后的建议结果: {parsed_result}")
+            logger.debug("解析后的建议结果: %s", parsed_result)
 
             # 从解析结果中提取建议列表
             return parsed_result.get("recommendations", [])
 
+        except asyncio.CancelledError:
+            # 对冲请求中被取消（备用服务先返回），不经过 except Exception
+            self._record_call("recommendations", started, "cancelled")
+            raise
         except Exception as e:
-            print(f"通义千问建议生成失败: {e}")
-            return []
\ No newline at end of file
+            self._record_call("recommendations", started, "error")
+            logger.error("通义千问建议生成失败: %s", e)
+            return []
+
+    def _record_call(self, operation: str, started: float, outcome: str, response=None):
+        """记录调用耗时和token消耗"""
+        usage = getattr(response, "usage", None)
+        record_llm_call(
+            "tongyi", operation, time.perf_counter() - started, outcome,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0
+        )
\ No newline at end of file
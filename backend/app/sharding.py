@@ -0,0 +1,221 @@
+import os
+import time
+import bisect
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from fastapi import HTTPException, status
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import models
+from .database import DATABASE_URL, engine as primary_engine, make_engine, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# 分片说明：
+# 主库（DATABASE_URL）保存全局数据：用户账号（登录、分配用户ID）、分片目录；
+# 每个用户的设备、读数、建议等数据保存在所属分片上，分片上同时保存该用户账号的镜像行，
+# 以便分片内的关联查询（设备、用户资料、基准数据）不跨库。
+# 用户所属分片 = 分片目录中的指定值（迁移中或手工指定），否则由一致性哈希环决定。
+# 未配置 SHARD_URLS 时只有一个分片（即主库），不查询目录，行为与不分片完全相同。
+# SHARD_URLS 格式：名称=数据库URL，逗号分隔，如 shard0=sqlite:///./shard0.db,shard1=sqlite:///./shard1.db
+
+PRIMARY = "primary"
+T = TypeVar("T")
+
+
+class ShardMovingError(Exception):
+    """用户数据正在迁移"""
+
+
+class HashRing:
+    """一致性哈希环：每个分片若干虚拟节点，增删分片时只有少量用户需要迁移"""
+
+    def __init__(self, names: List[str], vnodes: int = 64):
+        points = sorted((self._hash(f"{name}#{index}"), name) for name in names for index in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+    def lookup(self, user_id: int) -> str:
+        index = bisect.bisect(self._keys, self._hash(f"user:{user_id}")) % len(self._keys)
+        return self._names[index]
+
+
+def parse_shard_urls(value: Optional[str]) -> Dict[str, str]:
+    if not value:
+        return {PRIMARY: DATABASE_URL}
+    shards = {}
+    for index, item in enumerate(part.strip() for part in value.split(",") if part.strip()):
+        # 名称可省略，URL的查询参数中可能含有"="
+        if "=" in item.split("://", 1)[0]:
+            name, url = item.split("=", 1)
+        else:
+            name, url = f"shard{index}", item
+        shards[name.strip()] = url.strip()
+    return shards
+
+
+class ShardRouter:
+    """按用户ID把请求路由到对应分片"""
+
+    def __init__(self, urls: Dict[str, str], directory_ttl: float = 2.0, directory_size: int = 10000):
+        self.urls = urls
+        self.ring = HashRing(list(urls))
+        self.directory_ttl = directory_ttl
+        self.directory_size = directory_size
+        self._engines: Dict[str, Engine] = {}
+        self._sessions: Dict[str, sessionmaker] = {}
+        # 目录缓存按最近使用淘汰，超过 directory_size 个用户时丢弃最久未访问的
+        self._directory: "OrderedDict[int, Tuple[float, Optional[Tuple[str, str]]]]" = OrderedDict()
+        self._directory_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.urls)
+
+    @property
+    def single(self) -> bool:
+        return len(self.urls) == 1
+
+    def engine(self, name: str) -> Engine:
+        with self._lock:
+            if name not in self._engines:
+                url = self.urls[name]
+                self._engines[name] = primary_engine if url == DATABASE_URL else make_engine(url)
+                self._sessions[name] = sessionmaker(autocommit=False, autoflush=False, bind=self._engines[name])
+            return self._engines[name]
+
+    def session(self, name: str) -> Session:
+        self.engine(name)
+        return self._sessions[name]()
+
+    def is_primary(self, name: str) -> bool:
+        return self.engine(name) is primary_engine
+
+    # ---- 目录 ----
+
+    def directory_entry(self, user_id: int, fresh: bool = False) -> Optional[Tuple[str, str]]:
+        """目录中的(分片, 状态)，带短时缓存"""
+        now = time.monotonic()
+        with self._directory_lock:
+            cached = self._directory.get(user_id)
+            if not fresh and cached is not None and cached[0] > now:
+                self._directory.move_to_end(user_id)
+                return cached[1]
+
+        with SessionLocal() as db:
+            row = db.get(models.ShardAssignment, user_id)
+            entry = (row.shard, row.state) if row is not None else None
+        with self._directory_lock:
+            self._directory[user_id] = (now + self.directory_ttl, entry)
+            self._directory.move_to_end(user_id)
+            while len(self._directory) > self.directory_size:
+                self._directory.popitem(last=False)
+        return entry
+
+    def shard_for(self, user_id: int) -> str:
+        """用户所属分片；用户数据正在迁移时抛出 ShardMovingError"""
+        if self.single:
+            return self.names[0]
+        entry = self.directory_entry(user_id)
+        if entry is None:
+            return self.ring.lookup(user_id)
+        shard, state = entry
+        if state == "moving":
+            raise ShardMovingError(user_id)
+        return shard
+
+    def session_for_user(self, user_id: int) -> Session:
+        return self.session(self.shard_for(user_id))
+
+    # ---- 跨分片 ----
+
+    def scatter(self, fn: Callable[[Session], T], names: Optional[List[str]] = None) -> Dict[str, T]:
+        """在每个分片上并行执行 fn(session)，返回 {分片: 结果}"""
+        names = names or self.names
+
+        def run(name: str) -> T:
+            with self.session(name) as db:
+                return fn(db)
+
+        if len(names) == 1:
+            return {names[0]: run(names[0])}
+        with ThreadPoolExecutor(max_workers=len(names)) as pool:
+            return dict(zip(names, pool.map(run, names)))
+
+    def group_users(self, user_ids: List[int]) -> Dict[str, List[int]]:
+        """按所属分片分组用户ID（跳过正在迁移的用户）"""
+        groups: Dict[str, List[int]] = {}
+        for user_id in user_ids:
+            try:
+                groups.setdefault(self.shard_for(user_id), []).append(user_id)
+            except ShardMovingError:
+                logger.warning("用户 %s 正在迁移，跳过", user_id)
+        return groups
+
+    # ---- 用户镜像 ----
+
+    def sync_user(self, user: models.User):
+        """把主库中的用户账号同步到其所属分片"""
+        try:
+            name = self.shard_for(user.id)
+        except ShardMovingError:
+            # 迁移工具在切换前会从主库重新复制账号
+            return
+        if self.is_primary(name):
+            return
+        columns = {attr.key: getattr(user, attr.key) for attr in sa_inspect(models.User).column_attrs}
+        with self.session(name) as db:
+            db.merge(models.User(**columns))
+            db.commit()
+
+    def create_all(self):
+        for name in self.names:
+            models.Base.metadata.create_all(bind=self.engine(name))
+
+
+_router: Optional[ShardRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_shard_router() -> ShardRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ShardRouter(parse_shard_urls(os.getenv("SHARD_URLS")),
+                                      float(os.getenv("SHARD_DIRECTORY_TTL", 2)),
+                                      int(os.getenv("SHARD_DIRECTORY_CACHE_SIZE", 10000)))
+    return _router
+
+
+def shard_moving_exception() -> HTTPException:
+    """用户数据正在迁移时返回给客户端的503"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="用户数据迁移中，请稍后再试",
+        headers={"Retry-After": "1"}
+    )
+
+
+def user_session(user_id: int) -> Iterator[Session]:
+    """请求级的用户分片会话（依赖项使用）"""
+    try:
+        db = get_shard_router().session_for_user(user_id)
+    except ShardMovingError:
+        raise shard_moving_exception()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,142 @@
+import os
+import re
+import time
+import threading
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+logger = logging.getLogger(__name__)
+
+# SQLite部署配置说明：
+# 小型部署直接使用SQLite文件。默认连接参数下（回滚日志、连接只能在创建线程使用、每个连接各自的设置），
+# 分析查询和读数写入并发时经常出现 "database is locked"。SQLITE_PROFILE=tuned（默认）时：
+# - 每个新连接通过connect事件设置：WAL日志（读写互不阻塞）、synchronous=NORMAL（WAL下只在检查点fsync）、
+#   mmap_size、cache_size、busy_timeout（等待写锁而不是立即报错）、temp_store=MEMORY；
+# - 连接池中的连接可跨线程使用，多个连接并发读取；
+# - 单写者队列：进程内的写事务在第一条写语句前排队获取写锁，提交或回滚时释放，
+#   同一时刻只有一个连接持有SQLite写锁，其余写者在进程内按顺序等待，不再依赖SQLite的忙等重试。
+# SQLITE_PROFILE=default 时保持SQLAlchemy默认配置（用于对比测试）。
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 268435456,     # 256MB
+    "cache_size": -65536,       # 负数单位为KB，即64MB
+    "busy_timeout": 5000,       # 毫秒
+    "temp_store": "MEMORY",
+}
+
+WRITE_STATEMENT = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b", re.IGNORECASE)
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def is_memory(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:" or database.startswith("file::memory:")
+
+
+def sqlite_profile() -> str:
+    return os.getenv("SQLITE_PROFILE", "tuned").lower()
+
+
+def sqlite_pragmas() -> Dict[str, object]:
+    """默认PRAGMA，可用 SQLITE_<名称> 环境变量覆盖，如 SQLITE_MMAP_SIZE=0"""
+    return {name: os.getenv(f"SQLITE_{name.upper()}", value) for name, value in DEFAULT_PRAGMAS.items()}
+
+
+def _tuned(url: str, profile: Optional[str]) -> bool:
+    return is_sqlite(url) and not is_memory(url) and (profile or sqlite_profile()) == "tuned"
+
+
+def engine_options(url: str, profile: Optional[str] = None) -> Dict:
+    """create_engine 的额外参数：非SQLite或使用默认配置时为空"""
+    if not _tuned(url, profile):
+        return {}
+    busy_timeout = float(sqlite_pragmas()["busy_timeout"]) / 1000
+    return {
+        "connect_args": {"check_same_thread": False, "timeout": busy_timeout},
+        "pool_size": int(os.getenv("SQLITE_POOL_SIZE", 8)),
+        "max_overflow": int(os.getenv("SQLITE_MAX_OVERFLOW", 8)),
+    }
+
+
+class SingleWriter:
+    """进程内写锁：连接上第一条写语句执行前获取，事务结束时释放"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # 等待中的写者按到达顺序获得写锁
+        self._queue: List[object] = []
+        self._holder = None
+
+    def acquire(self, token) -> bool:
+        """超时返回False（如同一线程嵌套的另一个会话持有写锁），此时交由SQLite自身的锁处理"""
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            self._queue.append(token)
+            while self._holder is not None or self._queue[0] is not token:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._queue.remove(token)
+                    self._changed.notify_all()
+                    return False
+                self._changed.wait(remaining)
+            self._queue.pop(0)
+            self._holder = token
+            return True
+
+    def release(self, token):
+        with self._lock:
+            if self._holder is token:
+                self._holder = None
+                self._changed.notify_all()
+
+
+def configure_engine(engine: Engine, url: str, profile: Optional[str] = None):
+    """为SQLite文件数据库注册PRAGMA和单写者队列"""
+    if not _tuned(url, profile):
+        return
+    pragmas = sqlite_pragmas()
+    writer = SingleWriter(float(pragmas["busy_timeout"]) / 1000)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def acquire_writer(conn, cursor, statement, parameters, context, executemany):
+        if "sqlite_writer" not in conn.info and WRITE_STATEMENT.match(statement):
+            token = object()
+            if writer.acquire(token):
+                conn.info["sqlite_writer"] = token
+            else:
+                logger.warning("等待SQLite写锁超时，直接执行: %s", statement[:80])
+
+    def release_writer(conn):
+        token = conn.info.pop("sqlite_writer", None)
+        if token is not None:
+            writer.release(token)
+
+    # 在DBAPI提交前触发；释放后下一个写者要等提交完成才能拿到SQLite写锁，由busy_timeout覆盖这段等待
+    event.listen(engine, "commit", release_writer)
+    event.listen(engine, "rollback", release_writer)
+
+    @event.listens_for(engine, "checkin")
+    def release_on_checkin(dbapi_connection, connection_record):
+        # 连接失效等未经过commit/rollback事件就归还的情况
+        token = connection_record.info.pop("sqlite_writer", None)
+        if token is not None:
+            writer.release(token)
+
+    logger.info("SQLite配置: %s", ", ".join(f"{name}={value}" for name, value in pragmas.items()))
@@ -0,0 +1,36 @@
+import sys
+import asyncio
+import argparse
+
+from .. import models, schemas
+from ..database import SessionLocal
+from ..services.ai_batch import AIBatchRunner, create_batch_provider
+from ..sharding import get_shard_router
+
+# 夜间批量刷新AI节能建议：
+#   python -m app.tools.ai_batch [--provider tongyi|local] [--period current_month] [--poll-interval 30]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="为全部用户批量生成AI节能建议")
+    parser.add_argument("--provider", default="tongyi", choices=["tongyi", "local"])
+    parser.add_argument("--period", default="current_month", choices=[p.value for p in schemas.AnalysisPeriod])
+    parser.add_argument("--poll-interval", type=float, default=30)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        user_ids = [row.id for row in db.query(models.User.id).all()]
+
+    # 按分片分组，每组用所属分片的会话读取数据、保存建议（未分片时只有一组）
+    router = get_shard_router()
+    saved = {}
+    for name, shard_user_ids in router.group_users(user_ids).items():
+        with router.session(name) as db:
+            runner = AIBatchRunner(db, create_batch_provider(args.provider), poll_interval=args.poll_interval)
+            saved.update(asyncio.run(runner.run(shard_user_ids, schemas.AnalysisPeriod(args.period))))
+    print(f"完成: {sum(len(v) for v in saved.values())}条建议，{len(saved)}个用户")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+import os
+import json
+import math
+import time
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+
+def percentile(values: List[float], q: float) -> float:
+    """计算百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+class PoolSampler(threading.Thread):
+    """定期采样数据库连接池使用情况（仅进程内启动服务时可用）"""
+
+    def __init__(self, engine, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.engine = engine
+        self.interval = interval
+        self.samples: List[int] = []
+        self.saturated_samples = 0
+        self._stop_event = threading.Event()
+
+        pool = engine.pool
+        self.capacity = pool.size() + max(pool._max_overflow, 0) if hasattr(pool, "_max_overflow") else None
+
+    def run(self):
+        pool = self.engine.pool
+        while not self._stop_event.is_set():
+            checked_out = pool.checkedout()
+            self.samples.append(checked_out)
+            if self.capacity and checked_out >= self.capacity:
+                self.saturated_samples += 1
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def report(self) -> Dict:
+        if not self.samples:
+            return {}
+        return {
+            "capacity": self.capacity,
+            "max_checked_out": max(self.samples),
+            "avg_checked_out": sum(self.samples) / len(self.samples),
+            "saturated_ratio": self.saturated_samples / len(self.samples)
+        }
+
+
+def start_server(host: str, port: int):
+    """在后台线程中启动服务（使用桩AI服务）"""
+    os.environ.setdefault("AI_PROVIDER", "stub")
+    # 压测请求不带令牌、来自同一地址，会共用一个AI令牌桶（默认每30秒1次），放宽后只保留并发上限
+    os.environ.setdefault("ADMISSION_AI_RATE", "1000000")
+    os.environ.setdefault("ADMISSION_AI_BURST", "1000000")
+    import uvicorn
+    from ..main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def send_request(base_url: str, user_id: int, period: str, timeout: float) -> Dict:
+    """发送一次AI建议生成请求"""
+    url = f"{base_url}/api/recommendations/ai/generate?user_id={user_id}&period={period}"
+    request = urllib.request.Request(url, method="POST")
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = json.loads(response.read() or b"[]")
+            return {
+                "status": response.status,
+                "latency": time.perf_counter() - started,
+                "fallback": response.headers.get("X-AI-Fallback") == "true",
+                "count": len(body)
+            }
+    except urllib.error.HTTPError as e:
+        return {"status": e.code, "latency": time.perf_counter() - started, "fallback": False, "count": 0}
+    except Exception:
+        return {"status": 0, "latency": time.perf_counter() - started, "fallback": False, "count": 0}
+
+
+def run_load_test(base_url: str, user_ids: List[int], total_requests: int,
+                  concurrency: int, period: str = "current_month",
+                  timeout: float = 60, engine=None) -> Dict:
+    """并发驱动AI建议接口，返回吞吐量、延迟分位数、连接池和回退统计"""
+
+    sampler: Optional[PoolSampler] = PoolSampler(engine) if engine is not None else None
+    if sampler:
+        sampler.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(
+            lambda i: send_request(base_url, user_ids[i % len(user_ids)], period, timeout),
+            range(total_requests)
+        ))
+    elapsed = time.perf_counter() - started
+
+    if sampler:
+        sampler.stop()
+
+    succeeded = [r for r in results if r["status"] == 200]
+    latencies = [r["latency"] for r in succeeded]
+
+    return {
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": total_requests / elapsed if elapsed > 0 else 0,
+        "success_rate": len(succeeded) / total_requests if total_requests else 0,
+        "error_statuses": sorted({r["status"] for r in results if r["status"] != 200}),
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p90": percentile(latencies, 0.90) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": max(latencies, default=0) * 1000
+        },
+        "fallback_rate": sum(1 for r in succeeded if r["fallback"]) / len(succeeded) if succeeded else 0,
+        "db_pool": sampler.report() if sampler else "仅在 --serve 模式下可用"
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI建议接口压测工具")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--user-ids", default="1", help="逗号分隔的用户ID")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--period", default="current_month")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--serve", action="store_true", help="在进程内启动服务（使用桩AI服务）并采样连接池")
+    args = parser.parse_args()
+
+    engine = None
+    server = None
+    base_url = args.base_url
+    if args.serve:
+        host, _, port = base_url.split("//")[-1].partition(":")
+        server, thread = start_server(host, int(port or 8000))
+        from ..database import engine
+
+    try:
+        report = run_load_test(
+            base_url,
+            [int(u) for u in args.user_ids.split(",")],
+            args.requests,
+            args.concurrency,
+            args.period,
+            args.timeout,
+            engine
+        )
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    finally:
+        if server is not None:
+            server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import sys
+import time
+import argparse
+import threading
+from datetime import date, timedelta
+
+from sqlalchemy import select
+
+from .. import models, schemas
+from ..crud import energy_readings as energy_readings_crud
+from ..database import SessionLocal, init_db
+from ..services.ingest_buffer import IngestBuffer
+
+# 读数写入吞吐量对比：逐条提交 vs 成组提交
+#   python -m app.tools.bench_ingest --threads 32 --rows 100
+# 每个线程模拟一个上报客户端，连续写入 --rows 条总读数；结果写入 DATABASE_URL 指定的数据库。
+
+
+def reading(index: int) -> schemas.EnergyReadingCreate:
+    return schemas.EnergyReadingCreate(
+        reading_value=10 + index % 7,
+        reading_type=schemas.ReadingType.total,
+        reading_date=date.today() - timedelta(days=index % 365)
+    )
+
+
+def run(name: str, write, user_ids, rows: int):
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def client(user_id: int):
+        local, failed = [], 0
+        for index in range(rows):
+            started = time.perf_counter()
+            try:
+                write(user_id, reading(index))
+            except Exception:
+                # SQLite多个连接同时写入时可能报 database is locked
+                failed += 1
+                continue
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            failures.append(failed)
+
+    workers = [threading.Thread(target=client, args=(user_id,)) for user_id in user_ids]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"{name:<10} {total / elapsed:10,.0f} 条/秒  "
+          f"p50 {latencies[total // 2] * 1000:7.2f} ms  p99 {latencies[int(total * 0.99)] * 1000:7.2f} ms  "
+          f"失败 {sum(failures)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="读数写入吞吐量对比")
+    parser.add_argument("--threads", type=int, default=32, help="并发客户端数（每个客户端一个用户）")
+    parser.add_argument("--rows", type=int, default=100, help="每个客户端写入的读数条数")
+    parser.add_argument("--flush-ms", type=float, default=20)
+    parser.add_argument("--max-rows", type=int, default=500)
+    args = parser.parse_args()
+
+    init_db()
+    with SessionLocal() as db:
+        user_ids = db.execute(select(models.User.id).order_by(models.User.id).limit(args.threads)).scalars().all()
+    if len(user_ids) < args.threads:
+        print(f"数据库中只有{len(user_ids)}个用户，请先执行 app.tools.generate_data", file=sys.stderr)
+        return 1
+
+    def direct(user_id, item):
+        with SessionLocal() as db:
+            energy_readings_crud.create_energy_reading(db, item, user_id)
+
+    buffer = IngestBuffer(flush_interval=args.flush_ms / 1000, max_rows=args.max_rows)
+
+    def buffered(user_id, item):
+        buffer.submit(user_id, item).result()
+
+    run("逐条提交", direct, user_ids, args.rows)
+    run("成组提交", buffered, user_ids, args.rows)
+    buffer.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
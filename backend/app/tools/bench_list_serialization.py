@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import argparse
+from datetime import date, timedelta
+from typing import Callable, List
+
+# 基准测试使用内存SQLite，需在导入应用模块前设置
+os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL", "sqlite://")
+
+import orjson
+from pydantic import TypeAdapter
+
+from ..database import Base, engine, SessionLocal
+from .. import models, schemas
+from ..crud import devices as devices_crud
+from ..crud import energy_readings as energy_readings_crud
+from ..crud import recommendations as recommendations_crud
+
+
+def seed(db, rows: int) -> int:
+    """写入一个用户及指定数量的设备、读数和建议"""
+    user = models.User(username="bench", email="bench@example.com", hashed_password="x", family_size=3, house_size=90)
+    db.add(user)
+    db.flush()
+
+    today = date.today()
+    db.add_all([
+        models.Device(user_id=user.id, name=f"设备{i}", device_type=models.DeviceType.other,
+                      power_rating=100 + i, daily_usage_hours=2, location="客厅")
+        for i in range(rows)
+    ])
+    db.add_all([
+        models.EnergyReading(user_id=user.id, reading_value=10 + i % 7, reading_type=models.ReadingType.total,
+                             reading_date=today - timedelta(days=i), cost=5.0)
+        for i in range(rows)
+    ])
+    db.add_all([
+        models.Recommendation(user_id=user.id, title=f"建议{i}", description="描述" * 20,
+                              category=models.RecommendationCategory.lifestyle, estimated_saving=10,
+                              estimated_cost_saving=5, source="rule_based")
+        for i in range(rows)
+    ])
+    db.commit()
+    return user.id
+
+
+def measure(fn: Callable[[], bytes], duration: float) -> float:
+    """在给定时长内重复执行，返回每秒执行次数"""
+    fn()  # 预热
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列表接口序列化路径基准测试")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=3.0, help="每个场景的测试时长（秒）")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user_id = seed(db, args.limit)
+
+    cases = [
+        ("/my-energy-reading",
+         lambda: energy_readings_crud.get_energy_readings_by_user(db, user_id, limit=args.limit),
+         lambda: energy_readings_crud.get_energy_reading_rows_by_user(db, user_id, limit=args.limit),
+         schemas.EnergyReadingResponse),
+        ("/my-devices",
+         lambda: devices_crud.get_devices_by_user(db, user_id, limit=args.limit),
+         lambda: devices_crud.get_device_rows_by_user(db, user_id, limit=args.limit),
+         schemas.DeviceResponse),
+        ("/my-recommendations",
+         lambda: recommendations_crud.get_recommendations_by_user(db, user_id, limit=args.limit),
+         lambda: recommendations_crud.get_recommendation_rows_by_user(db, user_id, limit=args.limit),
+         schemas.RecommendationResponse),
+    ]
+
+    print(f"limit={args.limit}")
+    print(f"{'endpoint':<22}{'orm+pydantic rps':>18}{'core+orjson rps':>18}{'speedup':>10}")
+    for name, orm_query, rows_query, schema in cases:
+        adapter = TypeAdapter(List[schema])
+
+        # 原路径：ORM对象 -> from_attributes校验 -> JSON
+        def orm_path():
+            db.expunge_all()
+            return adapter.dump_json(adapter.validate_python(orm_query(), from_attributes=True))
+
+        # 快速路径：Core行 -> 字典 -> orjson
+        def fast_path():
+            return orjson.dumps(rows_query())
+
+        assert orjson.loads(orm_path()) == orjson.loads(fast_path()), f"{name} 两种路径输出不一致"
+
+        orm_rps = measure(orm_path, args.duration)
+        fast_rps = measure(fast_path, args.duration)
+        print(f"{name:<22}{orm_rps:>18.1f}{fast_rps:>18.1f}{fast_rps / orm_rps:>9.2f}x")
+
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
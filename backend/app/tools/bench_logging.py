@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+import queue
+import logging
+import argparse
+import tempfile
+import threading
+from datetime import date
+from logging.handlers import QueueListener
+
+from ..logging_config import LazyQueueHandler, SamplingFilter, TEXT_FORMAT, JsonFormatter
+
+
+def eager_hot_path(logger: logging.Logger, user_id: int):
+    """旧写法：每次调用两条INFO级f-string日志"""
+    start, end = date(2024, 1, 1), date(2024, 1, 31)
+    logger.info(f"get_energy_analysis 调用参数: user_id={user_id}, period=current_month, start_date={start}, end_date={end}")
+    logger.info(f"分析周期: current_month, 日期范围: {start} 到 {end}, 天数: {(end - start).days + 1}")
+
+
+def lazy_hot_path(logger: logging.Logger, user_id: int, level: int = logging.INFO):
+    """新写法：%-style参数延迟格式化"""
+    start, end = date(2024, 1, 1), date(2024, 1, 31)
+    logger.log(level, "get_energy_analysis 调用参数: user_id=%s, period=%s, start_date=%s, end_date=%s",
+               user_id, "current_month", start, end)
+    logger.log(level, "分析周期: %s, 日期范围: %s 到 %s, 天数: %s", "current_month", start, end, (end - start).days + 1)
+
+
+def file_handlers(directory: str, formatter: logging.Formatter):
+    handlers = [
+        logging.StreamHandler(open(os.devnull, "w", encoding="utf-8")),
+        logging.FileHandler(os.path.join(directory, "bench.log"), encoding="utf-8"),
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def run_scenario(name: str, configure, hot_path, threads: int, calls: int, directory: str):
+    """多线程调用热点函数，统计调用方吞吐量及后台写完日志所需时间"""
+    logger = logging.getLogger(f"bench.{name}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    listener = configure(logger, directory)
+
+    def worker():
+        for i in range(calls):
+            hot_path(logger, i)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    caller_elapsed = time.perf_counter() - started
+
+    if listener is not None:
+        listener.stop()
+    total_elapsed = time.perf_counter() - started
+    for handler in logger.handlers + (list(listener.handlers) if listener else []):
+        handler.close()
+    logger.handlers.clear()
+
+    total_calls = threads * calls
+    return {
+        "calls_per_sec": total_calls / caller_elapsed,
+        "caller_us_per_call": caller_elapsed / total_calls * 1_000_000,
+        "drained_seconds": total_elapsed,
+    }
+
+
+def sync_handlers(logger, directory):
+    for handler in file_handlers(directory, logging.Formatter(TEXT_FORMAT)):
+        logger.addHandler(handler)
+    return None
+
+
+def queued(formatter_factory, sampling=None):
+    def configure(logger, directory):
+        log_queue = queue.SimpleQueue()
+        handler = LazyQueueHandler(log_queue)
+        if sampling:
+            handler.addFilter(SamplingFilter({logger.name: sampling}))
+        logger.addHandler(handler)
+        listener = QueueListener(log_queue, *file_handlers(directory, formatter_factory()))
+        listener.start()
+        return listener
+    return configure
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志管道吞吐量基准测试")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=20_000, help="每个线程的调用次数")
+    args = parser.parse_args()
+
+    text = lambda: logging.Formatter(TEXT_FORMAT)
+    scenarios = [
+        ("sync handlers, eager f-string INFO", sync_handlers, eager_hot_path),
+        ("queue, lazy %-style INFO", queued(text), lazy_hot_path),
+        ("queue + JSON, lazy %-style INFO", queued(JsonFormatter), lazy_hot_path),
+        ("queue, INFO sampled 10%", queued(text, sampling=0.1), lazy_hot_path),
+        ("queue, demoted to DEBUG (disabled)", queued(text),
+         lambda logger, i: lazy_hot_path(logger, i, logging.DEBUG)),
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = {name: run_scenario(f"s{index}", configure, hot_path, args.threads, args.calls, directory)
+                   for index, (name, configure, hot_path) in enumerate(scenarios)}
+
+    baseline = results[scenarios[0][0]]["caller_us_per_call"]
+    print(f"threads={args.threads} calls/thread={args.calls}")
+    print(f"{'scenario':<40}{'calls/s':>12}{'us/call':>10}{'speedup':>9}{'drained(s)':>12}")
+    for name, result in results.items():
+        print(f"{name:<40}{result['calls_per_sec']:>12,.0f}{result['caller_us_per_call']:>10.2f}"
+              f"{baseline / result['caller_us_per_call']:>8.1f}x{result['drained_seconds']:>12.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import sys
+import time
+import asyncio
+import argparse
+
+from ..profiling import ProfilingMiddleware, ProfileStore
+
+
+async def endpoint(scope, receive, send):
+    """最小ASGI应用，只返回空响应"""
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def make_scope(profile_token: str = None) -> dict:
+    headers = [(b"host", b"localhost"), (b"user-agent", b"bench"), (b"accept", b"*/*"),
+               (b"authorization", b"Bearer x"), (b"accept-encoding", b"gzip")]
+    if profile_token:
+        headers.append((b"x-profile", profile_token.encode()))
+    return {"type": "http", "method": "GET", "path": "/bench", "query_string": b"limit=100", "headers": headers}
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def measure(app, scope: dict, iterations: int) -> float:
+    """返回每次调用的平均耗时（微秒）"""
+    for _ in range(min(iterations, 1000)):  # 预热
+        await app(scope, receive, send)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await app(scope, receive, send)
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+async def run(iterations: int, rounds: int):
+    store = ProfileStore(max_profiles=10)
+    scope = make_scope()
+    cases = [
+        ("bare app", endpoint),
+        ("middleware, no token configured", ProfilingMiddleware(endpoint, store=store)),
+        ("middleware, token configured, not requested", ProfilingMiddleware(endpoint, admin_token="secret", store=store)),
+    ]
+
+    # 多轮取最小值，降低调度噪声
+    results = {}
+    for name, app in cases:
+        results[name] = min([await measure(app, scope, iterations) for _ in range(rounds)])
+
+    profiled = ProfilingMiddleware(endpoint, admin_token="secret", store=store)
+    results["profiled request (reference)"] = await measure(profiled, make_scope("secret"), max(iterations // 1000, 10))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="性能分析中间件关闭时的额外开销微基准")
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-overhead-us", type=float, default=5.0, help="关闭状态下允许的每请求额外开销（微秒），典型请求耗时为毫秒级")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.iterations, args.rounds))
+    baseline = results["bare app"]
+    for name, per_call in results.items():
+        print(f"{name:<46}{per_call:>10.3f} us/req{per_call - baseline:>+10.3f} us")
+
+    overhead = max(results["middleware, no token configured"],
+                   results["middleware, token configured, not requested"]) - baseline
+    if overhead > args.max_overhead_us:
+        print(f"FAIL: 关闭状态下额外开销 {overhead:.3f}us 超过 {args.max_overhead_us}us")
+        return 1
+    print(f"OK: 关闭状态下额外开销 {overhead:.3f}us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+from datetime import date, timedelta
+from typing import Dict, List
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from .. import models, schemas
+from ..crud import energy_readings as energy_readings_crud
+from ..services import data_processing
+from ..sqlite_profile import configure_engine, engine_options
+
+# SQLite并发基准：同一份数据分别使用SQLAlchemy默认配置和 tuned 配置，
+# 若干线程循环执行能耗分析（读），另外若干线程逐条写入读数（写），统计吞吐量、延迟和 "database is locked" 次数。
+#   python -m app.tools.bench_sqlite --source /path/to/data.db --readers 8 --writers 4 --seconds 20
+# 源数据库不会被修改（每种配置各复制一份到临时目录）。
+
+
+def make_engines(source: str, directory: str):
+    """返回 {配置名: 引擎}，各自使用一份数据副本"""
+    engines = {}
+    for profile in ("default", "tuned"):
+        path = os.path.join(directory, f"{profile}.db")
+        shutil.copyfile(source, path)
+        # WAL模式会持久保存在文件中，默认配置的副本改回回滚日志
+        with sqlite3.connect(path) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+        url = f"sqlite:///{path}"
+        engine = create_engine(url, **engine_options(url, profile))
+        configure_engine(engine, url, profile)
+        # 补建源数据库缺少的新表
+        models.Base.metadata.create_all(bind=engine)
+        engines[profile] = engine
+    return engines
+
+
+def run_profile(engine, user_ids: List[int], readers: int, writers: int, seconds: float) -> Dict:
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {"read": [], "write": [], "locked": 0, "errors": 0}
+
+    def record(kind: str, elapsed: float):
+        with lock:
+            stats[kind].append(elapsed)
+
+    def fail(error: Exception):
+        with lock:
+            if "database is locked" in str(error):
+                stats["locked"] += 1
+            else:
+                stats["errors"] += 1
+
+    def reader(index: int):
+        periods = [schemas.AnalysisPeriod.current_month, schemas.AnalysisPeriod.last_3_months]
+        count = 0
+        while not stop.is_set():
+            user_id = user_ids[(index * 7 + count) % len(user_ids)]
+            started = time.perf_counter()
+            try:
+                with Session() as db:
+                    data_processing.get_energy_analysis(db, user_id, periods[count % len(periods)])
+                record("read", time.perf_counter() - started)
+            except Exception as e:
+                fail(e)
+            count += 1
+
+    def writer(index: int):
+        count = 0
+        while not stop.is_set():
+            user_id = user_ids[(index * 13 + count) % len(user_ids)]
+            reading = schemas.EnergyReadingCreate(
+                reading_value=8 + count % 9, reading_type=schemas.ReadingType.total,
+                reading_date=date.today() - timedelta(days=count % 30)
+            )
+            started = time.perf_counter()
+            try:
+                with Session() as db:
+                    energy_readings_crud.create_energy_reading(db, reading, user_id)
+                record("write", time.perf_counter() - started)
+            except Exception as e:
+                fail(e)
+            count += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    stats["seconds"] = seconds
+    return stats
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+def report(name: str, stats: Dict):
+    for kind, label in (("read", "分析"), ("write", "写入")):
+        values = stats[kind]
+        print(f"{name:<8} {label}  {len(values) / stats['seconds']:8.1f} 次/秒  "
+              f"p50 {percentile(values, 0.5):8.1f} ms  p99 {percentile(values, 0.99):8.1f} ms")
+    print(f"{name:<8} database is locked: {stats['locked']}  其他错误: {stats['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite并发基准：默认配置 vs tuned")
+    parser.add_argument("--source", required=True, help="源SQLite数据库文件（需已有用户和读数）")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--users", type=int, default=50, help="参与测试的用户数")
+    args = parser.parse_args()
+
+    with sqlite3.connect(args.source) as conn:
+        user_ids = [row[0] for row in conn.execute("SELECT id FROM users ORDER BY id LIMIT ?", (args.users,))]
+    if not user_ids:
+        print("源数据库中没有用户", file=sys.stderr)
+        return 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        engines = make_engines(args.source, directory)
+        for name, engine in engines.items():
+            report(name, run_profile(engine, user_ids, args.readers, args.writers, args.seconds))
+            engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
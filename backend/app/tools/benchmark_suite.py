@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import logging
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional
+
+# 基准测试为每个数据规模使用独立的SQLite文件，应用模块导入时需要一个默认数据库
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ..database import Base
+from .. import schemas
+from ..services import data_processing
+from ..services.recommendation_engine import RecommendationEngine
+from ..services.ai_enhanced_recommendation_engine import AIEnhancedRecommendationEngine
+from ..services.stub_ai_service import StubAIService
+from .generate_data import (
+    BulkWriter, HouseholdGenerator, DEVICE_PROFILES, DEVICE_TYPES, DEVICE_NAMES, season_factors,
+    USER_COLUMNS, DEVICE_COLUMNS, READING_COLUMNS,
+)
+
+# 基准测试说明：
+# 每个数据集 = 被测用户（指定设备数，最多2年逐日读数）+ 其他家庭的背景读数，使读数表总行数达到指定规模。
+# 每个用例先预热，再重复执行直到达到最短测试时间，记录每次耗时，用中位数与基线比较。
+# 基线与机器相关，应在同一台机器（如CI固定规格的执行器）上保存和比较。
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+BENCH_USER_ID = 1
+BENCH_SEED = 20240601
+BENCH_PASSWORD_HASH = "benchmark"
+
+
+def dataset_path(data_dir: str, size: str, devices: int, end_date: date) -> str:
+    return os.path.join(data_dir, f"bench_{size}_{devices}dev_{end_date.isoformat()}.db")
+
+
+def build_dataset(path: str, total_readings: int, devices: int, end_date: date):
+    """生成数据集：被测用户 + 背景家庭，已存在时直接复用"""
+    if os.path.exists(path):
+        return
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    writer = BulkWriter(engine)
+
+    # 被测用户：设备按类型轮流分配，读数天数受总规模限制
+    days = int(min(730, max(30, total_readings // (devices + 1))))
+    rng = np.random.default_rng(BENCH_SEED)
+    day_values = np.arange(np.datetime64(end_date) - days + 1, np.datetime64(end_date) + 1)
+    day_strings = np.array([str(day) for day in day_values], dtype=object)
+    factors = season_factors(day_values)
+    created_at = f"{end_date.isoformat()} 00:00:00"
+
+    writer.write("users", USER_COLUMNS, [(BENCH_USER_ID, "bench", "bench@example.com", BENCH_PASSWORD_HASH,
+                                          "基准测试用户", 3, 95.0, created_at, created_at)])
+    device_rows, device_kwh = [], []
+    for index in range(devices):
+        device_type = DEVICE_TYPES[index % len(DEVICE_TYPES)]
+        _, _, (power_low, power_high), (hours_low, hours_high), duty = DEVICE_PROFILES[device_type]
+        power, hours = (power_low + power_high) / 2, (hours_low + hours_high) / 2
+        device_rows.append((index + 1, BENCH_USER_ID, f"{DEVICE_NAMES[device_type]}{index + 1}", device_type,
+                            power, hours, "客厅", True, created_at))
+        device_kwh.append(np.round(power * hours * duty / 1000 * factors[device_type] * rng.lognormal(0, 0.15, days), 3))
+    writer.write("devices", DEVICE_COLUMNS, device_rows)
+
+    totals = np.round(np.sum(device_kwh, axis=0) * 1.15, 3)
+    readings = [(BENCH_USER_ID, None, float(v), "total", d, round(float(v) * 0.5, 2), created_at)
+                for v, d in zip(totals, day_strings)]
+    for device_id, values in enumerate(device_kwh, start=1):
+        readings.extend((BENCH_USER_ID, device_id, float(v), "device", d, round(float(v) * 0.5, 2), created_at)
+                        for v, d in zip(values, day_strings))
+    writer.write("energy_readings", READING_COLUMNS, readings)
+
+    # 背景家庭（仅总读数），填充到目标规模
+    remaining = total_readings - len(readings)
+    if remaining > 0:
+        background_days = 365
+        generator = HouseholdGenerator(BENCH_SEED, end_date - timedelta(days=background_days - 1), end_date,
+                                       BENCH_PASSWORD_HASH)
+        households = -(-remaining // background_days)
+        chunk = max(1, 500_000 // background_days)
+        next_user_id, next_device_id = BENCH_USER_ID + 1, devices + 1
+        for offset in range(0, households, chunk):
+            count = min(chunk, households - offset)
+            users, background_devices, background_readings, _ = generator.generate(
+                next_user_id, next_device_id, count, False, 0
+            )
+            writer.write("users", USER_COLUMNS, users)
+            writer.write("devices", DEVICE_COLUMNS, background_devices)
+            writer.write("energy_readings", READING_COLUMNS, background_readings)
+            next_user_id += count
+            next_device_id += len(background_devices)
+
+    writer.execute("DELETE FROM energy_benchmarks")
+    writer.write("energy_benchmarks", ("family_size", "house_size_range", "season", "average_consumption", "created_at"),
+                 [(3, "90-120", season, 450.0, created_at) for season in ("spring", "summer", "autumn", "winter")])
+    writer.close()
+    engine.dispose()
+
+
+def measure(fn: Callable[[], object], min_time: float, max_rounds: int, warmup: int = 1) -> Dict:
+    """重复执行直到达到最短测试时间，返回耗时统计（秒）"""
+    for _ in range(warmup):
+        fn()
+    timings: List[float] = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < max_rounds and (len(timings) < 3 or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {
+        "rounds": len(timings),
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "stddev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def benchmark_cases(db, end_date: date) -> Dict[str, Callable[[], object]]:
+    """被测函数集合"""
+    stub = StubAIService(latency_ms=0, jitter_ms=0, error_rate=0, seed=0)
+    loop = asyncio.new_event_loop()
+
+    def ai_engine():
+        engine = AIEnhancedRecommendationEngine(db, BENCH_USER_ID, ai_service=stub)
+        return loop.run_until_complete(engine.generate_ai_recommendations())
+
+    cases = {}
+    for period in schemas.AnalysisPeriod:
+        if period == schemas.AnalysisPeriod.custom:
+            start = end_date - timedelta(days=89)
+            cases[f"get_energy_analysis[{period.value}]"] = (
+                lambda p=period, s=start: data_processing.get_energy_analysis(db, BENCH_USER_ID, p, s, end_date))
+        else:
+            cases[f"get_energy_analysis[{period.value}]"] = (
+                lambda p=period: data_processing.get_energy_analysis(db, BENCH_USER_ID, p))
+    cases["compare_with_benchmark"] = lambda: data_processing.compare_with_benchmark(db, BENCH_USER_ID, end_date)
+    cases["get_device_breakdown"] = lambda: data_processing.get_device_breakdown(
+        db, BENCH_USER_ID, end_date - timedelta(days=29), end_date)
+    cases["RecommendationEngine.generate_recommendations"] = lambda: RecommendationEngine(
+        db, BENCH_USER_ID).generate_recommendations()
+    cases["AIEnhancedRecommendationEngine[stub]"] = ai_engine
+    return cases
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """比较中位数，返回超出阈值的回归描述"""
+    regressions = []
+    for name, stats in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        ratio = stats["median"] / previous["median"] if previous["median"] else 1.0
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {previous['median'] * 1000:.3f}ms -> {stats['median'] * 1000:.3f}ms "
+                               f"(+{(ratio - 1) * 100:.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据分析与推荐引擎基准测试")
+    parser.add_argument("--sizes", default="1k,100k", help=f"读数表规模，可选 {','.join(SIZES)}")
+    parser.add_argument("--devices", default="5,20", help="被测用户的设备数")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--min-time", type=float, default=0.5, help="每个用例的最短测试时间（秒）")
+    parser.add_argument("--max-rounds", type=int, default=200)
+    parser.add_argument("--data-dir", default=".benchmarks/data", help="数据集缓存目录")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--save", help="将结果保存为基线JSON")
+    parser.add_argument("--compare", help="与基线JSON比较，中位数回归超过阈值时返回非零")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的中位数回归比例")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    results: Dict[str, Dict] = {}
+    for size in args.sizes.split(","):
+        for devices in [int(d) for d in args.devices.split(",")]:
+            path = dataset_path(args.data_dir, size, devices, args.end_date)
+            started = time.perf_counter()
+            build_dataset(path, SIZES[size], devices, args.end_date)
+            print(f"# dataset {size} readings, {devices} devices ({time.perf_counter() - started:.1f}s)", file=sys.stderr)
+
+            engine = create_engine(f"sqlite:///{path}")
+            db = sessionmaker(bind=engine)()
+            for name, fn in benchmark_cases(db, args.end_date).items():
+                key = f"{name}@{size}/{devices}dev"
+                if args.filter not in key:
+                    continue
+                # 每次执行前清空会话，避免身份映射缓存掩盖查询开销
+                stats = measure(lambda: (fn(), db.expunge_all()), args.min_time, args.max_rounds)
+                results[key] = stats
+                print(f"{key:<70}{stats['median'] * 1000:>10.3f}ms median {stats['min'] * 1000:>10.3f}ms min "
+                      f"{stats['rounds']:>5} rounds")
+            db.close()
+            engine.dispose()
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                       "end_date": args.end_date.isoformat(), "results": results}, f, indent=2)
+        print(f"基线已保存到 {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"性能回归（阈值 {args.threshold * 100:.0f}%）:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"与基线相比无超过 {args.threshold * 100:.0f}% 的回归")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
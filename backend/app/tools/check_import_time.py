@@ -0,0 +1,67 @@
+import os
+import sys
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+# 冷启动时不应被导入的重型模块
+FORBIDDEN_MODULES = ["openai", "app.services.tongyi_service", "app.services.ai_enhanced_recommendation_engine"]
+
+
+def measure_import_time(module: str) -> Tuple[Dict[str, int], List[str]]:
+    """使用 python -X importtime 测量模块导入耗时，返回 {模块: 累计耗时(微秒)} 和导入顺序"""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=backend_dir,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入{module}失败:\n{result.stderr}")
+
+    cumulative: Dict[str, int] = {}
+    order: List[str] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+        order.append(name.strip())
+    return cumulative, order
+
+
+def check_import_time(module: str = "app.main", budget_ms: float = 3000, runs: int = 3) -> List[str]:
+    """检查导入耗时是否超出预算、是否导入了重型模块，返回问题列表"""
+    problems = []
+
+    # 多次测量取最小值，减少磁盘缓存等因素的干扰
+    best_ms = None
+    imported: List[str] = []
+    for _ in range(runs):
+        cumulative, imported = measure_import_time(module)
+        elapsed_ms = cumulative.get(module, 0) / 1000
+        best_ms = elapsed_ms if best_ms is None else min(best_ms, elapsed_ms)
+
+    if best_ms > budget_ms:
+        problems.append(f"导入{module}耗时{best_ms:.0f}ms，超出预算{budget_ms:.0f}ms")
+
+    for forbidden in FORBIDDEN_MODULES:
+        if forbidden in imported:
+            problems.append(f"冷启动时导入了重型模块: {forbidden}")
+
+    print(f"导入{module}耗时: {best_ms:.0f}ms (预算 {budget_ms:.0f}ms)")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检查应用冷启动导入耗时")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_MS", 3000)))
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    problems = check_import_time(args.module, args.budget_ms, args.runs)
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,81 @@
+import sys
+import time
+import argparse
+
+from sqlalchemy import delete, func, inspect as sa_inspect, select
+
+from .. import models
+from ..crud.energy_readings import NATURAL_KEY
+from ..migrations import v0001_natural_key
+from ..services.history_store import get_history_store
+from ..sharding import get_shard_router
+
+# 读数自然键迁移（一次性）：
+#   python -m app.tools.dedup_readings [--dry-run]
+# 在每个分片上：删除自然键（用户、设备、日期、类型）重复的读数，每组只保留id最大（最后写入）的一条
+# → 补加 energy_readings.revision 列并创建唯一索引 uq_energy_readings_natural_key（即迁移0001）。
+# 之后新增读数按自然键覆盖写入。删除了重复读数时，启用本地历史库的部署需要再执行 app.tools.history_store rebuild。
+
+
+def duplicate_count(db) -> int:
+    groups = select((func.count(models.EnergyReading.id) - 1).label("extra")).group_by(*NATURAL_KEY).having(
+        func.count(models.EnergyReading.id) > 1
+    ).subquery()
+    return db.execute(select(func.coalesce(func.sum(groups.c.extra), 0))).scalar()
+
+
+def delete_duplicates(dialect: str):
+    """删除自然键重复的读数，每组保留id最大的一条"""
+    reading = models.EnergyReading
+    if dialect != "mysql":
+        keep = select(func.max(reading.id)).group_by(*NATURAL_KEY)
+        return delete(reading).where(reading.id.not_in(keep))
+    # MySQL 不允许在 DELETE 的子查询中读取被删除的表（错误1093），改为与分组后的派生表连接（多表DELETE）
+    user_id, device_key, reading_date, reading_type = NATURAL_KEY
+    groups = select(
+        user_id, device_key.label("device_key"), reading_date, reading_type, func.max(reading.id).label("keep_id")
+    ).group_by(*NATURAL_KEY).having(func.count(reading.id) > 1).subquery("k")
+    return delete(reading).where(
+        reading.user_id == groups.c.user_id,
+        device_key == groups.c.device_key,
+        reading.reading_date == groups.c.reading_date,
+        reading.reading_type == groups.c.reading_type,
+        reading.id < groups.c.keep_id
+    )
+
+
+def migrate_shard(router, name: str, dry_run: bool) -> int:
+    started = time.perf_counter()
+    engine = router.engine(name)
+    columns = {column["name"] for column in sa_inspect(engine).get_columns("energy_readings")}
+    with router.session(name) as db:
+        duplicates = duplicate_count(db)
+        print(f"[{name}] 重复读数 {duplicates} 条{'' if 'revision' in columns else '，缺少revision列'}")
+        if dry_run:
+            return duplicates
+
+        if duplicates:
+            db.execute(delete_duplicates(engine.dialect.name))
+        db.commit()
+
+    # 补加revision列并创建唯一索引（与迁移0001相同，PostgreSQL上并发建索引）
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        v0001_natural_key.upgrade(conn)
+    print(f"[{name}] 完成，耗时{time.perf_counter() - started:.1f}秒")
+    return duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="删除重复读数并创建自然键唯一索引")
+    parser.add_argument("--dry-run", action="store_true", help="只统计重复读数")
+    args = parser.parse_args()
+
+    router = get_shard_router()
+    removed = sum(migrate_shard(router, name, args.dry_run) for name in router.names)
+    if removed and not args.dry_run and get_history_store() is not None:
+        print("已删除重复读数，请执行 python -m app.tools.history_store rebuild 重建本地历史库")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import re
+import sys
+import argparse
+from datetime import date, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import event, func, select
+
+from .. import models, schemas
+from ..crud import devices as devices_crud
+from ..crud import energy_readings as energy_readings_crud
+from ..crud import recommendations as recommendations_crud
+from ..services import data_processing
+from ..services.history_store import get_history_store
+from ..sharding import get_shard_router
+
+# 查询计划检查（可在CI中执行，存在全表扫描时返回非0）：
+#   python -m app.tools.explain_queries [--user 用户ID] [--verbose]
+# 在每个分片上执行热点读取路径（各周期的能耗分析、读数列表、数据版本、月初至今电费、建议去重、设备列表），
+# 记录实际发出的SELECT语句和参数，逐条执行 EXPLAIN（SQLite为 EXPLAIN QUERY PLAN；
+# PostgreSQL在关闭顺序扫描的事务中执行 EXPLAIN，小表上规划器本会选择顺序扫描），
+# 计划中出现对 CHECKED_TABLES 的全表扫描即失败，通常是缺少索引（先执行 python -m app.migrations upgrade）。
+# 启用本地历史库时长周期分析不查询数据库，检查前请取消 HISTORY_STORE_DIR。
+
+CHECKED_TABLES = ("energy_readings", "recommendations", "devices")
+
+SQLITE_FULL_SCAN = re.compile(r"\bSCAN (?:TABLE )?(%s)\b" % "|".join(CHECKED_TABLES))
+POSTGRES_FULL_SCAN = re.compile(r"\bSeq Scan on (%s)\b" % "|".join(CHECKED_TABLES))
+
+
+def hot_paths(user_id: int) -> List[Tuple[str, Callable]]:
+    """(名称, fn(db))：只读的热点查询路径"""
+    today = date.today()
+    paths = [
+        (f"能耗分析 {period.value}", lambda db, period=period: data_processing.get_energy_analysis(db, user_id, period))
+        for period in schemas.AnalysisPeriod if period != schemas.AnalysisPeriod.custom
+    ]
+    paths += [
+        ("分析数据版本", lambda db: data_processing.get_analysis_data_version(db, user_id)),
+        ("读数列表", lambda db: energy_readings_crud.get_energy_reading_rows_by_user(
+            db, user_id, start_date=today - timedelta(days=30), end_date=today)),
+        ("读数数据版本", lambda db: energy_readings_crud.get_data_version(db, user_id)),
+        ("月初至今用电", lambda db: energy_readings_crud.get_month_to_date_consumption(db, user_id, today)),
+        ("批量每日总读数", lambda db: energy_readings_crud.get_daily_totals_for_users(
+            db, [user_id], today.replace(day=1), today)),
+        ("建议去重", lambda db: recommendations_crud.get_existing_recommendation_keys(db, user_id, ["-"])),
+        ("AI建议批量去重", lambda db: recommendations_crud.get_existing_ai_recommendation_keys(db, [user_id])),
+        ("建议列表", lambda db: recommendations_crud.get_recommendation_rows_by_user(db, user_id)),
+        ("建议数据版本", lambda db: recommendations_crud.get_data_version(db, user_id)),
+        ("设备列表", lambda db: devices_crud.get_device_rows_by_user(db, user_id)),
+        ("设备数据版本", lambda db: devices_crud.get_data_version(db, user_id)),
+    ]
+    return paths
+
+
+def capture(db, fn: Callable) -> List[Tuple[str, object]]:
+    """执行fn(db)，返回期间发出的SELECT语句和参数"""
+    statements = []
+    engine = db.get_bind()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        fn(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        db.rollback()
+    return statements
+
+
+def explain(engine, statement: str, parameters) -> Tuple[List[str], List[str]]:
+    """返回 (计划各行, 被全表扫描的表)"""
+    dialect = engine.dialect.name
+    with engine.connect() as conn:
+        if dialect == "sqlite":
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+            plan = [row[-1] for row in rows]
+            pattern = SQLITE_FULL_SCAN
+        elif dialect == "postgresql":
+            conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            plan = [row[0] for row in conn.exec_driver_sql("EXPLAIN " + statement, parameters).fetchall()]
+            pattern = POSTGRES_FULL_SCAN
+        else:
+            raise SystemExit(f"不支持的数据库: {dialect}")
+        conn.rollback()
+    scans = sorted({match.group(1) for line in plan for match in pattern.finditer(line)})
+    return plan, scans
+
+
+def check_shard(router, name: str, user_id: Optional[int], verbose: bool) -> int:
+    engine = router.engine(name)
+    failures = 0
+    with router.session(name) as db:
+        if user_id is None:
+            user_id = db.execute(select(func.min(models.User.id))).scalar() or 1
+        print(f"[{name}] user_id={user_id}")
+        for label, fn in hot_paths(user_id):
+            seen = set()
+            for statement, parameters in capture(db, fn):
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                plan, scans = explain(engine, statement, parameters)
+                if scans:
+                    failures += 1
+                    print(f"  FAIL {label}: 全表扫描 {', '.join(scans)}")
+                elif verbose:
+                    print(f"  ok   {label}")
+                if scans or verbose:
+                    print("    " + " ".join(statement.split())[:300])
+                    for line in plan:
+                        print(f"    | {line}")
+        print(f"[{name}] {'通过' if not failures else f'{failures} 条语句存在全表扫描'}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查热点查询的执行计划，存在全表扫描时返回1")
+    parser.add_argument("--user", type=int, help="用于生成查询的用户ID（默认各分片的第一个用户）")
+    parser.add_argument("--verbose", action="store_true", help="打印每条语句的执行计划")
+    args = parser.parse_args()
+
+    if get_history_store() is not None:
+        print("已启用本地历史库，长周期分析不查询数据库，检查不完整", file=sys.stderr)
+
+    router = get_shard_router()
+    failures = sum(check_shard(router, name, args.user, args.verbose) for name in router.names)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
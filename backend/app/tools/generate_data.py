@@ -0,0 +1,339 @@
+import io
+import os
+import sys
+import csv
+import time
+import argparse
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+# 数据生成说明：
+# 用numpy按户批量生成设备和逐日读数（设备读数 + 总读数），再按数据库方言批量写入：
+# SQLite 使用原生 executemany，PostgreSQL 使用 COPY，其他数据库使用 DB-API executemany。
+# 用户和设备的主键由生成器分配，相同的种子、起止日期和初始数据库会得到完全相同的数据。
+
+# 各类设备的配置: 拥有概率, 最多台数, 功率范围(W), 日均使用小时范围, 运行占空比
+DEVICE_PROFILES = {
+    "air_conditioner": (0.85, 3, (800, 2500), (2, 8), 0.6),
+    "refrigerator": (1.00, 1, (100, 250), (24, 24), 0.35),
+    "television": (0.90, 2, (60, 200), (2, 6), 1.0),
+    "washing_machine": (0.90, 1, (300, 2000), (0.3, 1.5), 0.5),
+    "water_heater": (0.75, 1, (1500, 3000), (1, 3), 0.7),
+    "lighting": (1.00, 1, (60, 300), (4, 8), 1.0),
+    "computer": (0.70, 2, (100, 400), (2, 8), 0.8),
+    "other": (0.60, 3, (50, 1500), (0.5, 4), 0.5),
+}
+DEVICE_TYPES = list(DEVICE_PROFILES)
+DEVICE_NAMES = {
+    "air_conditioner": "空调", "refrigerator": "冰箱", "television": "电视", "washing_machine": "洗衣机",
+    "water_heater": "热水器", "lighting": "照明", "computer": "电脑", "other": "其他电器",
+}
+LOCATIONS = np.array(["客厅", "主卧", "次卧", "厨房", "书房", "卫生间", "阳台"], dtype=object)
+
+SEASONS = ["spring", "summer", "autumn", "winter"]
+# 月份(1-12) -> 季节下标，与 data_processing.get_season_from_date 一致
+MONTH_TO_SEASON = np.array([0, 3, 3, 0, 0, 0, 1, 1, 1, 2, 2, 2, 3])
+HOUSE_SIZE_RANGES = ["0-60", "60-90", "90-120", "120+"]
+FAMILY_SIZES = range(1, 7)
+
+RECOMMENDATION_TEMPLATES = [
+    ("空调温度调节建议", "夏季将空调温度设置在26℃以上，冬季设置在20℃以下，可显著降低能耗。", "device_usage", 0.2, "low"),
+    ("关闭待机电源", "电视、电脑等设备待机时仍会耗电，建议不用时拔掉插头或使用带开关的插座。", "lifestyle", 0.05, "low"),
+    ("更换LED照明", "将传统灯泡更换为LED灯，照明能耗可降低约60%。", "device_upgrade", 0.1, "medium"),
+    ("错峰使用洗衣机", "在用电低谷时段使用洗衣机，并尽量满负荷洗涤。", "lifestyle", 0.05, "low"),
+    ("热水器定时加热", "为热水器设置定时加热，避免全天保温造成的能耗浪费。", "device_usage", 0.15, "medium"),
+    ("升级一级能效冰箱", "使用超过10年的冰箱能耗较高，更换为一级能效冰箱可节约大量电能。", "device_upgrade", 0.1, "high"),
+]
+
+
+def season_factors(days: np.ndarray) -> Dict[str, np.ndarray]:
+    """各类设备按日期的季节性系数"""
+    day_of_year = (days - days.astype("datetime64[Y]")).astype(int) + 1
+    phase = 2 * np.pi / 365.25
+    summer = np.maximum(0, np.cos(phase * (day_of_year - 200)))
+    winter = np.maximum(0, np.cos(phase * (day_of_year - 15)))
+    ones = np.ones(len(days))
+    return {
+        "air_conditioner": 0.1 + 1.8 * summer ** 2 + 0.9 * winter ** 2,
+        "water_heater": 1 + 0.4 * np.cos(phase * (day_of_year - 15)),
+        "lighting": 1 + 0.25 * np.cos(phase * (day_of_year - 355)),
+        "refrigerator": 1 + 0.15 * np.cos(phase * (day_of_year - 200)),
+        "television": ones,
+        "washing_machine": ones,
+        "computer": ones,
+        "other": ones,
+    }
+
+
+def house_size_range_index(house_sizes: np.ndarray) -> np.ndarray:
+    """与 data_processing.get_house_size_range 一致的面积区间下标"""
+    return np.searchsorted(np.array([60, 90, 120]), house_sizes, side="left")
+
+
+class BulkWriter:
+    """按数据库方言选择最快的批量写入方式（整个生成过程复用一个原生连接）"""
+
+    def __init__(self, engine):
+        self.dialect = engine.dialect.name
+        self.driver = engine.dialect.driver
+        self.connection = engine.raw_connection()
+        if self.dialect == "sqlite":
+            # 批量写入期间关闭同步写盘，中途失败时重新生成即可
+            self.connection.cursor().execute("PRAGMA synchronous=OFF")
+
+    def write(self, table: str, columns: Sequence[str], rows: Iterable[tuple]):
+        rows = list(rows)
+        if not rows:
+            return
+        cursor = self.connection.cursor()
+        if self.dialect == "postgresql" and self.driver in ("psycopg2", "psycopg"):
+            self._copy(cursor, table, columns, rows)
+        else:
+            placeholders = ", ".join(["?" if self.dialect == "sqlite" else "%s"] * len(columns))
+            cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        self.connection.commit()
+
+    def _copy(self, cursor, table: str, columns: Sequence[str], rows: List[tuple]):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        if self.driver == "psycopg2":
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+    def execute(self, sql: str):
+        cursor = self.connection.cursor()
+        cursor.execute(sql)
+        self.connection.commit()
+        return cursor
+
+    def next_id(self, table: str) -> int:
+        return self.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0] + 1
+
+    def sync_sequence(self, table: str):
+        """显式写入主键后，PostgreSQL需要同步自增序列"""
+        if self.dialect == "postgresql":
+            self.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))")
+
+    def close(self):
+        self.connection.close()
+
+
+class HouseholdGenerator:
+    """可复现的家庭、设备和读数生成器"""
+
+    def __init__(self, seed: int, start_date: date, end_date: date, password_hash: str, price: float = 0.5):
+        self.rng = np.random.default_rng(seed)
+        self.seed = seed
+        self.password_hash = password_hash
+        self.price = price
+        self.days = np.arange(np.datetime64(start_date), np.datetime64(end_date) + 1)
+        self.day_strings = np.array([str(day) for day in self.days], dtype=object)
+        self.day_seasons = MONTH_TO_SEASON[self.days.astype("datetime64[M]").astype(int) % 12 + 1]
+        factors = season_factors(self.days)
+        self.type_factors = np.stack([factors[device_type] for device_type in DEVICE_TYPES])
+        # 基准统计: [家庭人数, 面积区间, 季节] -> (日总能耗之和, 天数)
+        self.benchmark_sums = np.zeros((len(FAMILY_SIZES), len(HOUSE_SIZE_RANGES), len(SEASONS)))
+        self.benchmark_days = np.zeros_like(self.benchmark_sums)
+        self.created_at = f"{end_date.isoformat()} 00:00:00"
+
+    def households(self, count: int):
+        family_size = self.rng.choice(np.arange(1, 7), size=count, p=[0.12, 0.25, 0.30, 0.18, 0.10, 0.05])
+        house_size = np.clip(np.round(self.rng.lognormal(np.log(45 + 15 * family_size), 0.3), 1), 25, 300)
+        return family_size, house_size
+
+    def devices(self, count: int):
+        """每户的设备组合，返回按家庭排序的设备数组"""
+        households, types, powers, hours, duties = [], [], [], [], []
+        for type_index, device_type in enumerate(DEVICE_TYPES):
+            probability, max_count, (power_low, power_high), (hours_low, hours_high), duty = DEVICE_PROFILES[device_type]
+            owned = self.rng.random(count) < probability
+            per_household = np.where(owned, self.rng.integers(1, max_count + 1, size=count), 0)
+            owners = np.repeat(np.arange(count), per_household)
+            households.append(owners)
+            types.append(np.full(len(owners), type_index))
+            powers.append(np.round(self.rng.uniform(power_low, power_high, len(owners)), -1))
+            hours.append(np.round(self.rng.uniform(hours_low, hours_high, len(owners)), 1))
+            duties.append(np.full(len(owners), duty))
+
+        households = np.concatenate(households)
+        order = np.argsort(households, kind="stable")
+        return (households[order], np.concatenate(types)[order], np.concatenate(powers)[order],
+                np.concatenate(hours)[order], np.concatenate(duties)[order])
+
+    def generate(self, first_user_id: int, first_device_id: int, count: int, with_device_readings: bool,
+                 recommendations_per_household: int):
+        """生成一批家庭，返回各表待写入的行"""
+        user_ids = np.arange(first_user_id, first_user_id + count)
+        family_size, house_size = self.households(count)
+        households, types, powers, hours, duties = self.devices(count)
+        device_ids = np.arange(first_device_id, first_device_id + len(households))
+        days = len(self.days)
+
+        # 设备日能耗(kWh) = 功率 × 使用时长 × 占空比 × 季节系数 × 随机波动
+        base = powers * hours * duties / 1000
+        noise = self.rng.lognormal(0, 0.15, size=(len(households), days))
+        device_kwh = np.round(base[:, None] * self.type_factors[types] * noise, 3)
+
+        # 家庭总能耗 = 各设备之和 × (1 + 未计量部分)
+        starts = np.searchsorted(households, np.arange(count))
+        totals = np.add.reduceat(device_kwh, starts, axis=0)
+        unmetered = self.rng.uniform(0.05, 0.25, size=(count, 1))
+        totals = np.round(totals * (1 + unmetered), 3)
+
+        # 累计基准统计
+        size_index = house_size_range_index(house_size)
+        for season in range(len(SEASONS)):
+            mask = self.day_seasons == season
+            if mask.any():
+                np.add.at(self.benchmark_sums[:, :, season], (family_size - 1, size_index), totals[:, mask].sum(axis=1))
+                np.add.at(self.benchmark_days[:, :, season], (family_size - 1, size_index), mask.sum())
+
+        users = [
+            (int(uid), f"synthetic{self.seed}_{uid}", f"synthetic{self.seed}_{uid}@example.com", self.password_hash,
+             f"测试用户{uid}", int(size), float(area), self.created_at, self.created_at)
+            for uid, size, area in zip(user_ids, family_size, house_size)
+        ]
+
+        locations = self.rng.choice(LOCATIONS, size=len(households))
+        devices = [
+            (int(did), int(user_ids[h]), f"{DEVICE_NAMES[DEVICE_TYPES[t]]}{did}", DEVICE_TYPES[t],
+             float(p), float(hr), loc, True, self.created_at)
+            for did, h, t, p, hr, loc in zip(device_ids, households, types, powers, hours, locations)
+        ]
+
+        def readings(owner_ids: np.ndarray, reading_device_ids, values: np.ndarray, reading_type: str):
+            rows = len(owner_ids)
+            flat_values = values.ravel()
+            return zip(
+                np.repeat(owner_ids, days).tolist(),
+                np.repeat(reading_device_ids, days).tolist() if reading_device_ids is not None else [None] * (rows * days),
+                flat_values.tolist(),
+                [reading_type] * (rows * days),
+                np.tile(self.day_strings, rows).tolist(),
+                np.round(flat_values * self.price, 2).tolist(),
+                [self.created_at] * (rows * days),
+            )
+
+        energy_readings = list(readings(user_ids, None, totals, "total"))
+        if with_device_readings:
+            energy_readings.extend(readings(user_ids[households], device_ids, device_kwh, "device"))
+
+        recommendations = []
+        if recommendations_per_household:
+            picks = self.rng.integers(0, len(RECOMMENDATION_TEMPLATES), size=(count, recommendations_per_household))
+            monthly = totals.mean(axis=1) * 30
+            for index, uid in enumerate(user_ids):
+                for pick in set(picks[index].tolist()):
+                    title, description, category, ratio, difficulty = RECOMMENDATION_TEMPLATES[pick]
+                    saving = round(float(monthly[index]) * ratio, 2)
+                    recommendations.append((int(uid), title, description, category, saving,
+                                            round(saving * self.price, 2), difficulty, False,
+                                            self.created_at, "rule_based"))
+
+        return users, devices, energy_readings, recommendations
+
+    def benchmarks(self) -> List[tuple]:
+        """每个(家庭人数, 面积区间, 季节)的月均能耗，无样本的组合按经验公式估算"""
+        rows = []
+        with np.errstate(invalid="ignore", divide="ignore"):
+            monthly = self.benchmark_sums / self.benchmark_days * 30
+        for f, family in enumerate(FAMILY_SIZES):
+            for r, size_range in enumerate(HOUSE_SIZE_RANGES):
+                for s, season in enumerate(SEASONS):
+                    value = monthly[f, r, s]
+                    if not np.isfinite(value):
+                        value = (80 + 45 * family + 25 * r) * (1.0, 1.35, 0.95, 1.2)[s]
+                    rows.append((family, size_range, season, round(float(value), 1), self.created_at))
+        return rows
+
+
+USER_COLUMNS = ("id", "username", "email", "hashed_password", "full_name", "family_size", "house_size",
+                "created_at", "updated_at")
+DEVICE_COLUMNS = ("id", "user_id", "name", "device_type", "power_rating", "daily_usage_hours", "location",
+                  "is_active", "created_at")
+READING_COLUMNS = ("user_id", "device_id", "reading_value", "reading_type", "reading_date", "cost", "created_at")
+RECOMMENDATION_COLUMNS = ("user_id", "title", "description", "category", "estimated_saving",
+                          "estimated_cost_saving", "implementation_difficulty", "is_implemented", "created_at",
+                          "source")
+BENCHMARK_COLUMNS = ("family_size", "house_size_range", "season", "average_consumption", "created_at")
+
+def main():
+    parser = argparse.ArgumentParser(description="生成模拟家庭能耗数据（用于基准测试和压测）")
+    parser.add_argument("--households", type=int, default=100)
+    parser.add_argument("--years", type=float, default=1.0, help="每户的读数跨度（年）")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today(),
+                        help="读数截止日期，固定该值才能完全复现数据")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--price", type=float, default=0.5, help="电价（元/kWh）")
+    parser.add_argument("--no-device-readings", action="store_true", help="只生成每日总读数")
+    parser.add_argument("--recommendations", type=int, default=3, help="每户生成的建议数")
+    parser.add_argument("--skip-benchmarks", action="store_true", help="不重建 energy_benchmarks 表")
+    parser.add_argument("--batch-rows", type=int, default=500_000, help="每批写入的读数行数上限")
+    parser.add_argument("--password", default="password123", help="所有模拟用户的登录密码")
+    parser.add_argument("--database-url", help="目标数据库，默认使用 DATABASE_URL")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from ..database import engine, init_db
+    from ..utils import get_password_hash
+
+    init_db(retries=1)
+    writer = BulkWriter(engine)
+    start_date = args.end_date - timedelta(days=max(1, int(args.years * 365)) - 1)
+    generator = HouseholdGenerator(args.seed, start_date, args.end_date, get_password_hash(args.password), args.price)
+
+    days = len(generator.days)
+    average_devices = sum(p * (1 + m) / 2 for p, m, *_ in DEVICE_PROFILES.values())
+    rows_per_household = days * (1 + (0 if args.no_device_readings else average_devices))
+    chunk = max(1, int(args.batch_rows // rows_per_household))
+
+    next_user_id = writer.next_id("users")
+    next_device_id = writer.next_id("devices")
+    totals = {"users": 0, "devices": 0, "energy_readings": 0, "recommendations": 0}
+    started = time.perf_counter()
+
+    for offset in range(0, args.households, chunk):
+        count = min(chunk, args.households - offset)
+        users, devices, readings, recommendations = generator.generate(
+            next_user_id, next_device_id, count, not args.no_device_readings, args.recommendations
+        )
+        writer.write("users", USER_COLUMNS, users)
+        writer.write("devices", DEVICE_COLUMNS, devices)
+        writer.write("energy_readings", READING_COLUMNS, readings)
+        writer.write("recommendations", RECOMMENDATION_COLUMNS, recommendations)
+
+        next_user_id += count
+        next_device_id += len(devices)
+        totals["users"] += count
+        totals["devices"] += len(devices)
+        totals["energy_readings"] += len(readings)
+        totals["recommendations"] += len(recommendations)
+
+        elapsed = time.perf_counter() - started
+        print(f"{offset + count}/{args.households} 户, {totals['energy_readings']} 条读数, "
+              f"{totals['energy_readings'] / elapsed:,.0f} 行/秒", file=sys.stderr)
+
+    writer.sync_sequence("users")
+    writer.sync_sequence("devices")
+
+    if not args.skip_benchmarks:
+        writer.execute("DELETE FROM energy_benchmarks")
+        writer.write("energy_benchmarks", BENCHMARK_COLUMNS, generator.benchmarks())
+
+    writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"完成: {totals}，耗时 {elapsed:.1f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import sys
+import time
+import argparse
+from datetime import date, timedelta
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import select, func
+
+from .. import models
+from ..database import SessionLocal
+from ..services import history
+from ..services.history_store import get_history_store
+from ..sharding import get_shard_router
+
+# 本地历史库维护：
+#   python -m app.tools.history_store rebuild [--users 1,2,3]   从数据库（及已归档读数）重建
+#   python -m app.tools.history_store bench --user 1 --days 730  对比历史库与数据库读取同一日期范围的耗时
+# 批量导入（如 app.tools.generate_data）绕过了ORM，导入后需要执行一次 rebuild。
+
+
+def user_rows(db, user_ids: List[int]) -> Dict[int, List]:
+    """按用户返回日汇总 [(日期, 设备ID或None, kWh, 电费)]，包含已归档的读数"""
+    by_user: Dict[int, List] = {user_id: [] for user_id in user_ids}
+    for user_id, reading_date, reading_type, device_id, value, cost in db.execute(
+        select(models.EnergyReading.user_id, models.EnergyReading.reading_date, models.EnergyReading.reading_type,
+               models.EnergyReading.device_id, func.sum(models.EnergyReading.reading_value),
+               func.sum(models.EnergyReading.cost))
+        .where(models.EnergyReading.user_id.in_(user_ids))
+        .group_by(models.EnergyReading.user_id, models.EnergyReading.reading_date,
+                  models.EnergyReading.reading_type, models.EnergyReading.device_id)
+    ):
+        if reading_type == models.ReadingType.device and device_id is None:
+            continue
+        device_id = None if reading_type == models.ReadingType.total else device_id
+        by_user[user_id].append((reading_date, device_id, float(value or 0), float(cost or 0)))
+
+    device_code = history.TYPE_CODES[models.ReadingType.device]
+    for user_id in user_ids:
+        archived = history.load_archive(user_id)
+        if archived is None:
+            continue
+        for day, type_code, device_id, value, cost in zip(
+            archived["reading_date"].tolist(), archived["reading_type"].tolist(), archived["device_id"].tolist(),
+            archived["reading_value"].tolist(), np.nan_to_num(archived["cost"]).tolist()
+        ):
+            if type_code == device_code and device_id == history.NO_DEVICE:
+                continue
+            by_user[user_id].append((day, device_id if type_code == device_code else None, value, cost))
+    return by_user
+
+
+def rebuild(store, user_ids: List[int], batch_size: int):
+    if not user_ids:
+        with SessionLocal() as db:
+            user_ids = db.execute(select(models.User.id).order_by(models.User.id)).scalars().all()
+
+    started = time.perf_counter()
+    built = 0
+    router = get_shard_router()
+    for name, shard_user_ids in router.group_users(user_ids).items():
+        with router.session(name) as db:
+            for first in range(0, len(shard_user_ids), batch_size):
+                batch = shard_user_ids[first:first + batch_size]
+                for user_id, rows in user_rows(db, batch).items():
+                    store.build(user_id, rows)
+                    built += 1 if rows else 0
+                print(f"[{name}] 用户 {batch[0]}-{batch[-1]}: 已重建{built}个", file=sys.stderr)
+    print(f"完成：重建{built}个用户的历史库，耗时{time.perf_counter() - started:.1f}秒")
+
+
+def bench(store, user_id: int, days: int, repeat: int):
+    """同一日期范围的总能耗和设备能耗：历史库视图 vs 数据库查询（含已归档读数）"""
+    end = date.today()
+    start = end - timedelta(days=days - 1)
+    db = get_shard_router().session_for_user(user_id)
+
+    def from_store():
+        view = store.view(user_id, start, end)
+        return float(np.nansum(view.total, dtype=float)), view.device_totals()
+
+    def from_database():
+        rows = db.query(models.EnergyReading.reading_date, func.sum(models.EnergyReading.reading_value)).filter(
+            models.EnergyReading.user_id == user_id,
+            models.EnergyReading.reading_date >= start,
+            models.EnergyReading.reading_date <= end,
+            models.EnergyReading.reading_type == models.ReadingType.total
+        ).group_by(models.EnergyReading.reading_date).all()
+        devices = db.query(models.EnergyReading.device_id, func.sum(models.EnergyReading.reading_value)).filter(
+            models.EnergyReading.user_id == user_id,
+            models.EnergyReading.reading_date >= start,
+            models.EnergyReading.reading_date <= end,
+            models.EnergyReading.reading_type == models.ReadingType.device
+        ).group_by(models.EnergyReading.device_id).all()
+        devices = dict(devices)
+        for device_id, value in history.archived_device_totals(db, user_id, start, end).items():
+            devices[device_id] = devices.get(device_id, 0) + value
+        return sum(value for _, value in rows) + history.archived_total(db, user_id, start, end), devices
+
+    for name, fn in (("history store", from_store), ("database", from_database)):
+        fn()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            total, _ = fn()
+        elapsed = (time.perf_counter() - started) / repeat
+        print(f"{name:<15} {elapsed * 1000:8.3f} ms  total={total:.1f} kWh")
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地历史库维护")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = sub.add_parser("rebuild", help="从数据库重建")
+    rebuild_parser.add_argument("--users", help="逗号分隔的用户ID，默认全部")
+    rebuild_parser.add_argument("--users-per-batch", type=int, default=200)
+    bench_parser = sub.add_parser("bench", help="读取耗时对比")
+    bench_parser.add_argument("--user", type=int, default=1)
+    bench_parser.add_argument("--days", type=int, default=730)
+    bench_parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    store = get_history_store()
+    if store is None:
+        print("未配置 HISTORY_STORE_DIR", file=sys.stderr)
+        return 1
+
+    if args.command == "rebuild":
+        user_ids = [int(user_id) for user_id in args.users.split(",")] if args.users else []
+        rebuild(store, user_ids, args.users_per_batch)
+    else:
+        bench(store, args.user, args.days, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import sys
+import time
+import argparse
+from typing import Tuple
+
+import numpy as np
+
+from ..services.tariff import get_tariff, Tariff
+
+# 批量重算电费：按用户ID区间分批读取读数，用电价引擎向量化计算后批量写回。
+# 总读数按(用户, 月)累计计算阶梯；设备读数按所属家庭当天总读数的平均电价计费，当天无总读数时按分时电价计费。
+
+
+def compute_batch(tariff: Tariff, ids: np.ndarray, user_ids: np.ndarray, dates: np.ndarray,
+                  values: np.ndarray, is_total: np.ndarray) -> np.ndarray:
+    """计算一批读数的电费，返回与输入顺序一致的数组"""
+    costs = np.empty(len(ids))
+    costs[is_total] = tariff.compute_costs(user_ids[is_total], dates[is_total], values[is_total])
+
+    device = ~is_total
+    if device.any():
+        # 当天家庭平均电价：以(用户, 日期)为键在总读数中查找
+        day_numbers = dates.astype("datetime64[D]").astype(np.int64)
+        total_keys = user_ids[is_total].astype(np.int64) * 1_000_000 + day_numbers[is_total]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            total_prices = np.where(values[is_total] > 0, costs[is_total] / values[is_total], tariff.daily_price)
+        order = np.argsort(total_keys)
+        total_keys, total_prices = total_keys[order], total_prices[order]
+
+        device_keys = user_ids[device].astype(np.int64) * 1_000_000 + day_numbers[device]
+        position = np.clip(np.searchsorted(total_keys, device_keys), 0, max(len(total_keys) - 1, 0))
+        found = (total_keys[position] == device_keys) if len(total_keys) else np.zeros(len(device_keys), dtype=bool)
+        prices = np.where(found, total_prices[position] if len(total_keys) else 0, tariff.daily_price)
+        costs[device] = values[device] * prices
+
+    return np.round(costs, 2)
+
+
+def load_batch(cursor, first_user: int, last_user: int) -> Tuple[np.ndarray, ...]:
+    cursor.execute(
+        "SELECT id, user_id, reading_date, reading_value, reading_type FROM energy_readings "
+        "WHERE user_id >= ? AND user_id <= ?".replace("?", cursor_placeholder(cursor)),
+        (first_user, last_user)
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return ()
+    ids, user_ids, dates, values, types = zip(*rows)
+    return (np.array(ids, dtype=np.int64), np.array(user_ids, dtype=np.int64),
+            np.array([str(d) for d in dates], dtype="datetime64[D]"), np.array(values, dtype=float),
+            np.array(types) == "total")
+
+
+def cursor_placeholder(cursor) -> str:
+    return "?" if type(cursor).__module__.startswith("sqlite3") else "%s"
+
+
+def synthetic_run(tariff: Tariff, users: int, days: int, chunk: int, hourly: bool):
+    """不读写数据库，只测量电价引擎处理 users×days 条读数的耗时"""
+    rng = np.random.default_rng(0)
+    dates = np.arange(np.datetime64("2025-01-01"), np.datetime64("2025-01-01") + days)
+    total_rows = 0
+    started = time.perf_counter()
+    for first in range(0, users, chunk):
+        count = min(chunk, users - first)
+        user_ids = np.repeat(np.arange(first, first + count), days)
+        batch_dates = np.tile(dates, count)
+        if hourly:
+            hourly_kwh = rng.random((len(user_ids), 24), dtype=np.float32)
+            tariff.compute_costs(user_ids, batch_dates, hourly_kwh.sum(axis=1), hourly_kwh)
+        else:
+            tariff.compute_costs(user_ids, batch_dates, rng.random(len(user_ids)) * 20)
+        total_rows += len(user_ids)
+    elapsed = time.perf_counter() - started
+    print(f"{users}户 × {days}天{'（小时数据）' if hourly else ''}: {total_rows}条读数，"
+          f"耗时{elapsed:.1f}秒，{total_rows / elapsed:,.0f} 条/秒")
+
+
+def recompute_engine(engine, tariff, users_per_batch: int, dry_run: bool) -> int:
+    from .generate_data import BulkWriter
+
+    writer = BulkWriter(engine)
+    cursor = writer.connection.cursor()
+    placeholder = cursor_placeholder(cursor)
+    if writer.dialect == "postgresql":
+        writer.execute("CREATE TEMP TABLE IF NOT EXISTS cost_updates (id BIGINT PRIMARY KEY, cost DOUBLE PRECISION)")
+
+    max_user = writer.execute("SELECT COALESCE(MAX(user_id), 0) FROM energy_readings").fetchone()[0]
+    updated = 0
+    started = time.perf_counter()
+    for first in range(1, max_user + 1, users_per_batch):
+        last = first + users_per_batch - 1
+        batch = load_batch(cursor, first, last)
+        if not batch:
+            continue
+        ids, user_ids, dates, values, is_total = batch
+        costs = compute_batch(tariff, ids, user_ids, dates, values, is_total)
+
+        if not dry_run:
+            rows = list(zip(costs.tolist(), ids.tolist()))
+            if writer.dialect == "postgresql":
+                # PostgreSQL：COPY到临时表后一次性UPDATE ... FROM
+                writer.write("cost_updates", ("cost", "id"), rows)
+                writer.execute("UPDATE energy_readings r SET cost = u.cost FROM cost_updates u WHERE r.id = u.id")
+                writer.execute("TRUNCATE cost_updates")
+            else:
+                cursor.executemany(f"UPDATE energy_readings SET cost = {placeholder} WHERE id = {placeholder}", rows)
+                writer.connection.commit()
+
+        updated += len(ids)
+        elapsed = time.perf_counter() - started
+        print(f"用户 {first}-{last}: 累计{updated}条，{updated / elapsed:,.0f} 条/秒", file=sys.stderr)
+
+    writer.close()
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按电价方案批量重算读数电费")
+    parser.add_argument("--region", help="电价地区，默认使用 TARIFF_REGION")
+    parser.add_argument("--users-per-batch", type=int, default=2000)
+    parser.add_argument("--dry-run", action="store_true", help="只计算不写回")
+    parser.add_argument("--synthetic-users", type=int, help="不访问数据库，用随机数据测量引擎吞吐量")
+    parser.add_argument("--synthetic-days", type=int, default=365)
+    parser.add_argument("--hourly", action="store_true", help="合成数据按小时计价")
+    args = parser.parse_args()
+
+    tariff = get_tariff(args.region)
+    if args.synthetic_users:
+        synthetic_run(tariff, args.synthetic_users, args.synthetic_days, args.users_per_batch, args.hourly)
+        return 0
+
+    from ..sharding import get_shard_router
+
+    # 各分片依次重算（未分片时只有主库）
+    router = get_shard_router()
+    started = time.perf_counter()
+    updated = sum(recompute_engine(router.engine(name), tariff, args.users_per_batch, args.dry_run)
+                  for name in router.names)
+    print(f"完成：{tariff.name}，重算{updated}条读数，耗时{time.perf_counter() - started:.1f}秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
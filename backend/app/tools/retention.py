@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import argparse
+from datetime import date, timedelta
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import select, delete
+
+from .. import models
+from ..crud import data_versions
+from ..sharding import get_shard_router
+from ..services import history
+
+# 读数保留任务：
+# 保留期之前（按整月对齐）的原始读数按用户分批迁出——先追加到用户的归档文件，
+# 再在同一事务中累加月汇总并删除原始行。归档按读数id去重，任务中断后重新执行不会重复计数。
+# 用法：python -m app.tools.retention [--keep-days 400] [--dry-run]
+
+
+def retention_cutoff(keep_days: int, today: date = None) -> date:
+    """早于该日期（某月1日）的读数会被归档"""
+    return ((today or date.today()) - timedelta(days=keep_days)).replace(day=1)
+
+
+def to_columns(rows) -> Dict[str, np.ndarray]:
+    ids, dates, types, device_ids, values, costs = zip(*rows)
+    return {
+        "id": np.array(ids, dtype=np.int64),
+        "reading_date": np.array([str(d) for d in dates], dtype="datetime64[D]"),
+        "reading_type": np.array([history.TYPE_CODES[t] for t in types], dtype=np.int8),
+        "device_id": np.array([history.NO_DEVICE if d is None else d for d in device_ids], dtype=np.int64),
+        "reading_value": np.array(values, dtype=float),
+        "cost": np.array([np.nan if c is None else c for c in costs], dtype=float),
+    }
+
+
+def monthly_aggregates(columns: Dict[str, np.ndarray]):
+    """按(月, 类型, 设备)汇总，返回 [(月初, 类型代码, 设备ID, 能耗, 电费, 条数)]"""
+    months = columns["reading_date"].astype("datetime64[M]")
+    keys = np.stack([months.astype(np.int64), columns["reading_type"].astype(np.int64), columns["device_id"]], axis=1)
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    consumption = np.bincount(inverse, weights=columns["reading_value"])
+    cost = np.bincount(inverse, weights=np.nan_to_num(columns["cost"]))
+    count = np.bincount(inverse)
+    return [
+        (np.datetime64(month, "M").astype("datetime64[D]").item(), type_code, device_id,
+         float(consumption[index]), float(cost[index]), int(count[index]))
+        for index, (month, type_code, device_id) in enumerate(unique.tolist())
+    ]
+
+
+def archive_user(db, user_id: int, rows: List) -> int:
+    """归档单个用户的一批读数，返回删除的原始行数（由调用方提交事务）"""
+    columns = to_columns(rows)
+    history.append_archive(user_id, columns)
+
+    type_by_code = {code: reading_type for reading_type, code in history.TYPE_CODES.items()}
+    existing = {
+        (row.month, row.reading_type, row.device_id): row
+        for row in db.query(models.MonthlyReading).filter(models.MonthlyReading.user_id == user_id)
+    }
+    for month, type_code, device_id, consumption, cost, count in monthly_aggregates(columns):
+        device_id = None if device_id == history.NO_DEVICE else device_id
+        reading_type = type_by_code[type_code]
+        row = existing.get((month, reading_type, device_id))
+        if row is None:
+            db.add(models.MonthlyReading(user_id=user_id, device_id=device_id, reading_type=reading_type, month=month,
+                                         consumption=consumption, cost=cost, reading_count=count))
+        else:
+            # 补录的迟到读数
+            row.consumption += consumption
+            row.cost = (row.cost or 0) + cost
+            row.reading_count += count
+
+    deleted = 0
+    ids = columns["id"].tolist()
+    for start in range(0, len(ids), 1000):
+        chunk = ids[start:start + 1000]
+        db.execute(delete(models.EnergyReading).where(models.EnergyReading.id.in_(chunk)))
+        deleted += len(chunk)
+    data_versions.bump(db, [user_id], "readings")
+    return deleted
+
+
+def archive_shard(db, name: str, cutoff, users_per_batch: int, dry_run: bool) -> int:
+    user_ids = db.execute(
+        select(models.EnergyReading.user_id).where(models.EnergyReading.reading_date < cutoff).distinct()
+        .order_by(models.EnergyReading.user_id)
+    ).scalars().all()
+    print(f"[{name}] 归档 {cutoff} 之前的读数：{len(user_ids)} 个用户，归档目录 {history.archive_dir()}",
+          file=sys.stderr)
+
+    archived = 0
+    started = time.perf_counter()
+    for first in range(0, len(user_ids), users_per_batch):
+        batch = user_ids[first:first + users_per_batch]
+        rows = db.execute(
+            select(models.EnergyReading.user_id, models.EnergyReading.id, models.EnergyReading.reading_date,
+                   models.EnergyReading.reading_type, models.EnergyReading.device_id,
+                   models.EnergyReading.reading_value, models.EnergyReading.cost)
+            .where(models.EnergyReading.user_id.in_(batch), models.EnergyReading.reading_date < cutoff)
+            .order_by(models.EnergyReading.user_id)
+        ).all()
+
+        by_user: Dict[int, List] = {}
+        for row in rows:
+            by_user.setdefault(row[0], []).append(row[1:])
+
+        if dry_run:
+            archived += len(rows)
+        else:
+            for user_id, user_rows in by_user.items():
+                archived += archive_user(db, user_id, user_rows)
+            db.commit()
+
+        elapsed = time.perf_counter() - started
+        print(f"用户 {batch[0]}-{batch[-1]}: 累计{archived}条，{archived / elapsed:,.0f} 条/秒", file=sys.stderr)
+
+    return archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description="归档保留期之前的原始读数")
+    parser.add_argument("--keep-days", type=int, default=int(os.getenv("RETENTION_RAW_DAYS", 400)),
+                        help="原始读数保留天数（按整月对齐）")
+    parser.add_argument("--users-per-batch", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="只统计不修改")
+    args = parser.parse_args()
+
+    cutoff = retention_cutoff(args.keep_days)
+    started = time.perf_counter()
+    archived = 0
+    # 各分片依次归档（未分片时只有主库）
+    router = get_shard_router()
+    for name in router.names:
+        with router.session(name) as db:
+            archived += archive_shard(db, name, cutoff, args.users_per_batch, args.dry_run)
+    print(f"完成：{'可归档' if args.dry_run else '已归档'}{archived}条读数，耗时{time.perf_counter() - started:.1f}秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
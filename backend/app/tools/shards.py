@@ -0,0 +1,262 @@
+import sys
+import time
+import argparse
+import logging
+from datetime import date
+from typing import Dict, List, Tuple
+
+from sqlalchemy import delete, extract, func, insert, inspect as sa_inspect, select
+
+from .. import models
+from ..crud import data_versions
+from ..database import SessionLocal
+from ..services import history
+from ..services.data_processing import get_house_size_range, get_season_from_date
+from ..services.history_store import get_history_store
+from ..sharding import ShardMovingError, ShardRouter, get_shard_router
+
+logger = logging.getLogger(__name__)
+
+# 分片维护工具：
+#   python -m app.tools.shards status                      各分片的用户数和读数行数
+#   python -m app.tools.shards pin                         按当前配置把所有用户写入目录（调整 SHARD_URLS 之前执行）
+#   python -m app.tools.shards move --user 42 --to shard1  在线迁移单个用户
+#   python -m app.tools.shards rebalance [--dry-run]       把目录中的用户迁移到哈希环上的目标分片并移除目录项
+#   python -m app.tools.shards benchmarks                  各分片汇总计算 energy_benchmarks 并写入所有分片
+#
+# 增加分片的在线流程：pin → 更新 SHARD_URLS 并重启（目录保证路由不变）→ rebalance。
+# 迁移单个用户时先把目录状态置为 moving（该用户的请求返回503，其他用户不受影响），
+# 等待各worker的目录缓存过期后复制数据，切换目录后再删除源分片上的数据。
+# 设备ID在各分片独立分配，迁移时在目标分片重新分配并同步修改读数、建议、归档和本地历史库中的设备ID。
+
+# 按外键依赖排列：复制时先设备后其他，删除时相反
+USER_TABLES = (models.Device, models.EnergyReading, models.IntervalReading, models.MonthlyReading,
+               models.Recommendation)
+
+
+def _columns(model, row) -> Dict:
+    return {attr.key: getattr(row, attr.key) for attr in sa_inspect(model).column_attrs}
+
+
+def _set_directory(user_id: int, shard: str, state: str):
+    with SessionLocal() as db:
+        db.merge(models.ShardAssignment(user_id=user_id, shard=shard, state=state))
+        db.commit()
+
+
+def _copy_user(router: ShardRouter, user_id: int, source: str, target: str) -> Dict[int, int]:
+    """把用户数据复制到目标分片（单个事务），返回旧设备ID到新设备ID的映射"""
+    device_map: Dict[int, int] = {}
+    with router.session(source) as src, router.session(target) as dst:
+        if not router.is_primary(target):
+            with SessionLocal() as primary:
+                user = primary.get(models.User, user_id)
+                dst.merge(models.User(**_columns(models.User, user)))
+                dst.flush()
+
+        for device in src.query(models.Device).filter(models.Device.user_id == user_id).order_by(models.Device.id):
+            columns = _columns(models.Device, device)
+            old_id = columns.pop("id")
+            device_map[old_id] = dst.execute(insert(models.Device).values(**columns)).inserted_primary_key[0]
+
+        for model in USER_TABLES[1:]:
+            rows = []
+            for row in src.execute(select(model).where(model.user_id == user_id)).scalars():
+                columns = _columns(model, row)
+                columns.pop("id")
+                if columns.get("device_id") is not None:
+                    columns["device_id"] = device_map.get(columns["device_id"])
+                rows.append(columns)
+            for start in range(0, len(rows), 5000):
+                dst.execute(insert(model), rows[start:start + 5000])
+
+        # 数据版本随用户迁移并递增：设备ID在目标分片上重新分配，迁移前的ETag不能再命中
+        version = src.get(models.DataVersion, user_id)
+        if version is not None:
+            dst.execute(insert(models.DataVersion).values(**_columns(models.DataVersion, version)))
+        data_versions.bump(dst, [user_id], *data_versions.KINDS)
+        dst.commit()
+    return device_map
+
+
+def _delete_user(router: ShardRouter, user_id: int, shard: str):
+    with router.session(shard) as db:
+        db.execute(delete(models.DataVersion).where(models.DataVersion.user_id == user_id))
+        for model in reversed(USER_TABLES):
+            db.execute(delete(model).where(model.user_id == user_id))
+        if not router.is_primary(shard):
+            db.execute(delete(models.User).where(models.User.id == user_id))
+        db.commit()
+
+
+def _remap_local_files(router: ShardRouter, user_id: int, target: str, device_map: Dict[int, int]):
+    """归档文件和本地历史库中的设备ID改为目标分片的新ID"""
+    history.remap_archive_devices(user_id, device_map)
+    store = get_history_store()
+    if store is not None:
+        from .history_store import user_rows
+        with router.session(target) as db:
+            store.build(user_id, user_rows(db, [user_id])[user_id])
+
+
+def move_user(router: ShardRouter, user_id: int, target: str) -> bool:
+    """在线迁移单个用户，已在目标分片时返回False"""
+    if target not in router.names:
+        raise ValueError(f"未知的分片: {target}")
+    entry = router.directory_entry(user_id, fresh=True)
+    if entry is not None and entry[1] == "moving":
+        raise ShardMovingError(user_id)
+    source = entry[0] if entry is not None else router.ring.lookup(user_id)
+    if source == target:
+        return False
+
+    started = time.perf_counter()
+    _set_directory(user_id, source, "moving")
+    # 等待各worker的目录缓存过期，此后不会再有请求写入源分片
+    time.sleep(router.directory_ttl)
+    try:
+        device_map = _copy_user(router, user_id, source, target)
+    except Exception:
+        _set_directory(user_id, source, "active")
+        raise
+
+    _set_directory(user_id, target, "active")
+    _remap_local_files(router, user_id, target, device_map)
+    try:
+        _delete_user(router, user_id, source)
+    except Exception as e:
+        # 路由已指向目标分片，源分片上的残留数据不影响正确性
+        logger.warning("删除源分片 %s 上用户 %s 的数据失败: %s", source, user_id, e)
+    print(f"用户 {user_id}: {source} -> {target}，耗时{time.perf_counter() - started:.1f}秒")
+    return True
+
+
+def pin_all(router: ShardRouter):
+    """按当前路由把所有用户写入目录"""
+    with SessionLocal() as db:
+        user_ids = db.execute(select(models.User.id)).scalars().all()
+        pinned = {row.user_id for row in db.query(models.ShardAssignment.user_id)}
+        for user_id in user_ids:
+            if user_id not in pinned:
+                db.add(models.ShardAssignment(user_id=user_id, shard=router.ring.lookup(user_id), state="active"))
+        db.commit()
+    print(f"已固定{len(user_ids) - len(pinned)}个用户的分片")
+
+
+def rebalance(router: ShardRouter, dry_run: bool):
+    """目录中的用户迁移到哈希环上的目标分片，然后移除目录项"""
+    with SessionLocal() as db:
+        entries = [(row.user_id, row.shard, row.state) for row in db.query(models.ShardAssignment)]
+
+    moved = 0
+    for user_id, shard, state in entries:
+        if state != "active":
+            continue
+        target = router.ring.lookup(user_id)
+        if dry_run:
+            moved += shard != target
+            continue
+        if shard != target:
+            move_user(router, user_id, target)
+            moved += 1
+        with SessionLocal() as db:
+            db.execute(delete(models.ShardAssignment).where(models.ShardAssignment.user_id == user_id))
+            db.commit()
+    print(f"{'需要' if dry_run else '已'}迁移{moved}个用户（目录项{len(entries)}个）")
+
+
+def status(router: ShardRouter):
+    def counts(db):
+        return (db.query(func.count(func.distinct(models.EnergyReading.user_id))).scalar(),
+                db.query(func.count(models.EnergyReading.id)).scalar())
+
+    for name, (users, readings) in router.scatter(counts).items():
+        print(f"{name:<12} 用户 {users:>8}  读数 {readings:>12}  {router.urls[name]}")
+    with SessionLocal() as db:
+        print(f"目录项 {db.query(func.count(models.ShardAssignment.user_id)).scalar()}")
+
+
+def shard_benchmark_sums(db) -> Dict[Tuple, List[float]]:
+    """单个分片上每个(家庭人数, 面积区间, 季节)的总读数合计和天数"""
+    month = extract('month', models.EnergyReading.reading_date)
+    rows = db.query(
+        models.User.family_size,
+        models.User.house_size,
+        month,
+        func.sum(models.EnergyReading.reading_value),
+        func.count(models.EnergyReading.id)
+    ).join(
+        models.User, models.User.id == models.EnergyReading.user_id
+    ).filter(
+        models.EnergyReading.reading_type == models.ReadingType.total
+    ).group_by(models.User.family_size, models.User.house_size, month).all()
+
+    sums: Dict[Tuple, List[float]] = {}
+    for family_size, house_size, month_number, consumption, days in rows:
+        key = (family_size or 1, get_house_size_range(house_size or 90),
+               get_season_from_date(date(2000, int(month_number), 1)))
+        total = sums.setdefault(key, [0.0, 0])
+        total[0] += float(consumption or 0)
+        total[1] += days
+    return sums
+
+
+def refresh_benchmarks(router: ShardRouter):
+    """各分片分别汇总后合并，计算月均能耗（日均×30）并写入所有分片和主库"""
+    merged: Dict[Tuple, List[float]] = {}
+    for sums in router.scatter(shard_benchmark_sums).values():
+        for key, (consumption, days) in sums.items():
+            total = merged.setdefault(key, [0.0, 0])
+            total[0] += consumption
+            total[1] += days
+    averages = {key: round(consumption / days * 30, 1) for key, (consumption, days) in merged.items() if days}
+
+    def write(db):
+        existing = {(row.family_size, row.house_size_range, row.season): row
+                    for row in db.query(models.EnergyBenchmark)}
+        for (family_size, size_range, season), value in averages.items():
+            row = existing.get((family_size, size_range, season))
+            if row is None:
+                db.add(models.EnergyBenchmark(family_size=family_size, house_size_range=size_range,
+                                              season=season, average_consumption=value))
+            else:
+                row.average_consumption = value
+        db.commit()
+
+    router.scatter(write)
+    if not any(router.is_primary(name) for name in router.names):
+        with SessionLocal() as db:
+            write(db)
+    print(f"已更新{len(averages)}组基准数据（{len(router.names)}个分片）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片维护")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status")
+    sub.add_parser("pin")
+    move_parser = sub.add_parser("move")
+    move_parser.add_argument("--user", type=int, required=True)
+    move_parser.add_argument("--to", required=True)
+    rebalance_parser = sub.add_parser("rebalance")
+    rebalance_parser.add_argument("--dry-run", action="store_true")
+    sub.add_parser("benchmarks")
+    args = parser.parse_args()
+
+    router = get_shard_router()
+    router.create_all()
+    if args.command == "status":
+        status(router)
+    elif args.command == "pin":
+        pin_all(router)
+    elif args.command == "move":
+        move_user(router, args.user, args.to)
+    elif args.command == "rebalance":
+        rebalance(router, args.dry_run)
+    else:
+        refresh_benchmarks(router)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
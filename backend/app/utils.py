@@ -14,6 +14,9 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# 实时推送令牌：只能用于建立SSE连接（放在URL中），有效期即单次连接的最长时间
+LIVE_TOKEN_SCOPE = "live"
+LIVE_TOKEN_EXPIRE_SECONDS = int(os.getenv("LIVE_TOKEN_EXPIRE_SECONDS", 300))
 
 # 密码加密
 def get_password_hash(password):
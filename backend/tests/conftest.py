@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+# 测试使用临时目录中的SQLite文件库，避免导入 app.database 时连接 .env 中配置的数据库
+_tmpdir = tempfile.mkdtemp(prefix="energy-audit-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'test.db')}"
+os.environ["ADMISSION_ENABLED"] = "false"
+os.environ["AI_PROVIDER"] = "stub"
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from app.database import engine, init_db
+    init_db()
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    """测试用会话；测试结束后清空全部表"""
+    from app import models
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.close()
+    with engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(client):
+    """注册并登录一个用户，返回认证请求头"""
+    client.post("/api/users/register", json={
+        "username": "alice", "email": "alice@example.com", "password": "secret123",
+        "family_size": 3, "house_size": 90
+    })
+    token = client.post("/api/users/login", data={"username": "alice", "password": "secret123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app import admission
+from app.admission import AdmissionController, EndpointClass, MemoryBackend, SQLiteBackend
+
+
+def controller(backend, burst: float = 2, concurrency: int = 0) -> AdmissionController:
+    config = EndpointClass(name="analysis", cost=1, rate=0.1, burst=burst, concurrency=concurrency)
+    return AdmissionController(backend, {"analysis": config})
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    return MemoryBackend() if request.param == "memory" else SQLiteBackend(str(tmp_path / "admission.db"))
+
+
+def test_bucket_rejects_with_retry_after(backend):
+    limiter = controller(backend)
+    limiter.admit("analysis", "user:1")
+    limiter.admit("analysis", "user:1")
+
+    with pytest.raises(HTTPException) as error:
+        limiter.admit("analysis", "user:1")
+    assert error.value.status_code == 429
+    # 补充1个令牌需要10秒
+    assert 9 <= int(error.value.headers["Retry-After"]) <= 10
+    # 其他用户不受影响
+    limiter.admit("analysis", "user:2")
+
+
+def test_concurrency_slot_released(backend):
+    limiter = controller(backend, burst=10, concurrency=1)
+    held = limiter.admit("analysis", "user:1")
+
+    with pytest.raises(HTTPException) as error:
+        limiter.admit("analysis", "user:2")
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "1"
+
+    limiter.release(held)
+    limiter.admit("analysis", "user:2")
+
+
+def test_memory_backend_sweeps_full_buckets():
+    backend = MemoryBackend(sweep_interval=0)
+    backend.take("analysis:user:1", 1, rate=1000, burst=1)
+    time.sleep(0.01)
+    backend.take("analysis:user:2", 1, rate=1000, burst=1)
+
+    # 已补满的桶在下一次 take 时被清理
+    assert set(backend._buckets) == {"analysis:user:2"}
+
+
+def test_endpoint_keyed_on_token_not_query(client, auth_headers, monkeypatch):
+    monkeypatch.setenv("ADMISSION_ENABLED", "true")
+    monkeypatch.setattr(admission, "_controller", controller(MemoryBackend()))
+
+    statuses = [client.get(f"/api/energy-readings/analysis?user_id={user_id}", headers=auth_headers).status_code
+                for user_id in (1, 2, 3)]
+
+    # 更换查询参数中的 user_id 不能绕过限流
+    assert statuses == [200, 200, 429]
@@ -0,0 +1,47 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.tools import benchmark_suite
+
+END_DATE = date(2026, 6, 30)
+
+
+@pytest.fixture(scope="module")
+def bench_db(tmp_path_factory):
+    path = benchmark_suite.dataset_path(str(tmp_path_factory.mktemp("bench")), "1k", 5, END_DATE)
+    benchmark_suite.build_dataset(path, benchmark_suite.SIZES["1k"], 5, END_DATE)
+    engine = create_engine(f"sqlite:///{path}")
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_dataset_reaches_target_size(bench_db):
+    readings = bench_db.execute(select(func.count(models.EnergyReading.id))).scalar()
+    devices = bench_db.execute(select(func.count(models.Device.id)).where(
+        models.Device.user_id == benchmark_suite.BENCH_USER_ID)).scalar()
+
+    assert readings >= benchmark_suite.SIZES["1k"]
+    assert devices == 5
+
+
+def test_every_case_runs(bench_db):
+    for name, fn in benchmark_suite.benchmark_cases(bench_db, END_DATE).items():
+        stats = benchmark_suite.measure(fn, min_time=0, max_rounds=3, warmup=0)
+        assert stats["rounds"] == 3, name
+        assert 0 < stats["min"] <= stats["median"], name
+
+
+def test_compare_flags_median_regressions():
+    baseline = {"fast": {"median": 0.010}, "slow": {"median": 0.010}}
+    results = {"fast": {"median": 0.011}, "slow": {"median": 0.013}, "new": {"median": 1.0}}
+
+    regressions = benchmark_suite.compare(results, baseline, threshold=0.2)
+
+    assert len(regressions) == 1
+    assert regressions[0].startswith("slow: 10.000ms -> 13.000ms")
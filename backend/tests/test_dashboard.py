@@ -0,0 +1,43 @@
+from app.database import engine
+from app.services import dashboard as dashboard_service
+from app.sharding import ShardMovingError
+
+
+def test_dashboard_etag_and_invalidation(client, auth_headers):
+    response = client.get("/api/dashboard?fields=devices,recommendations", headers=auth_headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    cached = client.get("/api/dashboard?fields=devices,recommendations", headers={**auth_headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+
+    client.post("/api/devices/", headers=auth_headers, json={
+        "name": "AC", "device_type": "air_conditioner", "power_rating": 1500, "daily_usage_hours": 5
+    })
+    changed = client.get("/api/dashboard?fields=devices,recommendations", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert [device["name"] for device in changed.json()["devices"]] == ["AC"]
+
+
+def test_request_session_released_before_sections(client, auth_headers, monkeypatch):
+    checked_out = []
+    compute = dashboard_service.compute_section
+
+    def recording(name, user_id, params):
+        checked_out.append(engine.pool.checkedout())
+        return compute(name, user_id, params)
+
+    monkeypatch.setattr(dashboard_service, "compute_section", recording)
+    assert client.get("/api/dashboard?fields=devices", headers=auth_headers).status_code == 200
+    assert checked_out == [0]
+
+
+def test_moving_user_gets_503(client, auth_headers, monkeypatch):
+    def moving(db, user_id, params):
+        raise ShardMovingError(user_id)
+
+    monkeypatch.setitem(dashboard_service.SECTIONS, "devices", moving)
+    response = client.get("/api/dashboard?fields=devices,sources", headers=auth_headers)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,86 @@
+from sqlalchemy import event
+
+from app import models
+from app.crud import data_versions, devices as devices_crud
+from app.database import engine
+
+DEVICE = {"name": "AC", "device_type": "air_conditioner", "power_rating": 1500, "daily_usage_hours": 5}
+READING = {"reading_value": 10, "reading_type": "total", "reading_date": "2026-01-01"}
+
+
+def assert_invalidated(client, headers, url, write):
+    """写入前的ETag命中304，写入后返回200"""
+    etag = client.get(url, headers=headers).headers["ETag"]
+    assert client.get(url, headers={**headers, "If-None-Match": etag}).status_code == 304
+    write()
+    changed = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    return changed
+
+
+def test_device_writes_change_etag(client, auth_headers):
+    url = "/api/devices/my-devices"
+    assert_invalidated(client, auth_headers, url, lambda: client.post("/api/devices/", headers=auth_headers, json=DEVICE))
+    assert_invalidated(client, auth_headers, url, lambda: client.put("/api/devices/1", headers=auth_headers,
+                                                                     json={"name": "空调"}))
+    assert_invalidated(client, auth_headers, url, lambda: client.delete("/api/devices/1", headers=auth_headers))
+
+
+def test_reading_overwrite_changes_etag(client, auth_headers):
+    url = "/api/energy-readings/my-energy-reading"
+    assert_invalidated(client, auth_headers, url,
+                       lambda: client.post("/api/energy-readings/", headers=auth_headers, json=READING))
+    # 同一自然键覆盖写入：行数和ID都不变
+    changed = assert_invalidated(client, auth_headers, url, lambda: client.post(
+        "/api/energy-readings/", headers=auth_headers, json=dict(READING, reading_value=12)))
+    assert [reading["reading_value"] for reading in changed.json()] == [12]
+
+
+def test_interval_ingest_changes_etag(client, auth_headers):
+    url = "/api/energy-readings/my-energy-reading"
+    ingest = {"interval_minutes": 60, "points": [{"timestamp": "2026-01-01T08:00:00", "value": 1.5}]}
+    assert_invalidated(client, auth_headers, url,
+                       lambda: client.post("/api/energy-readings/intervals", headers=auth_headers, json=ingest))
+    # 再次上报同一天：日读数原地更新
+    changed = assert_invalidated(client, auth_headers, url, lambda: client.post(
+        "/api/energy-readings/intervals", headers=auth_headers,
+        json=dict(ingest, points=[{"timestamp": "2026-01-01T09:00:00", "value": 2}])))
+    assert [reading["reading_value"] for reading in changed.json()] == [3.5]
+
+
+def test_recommendation_writes_change_etag(client, auth_headers):
+    url = "/api/recommendations/my-recommendations"
+    assert_invalidated(client, auth_headers, url, lambda: client.post("/api/recommendations/", headers=auth_headers, json={
+        "title": "调高空调温度", "description": "夏季设为26度", "category": "device_usage"
+    }))
+    assert_invalidated(client, auth_headers, url,
+                       lambda: client.post("/api/recommendations/1/implement", headers=auth_headers))
+
+
+def test_version_is_single_row_lookup(client, auth_headers, db):
+    client.post("/api/devices/", headers=auth_headers, json=DEVICE)
+    user = db.query(models.User).filter(models.User.username == "alice").one()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        version = devices_crud.get_data_version(db, user.id)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert version == (1,)
+    assert len(statements) == 1
+    assert "FROM data_versions" in statements[0] and "FROM devices" not in statements[0]
+
+
+def test_bump_creates_and_increments(db):
+    data_versions.bump(db, [2, 1, 2], "readings", "devices")
+    data_versions.bump(db, [1], "readings")
+    db.commit()
+
+    assert data_versions.get_versions(db, 1, *data_versions.KINDS) == (2, 0, 1, 0)
+    assert data_versions.get_versions(db, 2, *data_versions.KINDS) == (1, 0, 1, 0)
+    assert data_versions.get_versions(db, 3, "readings") == (0,)
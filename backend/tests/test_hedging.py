@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app.services.hedged_ai_service import HedgingPolicy, LatencyTracker
+
+
+def respond(value, delay: float, started: list = None, cancelled: list = None):
+    async def call():
+        if started is not None:
+            started.append(value)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(value)
+            raise
+        return value
+    return call
+
+
+def test_fast_primary_is_not_hedged():
+    policy = HedgingPolicy(default_budget=0.2)
+    started = []
+
+    result = asyncio.run(policy.run("analysis", respond("primary", 0), respond("secondary", 0, started)))
+
+    assert result == "primary"
+    assert started == []
+    assert policy.stats == {"requests": 1, "hedged": 0, "secondary_wins": 0}
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    policy = HedgingPolicy(default_budget=0.05)
+    cancelled = []
+
+    result = asyncio.run(policy.run("analysis", respond("primary", 5, cancelled=cancelled), respond("secondary", 0)))
+
+    assert result == "secondary"
+    assert cancelled == ["primary"]
+    assert policy.stats == {"requests": 1, "hedged": 1, "secondary_wins": 1}
+    # 被取消的主服务请求按取消时刻记录延迟下界
+    assert policy.trackers["analysis"].samples[0] >= 0.05
+
+
+def test_unusable_primary_falls_back():
+    policy = HedgingPolicy(default_budget=1)
+
+    result = asyncio.run(policy.run("analysis", respond({"error": "timeout"}, 0), respond({"ok": 1}, 0),
+                                    is_usable=lambda value: "error" not in value))
+
+    assert result == {"ok": 1}
+    assert policy.stats["hedged"] == 1
+
+
+def test_both_failing_raises_last_error():
+    async def failing():
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(HedgingPolicy(default_budget=1).run("analysis", failing, failing))
+
+
+def test_budget_follows_p95_after_min_samples():
+    policy = HedgingPolicy(default_budget=3, min_samples=20)
+    assert policy.budget("analysis") == 3
+
+    for sample in range(1, 21):
+        policy._tracker("analysis").observe(sample / 10)
+    assert policy.budget("analysis") == pytest.approx(1.9)
+
+
+def test_percentile_uses_nearest_rank():
+    tracker = LatencyTracker(window=3)
+    for sample in (5, 1, 2, 3):
+        tracker.observe(sample)
+
+    # 窗口只保留最近3个样本
+    assert tracker.percentile(0.5) == 2
+    assert tracker.percentile(1.0) == 3
@@ -0,0 +1,16 @@
+import os
+
+from app.tools.check_import_time import FORBIDDEN_MODULES, check_import_time, measure_import_time
+
+# 预算约为实测导入耗时（约1.5秒）的两倍，留出测试机器的波动余量
+BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", 3000))
+
+
+def test_cold_start_skips_heavy_modules():
+    _, imported = measure_import_time("app.main")
+
+    assert [module for module in FORBIDDEN_MODULES if module in imported] == []
+
+
+def test_import_time_within_budget():
+    assert check_import_time("app.main", BUDGET_MS) == []
@@ -0,0 +1,72 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app import models, schemas
+from app.services import ingest_buffer
+from app.sharding import ShardMovingError
+
+
+def reading(day: int, value: float = 10) -> schemas.EnergyReadingCreate:
+    return schemas.EnergyReadingCreate(reading_value=value, reading_type="total",
+                                       reading_date=date(2026, 1, 1) + timedelta(days=day))
+
+
+@pytest.fixture
+def buffer(db):
+    buffer = ingest_buffer.IngestBuffer(flush_interval=0.2)
+    yield buffer
+    buffer.close()
+
+
+def test_batch_commits_all_readings(buffer, db):
+    futures = [buffer.submit(1, reading(day)) for day in range(5)]
+    responses = [future.result(5) for future in futures]
+
+    assert [response.reading_date for response in responses] == [date(2026, 1, 1) + timedelta(days=day) for day in range(5)]
+    assert all(response.id and response.created_at for response in responses)
+    assert db.query(models.EnergyReading).count() == 5
+
+
+def test_failed_reading_does_not_fail_batch(buffer, db, monkeypatch):
+    create = ingest_buffer.create_energy_readings
+
+    def failing(session, rows):
+        if any(row["reading_value"] < 0 for row in rows):
+            raise ValueError("bad reading")
+        return create(session, rows)
+
+    monkeypatch.setattr(ingest_buffer, "create_energy_readings", failing)
+    futures = [buffer.submit(1, reading(day, value=-1 if day == 1 else 10)) for day in range(3)]
+
+    assert futures[0].result(5).reading_value == 10
+    with pytest.raises(ValueError):
+        futures[1].result(5)
+    assert futures[2].result(5).reading_value == 10
+    assert db.query(models.EnergyReading).count() == 2
+
+
+def test_cancelled_request_is_skipped(buffer, db):
+    futures = [buffer.submit(1, reading(day)) for day in range(3)]
+    # 客户端断开：asyncio.wrap_future 取消并发 Future
+    assert futures[1].cancel()
+
+    assert futures[0].result(5).id
+    assert futures[2].result(5).id
+    assert db.query(models.EnergyReading).count() == 2
+    # 写入线程仍在工作
+    assert buffer.submit(1, reading(10)).result(5).id
+
+
+def test_moving_user_gets_503(client, auth_headers, monkeypatch):
+    class MovingRouter:
+        def shard_for(self, user_id):
+            raise ShardMovingError(user_id)
+
+    monkeypatch.setenv("INGEST_BUFFER_ENABLED", "true")
+    monkeypatch.setattr(ingest_buffer, "get_shard_router", lambda: MovingRouter())
+    response = client.post("/api/energy-readings/", headers=auth_headers,
+                           json={"reading_value": 1, "reading_type": "total", "reading_date": "2026-01-01"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from app import schemas
+from app.services.intervals import to_hourly
+
+VALID_INTERVALS = [1, 5, 15, 30, 60, 120, 180, 360, 1440]
+
+
+@pytest.mark.parametrize("interval", VALID_INTERVALS)
+def test_valid_interval_sums_to_24_hours(interval):
+    values = np.ones(1440 // interval)
+    hourly = to_hourly(values, interval)
+
+    assert hourly.shape == (24,)
+    assert hourly.sum() == pytest.approx(values.sum())
+
+
+@pytest.mark.parametrize("interval", [0, 7, 40, 45, 90, 420])
+def test_interval_crossing_hours_is_rejected(interval):
+    with pytest.raises(ValidationError):
+        schemas.IntervalReadingIngest(interval_minutes=interval, points=[])
+
+
+def test_interval_90_returns_422(client, auth_headers):
+    response = client.post("/api/energy-readings/intervals", headers=auth_headers,
+                           json={"interval_minutes": 90, "points": [{"timestamp": "2026-01-01T00:00:00", "value": 1}]})
+
+    assert response.status_code == 422
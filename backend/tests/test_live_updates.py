@@ -0,0 +1,64 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from app import models
+from app.services import live_updates
+from app.utils import LIVE_TOKEN_SCOPE, create_access_token
+
+
+def events(body: str):
+    """解析SSE消息，忽略注释行（心跳）"""
+    parsed = []
+    for message in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines() if not line.startswith(":"))
+        if fields:
+            parsed.append((fields["event"], json.loads(fields["data"])))
+    return parsed
+
+
+def test_stream_closes_when_token_expires():
+    async def collect():
+        live = live_updates.LiveUpdates(queue_size=4, max_per_user=1, workers=1)
+        subscription = live.subscribe(1)
+        started = time.monotonic()
+        chunks = [chunk async for chunk in live_updates.event_stream(
+            live, subscription, {"version": "v1"}, heartbeat=0.05, expires_at=time.time() + 0.3)]
+        return chunks, time.monotonic() - started, live.subscriber_count()
+
+    chunks, elapsed, subscribers = asyncio.run(collect())
+
+    assert events("".join(chunks)) == [("snapshot", {"version": "v1"}), ("closed", {"reconnect": True})]
+    assert ": keepalive\n\n" in chunks
+    assert 0.25 <= elapsed < 2
+    assert subscribers == 0
+
+
+def test_live_endpoint_accepts_only_stream_tokens(client, auth_headers, db):
+    user_id = db.query(models.User.id).filter(models.User.username == "alice").scalar()
+    login_token = auth_headers["Authorization"][7:]
+    expired = create_access_token({"sub": str(user_id), "scope": LIVE_TOKEN_SCOPE}, timedelta(seconds=-1))
+
+    # 登录令牌不能出现在URL中，过期的推送令牌被拒绝
+    assert client.get(f"/api/energy-readings/live?access_token={login_token}").status_code == 401
+    assert client.get(f"/api/energy-readings/live?access_token={expired}").status_code == 401
+
+    issued = client.post("/api/energy-readings/live/token", headers=auth_headers).json()
+    assert issued["expires_in"] > 0
+    # 推送令牌不能当作登录令牌使用
+    live_headers = {"Authorization": f"Bearer {issued['access_token']}"}
+    assert client.get("/api/devices/my-devices", headers=live_headers).status_code == 401
+
+
+def test_live_endpoint_closes_at_token_expiry(client, auth_headers, db):
+    user_id = db.query(models.User.id).filter(models.User.username == "alice").scalar()
+    token = create_access_token({"sub": str(user_id), "scope": LIVE_TOKEN_SCOPE}, timedelta(seconds=2))
+
+    started = time.monotonic()
+    with client.stream("GET", f"/api/energy-readings/live?access_token={token}") as response:
+        assert response.status_code == 200
+        body = "".join(response.iter_text())
+
+    assert [event for event, _ in events(body)] == ["snapshot", "closed"]
+    assert time.monotonic() - started < 5
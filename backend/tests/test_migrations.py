@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from app import migrations
+from app.migrations import MIGRATIONS
+from app.tools.dedup_readings import delete_duplicates
+
+
+class RecordingConnection:
+    """记录迁移发出的语句，不执行"""
+
+    def __init__(self, dialect):
+        self.dialect = dialect
+        self.statements = []
+
+    def exec_driver_sql(self, statement, *args):
+        self.statements.append(statement)
+
+    def execute(self, statement, *args):
+        self.statements.append(str(statement))
+
+
+@pytest.fixture
+def mysql_conn(monkeypatch):
+    # 空库：没有任何列和索引，迁移发出全部语句
+    inspector = SimpleNamespace(get_indexes=lambda table: [], get_columns=lambda table: [])
+    monkeypatch.setattr(migrations, "sa_inspect", lambda conn: inspector)
+    return RecordingConnection(mysql.dialect())
+
+
+def test_mysql_migrations_sql(mysql_conn):
+    for module in MIGRATIONS:
+        module.upgrade(mysql_conn)
+    statements = mysql_conn.statements
+
+    assert "ALTER TABLE energy_readings ADD COLUMN revision INTEGER NOT NULL DEFAULT 1" in statements
+    # MySQL 函数索引的表达式键需要括号
+    assert ("CREATE UNIQUE INDEX uq_energy_readings_natural_key ON energy_readings "
+            "(user_id, (coalesce(device_id, 0)), reading_date, reading_type)") in statements
+    assert ("CREATE INDEX ix_energy_readings_user_type_date ON energy_readings "
+            "(user_id, reading_type, reading_date)") in statements
+    assert not any("CONCURRENTLY" in statement or "IF NOT EXISTS" in statement for statement in statements)
+
+
+def test_index_key():
+    columns = ["user_id", "coalesce(device_id, 0)"]
+    assert migrations.index_key("mysql", columns) == "user_id, (coalesce(device_id, 0))"
+    assert migrations.index_key("postgresql", columns) == "user_id, coalesce(device_id, 0)"
+
+
+def test_mysql_dedup_joins_derived_table():
+    sql = str(delete_duplicates("mysql").compile(dialect=mysql.dialect()))
+    # 不能在 WHERE 子查询中读取被删除的表（MySQL 错误1093）
+    assert "NOT IN" not in sql
+    assert sql.startswith("DELETE FROM energy_readings USING energy_readings, (SELECT")
+    assert "max(energy_readings.id) AS keep_id" in sql
+    assert "energy_readings.id < k.keep_id" in sql
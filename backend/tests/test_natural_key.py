@@ -0,0 +1,80 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, insert, inspect as sa_inspect, select
+from sqlalchemy.exc import IntegrityError
+
+from app import models
+from app.crud import energy_readings as energy_readings_crud
+from app.database import Base
+from app.sharding import ShardRouter
+from app.tools import dedup_readings
+
+READING = {"reading_value": 10, "reading_type": "total", "reading_date": "2026-01-01", "cost": 5}
+
+
+def test_repeated_post_overwrites_reading(client, auth_headers, db):
+    first = client.post("/api/energy-readings/", headers=auth_headers, json=READING).json()
+    second = client.post("/api/energy-readings/", headers=auth_headers, json=dict(READING, reading_value=12)).json()
+
+    assert second["id"] == first["id"]
+    reading = db.query(models.EnergyReading).one()
+    assert (reading.reading_value, reading.revision) == (12, 2)
+
+
+def test_bulk_keeps_last_duplicate_in_batch(client, auth_headers, db):
+    device = client.post("/api/devices/", headers=auth_headers, json={
+        "name": "AC", "device_type": "air_conditioner", "power_rating": 1500, "daily_usage_hours": 5
+    }).json()
+    readings = [READING, dict(READING, reading_value=11),
+                dict(READING, reading_type="device", device_id=device["id"], reading_value=3)]
+
+    response = client.post("/api/energy-readings/bulk", headers=auth_headers, json=readings)
+    assert response.status_code == 200
+    assert [reading["reading_value"] for reading in response.json()] == [11, 11, 3]
+    # 网关重试同一批次：不重复计数
+    client.post("/api/energy-readings/bulk", headers=auth_headers, json=readings)
+    assert sorted(value for value, in db.query(models.EnergyReading.reading_value)) == [3, 11]
+
+
+def test_orm_fallback_matches_upsert(db):
+    row = {"user_id": 1, "device_id": None, "reading_type": models.ReadingType.total,
+           "reading_date": date(2026, 1, 1), "reading_value": 10, "cost": 5}
+    inserted = energy_readings_crud._upsert_with_orm(db, [row])[0]
+    updated = energy_readings_crud._upsert_with_orm(db, [dict(row, reading_value=12)])[0]
+
+    assert updated.id == inserted.id
+    assert (updated.reading_value, updated.revision) == (12, 2)
+
+
+@pytest.fixture
+def legacy_shard(tmp_path):
+    """迁移0001之前的读数表：没有自然键唯一索引，也没有revision列"""
+    router = ShardRouter({"s0": f"sqlite:///{tmp_path / 'legacy.db'}"})
+    engine = router.engine("s0")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX uq_energy_readings_natural_key")
+        conn.exec_driver_sql("ALTER TABLE energy_readings DROP COLUMN revision")
+    return router
+
+
+def test_dedup_keeps_last_reading_and_adds_unique_index(legacy_shard):
+    engine = legacy_shard.engine("s0")
+    table = models.EnergyReading.__table__
+    rows = [(None, "total", value) for value in (10, 11, 12)] + [(1, "device", 3)]
+    with engine.begin() as conn:
+        for row in rows:
+            conn.exec_driver_sql("INSERT INTO energy_readings (user_id, device_id, reading_type, reading_date, reading_value)"
+                                 " VALUES (1, ?, ?, '2026-01-01', ?)", row)
+
+    assert dedup_readings.migrate_shard(legacy_shard, "s0", dry_run=True) == 2
+    assert dedup_readings.migrate_shard(legacy_shard, "s0", dry_run=False) == 2
+
+    with engine.connect() as conn:
+        remaining = conn.execute(select(table.c.id, table.c.reading_value).order_by(table.c.id)).all()
+        assert [value for _, value in remaining] == [12, 3]
+        with pytest.raises(IntegrityError):
+            conn.execute(insert(table).values(user_id=1, reading_type="total", reading_date=date(2026, 1, 1),
+                                              reading_value=13))
+    assert "revision" in {column["name"] for column in sa_inspect(engine).get_columns("energy_readings")}
@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app import models, schemas
+from app.query_tracker import QueryBudgetExceeded, assert_query_budget, normalize_statement, track_queries
+from app.services import data_processing
+from app.services.recommendation_engine import generate_user_recommendations
+
+PERIODS = [period for period in schemas.AnalysisPeriod if period != schemas.AnalysisPeriod.custom]
+
+
+def seed_user(db, name: str, devices: int, days: int = 60) -> int:
+    """写入一个用户及其设备、最近days天的总读数和设备读数"""
+    user = models.User(username=name, email=f"{name}@example.com", hashed_password="x", family_size=3, house_size=90)
+    db.add(user)
+    db.flush()
+    device_types = list(models.DeviceType)
+    rows = [models.Device(user_id=user.id, name=f"设备{i}", device_type=device_types[i % len(device_types)],
+                          power_rating=1000, daily_usage_hours=5) for i in range(devices)]
+    db.add_all(rows)
+    db.flush()
+    today = date.today()
+    for offset in range(days):
+        day = today - timedelta(days=offset)
+        db.add(models.EnergyReading(user_id=user.id, reading_value=20, reading_type=models.ReadingType.total,
+                                    reading_date=day, cost=10))
+        db.add_all([models.EnergyReading(user_id=user.id, device_id=device.id, reading_value=2,
+                                         reading_type=models.ReadingType.device, reading_date=day, cost=1)
+                    for device in rows])
+    db.commit()
+    return user.id
+
+
+def test_normalize_statement_merges_literals_and_in_lists():
+    assert normalize_statement("SELECT * FROM t WHERE id IN (?, ?, ?) AND name = 'a'  AND n = 3") == \
+        "SELECT * FROM t WHERE id IN (?...) AND name = ? AND n = ?"
+
+
+def test_budget_reports_repeated_shapes(engine):
+    with pytest.raises(QueryBudgetExceeded) as error:
+        with assert_query_budget(10, max_repeats=1):
+            with engine.connect() as conn:
+                for value in range(3):
+                    conn.exec_driver_sql(f"SELECT {value}")
+
+    assert "同一语句形状执行超过1次" in str(error.value)
+    assert "重复3次: SELECT ?" in str(error.value)
+
+
+@pytest.mark.parametrize("period", PERIODS, ids=lambda period: period.value)
+def test_analysis_query_budget(db, period):
+    user_id = seed_user(db, "few", devices=2)
+    many_user_id = seed_user(db, "many", devices=8)
+
+    with assert_query_budget(9, max_repeats=2) as few:
+        data_processing.get_energy_analysis(db, user_id, period)
+    db.expunge_all()
+    with track_queries() as many:
+        data_processing.get_energy_analysis(db, many_user_id, period)
+
+    # 查询数量与设备数无关
+    assert many.count == few.count
+
+
+def test_generate_recommendations_reads_do_not_scale(db):
+    def selects(user_id: int):
+        with track_queries() as tracker:
+            saved = generate_user_recommendations(db, user_id)
+        db.expunge_all()
+        return sum(1 for shape, _ in tracker.statements if shape.startswith("SELECT")), len(saved)
+
+    few_selects, few_saved = selects(seed_user(db, "few", devices=2))
+    many_selects, many_saved = selects(seed_user(db, "many", devices=8))
+
+    assert many_saved > few_saved
+    assert many_selects == few_selects
+    assert few_selects <= 13
+
+
+def test_ai_recommendations_saved_in_one_commit(client, auth_headers, db):
+    user_id = db.query(models.User.id).filter(models.User.username == "alice").scalar()
+    with track_queries() as tracker:
+        response = client.post(f"/api/recommendations/ai/generate?user_id={user_id}&ai_provider=stub", headers=auth_headers)
+
+    assert response.status_code == 200
+    saved = response.json()
+    assert saved and all(recommendation["source"] == "ai_based" for recommendation in saved)
+    assert sum(1 for shape, _ in tracker.statements if shape.startswith("SELECT recommendations.id")) == 1
@@ -0,0 +1,53 @@
+import pytest
+
+from app import models, sharding
+from app.sharding import ShardRouter
+
+
+@pytest.fixture
+def two_shards(engine, tmp_path, monkeypatch):
+    router = ShardRouter({"s0": f"sqlite:///{tmp_path / 's0.db'}", "s1": f"sqlite:///{tmp_path / 's1.db'}"})
+    router.create_all()
+    monkeypatch.setattr(sharding, "_router", router)
+    return router
+
+
+def login(client, db, router, username: str, shard: str) -> dict:
+    """注册用户并指定所属分片，返回认证请求头"""
+    client.post("/api/users/register", json={
+        "username": username, "email": f"{username}@example.com", "password": "secret123",
+        "family_size": 2, "house_size": 80
+    })
+    user = db.query(models.User).filter(models.User.username == username).one()
+    db.merge(models.ShardAssignment(user_id=user.id, shard=shard, state="active"))
+    db.commit()
+    router.directory_entry(user.id, fresh=True)
+    router.sync_user(user)
+    token = client.post("/api/users/login", data={"username": username, "password": "secret123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_read_device_uses_own_shard(client, db, two_shards):
+    alice = login(client, db, two_shards, "alice", "s0")
+    bob = login(client, db, two_shards, "bob", "s1")
+    for headers, name in ((alice, "AC"), (bob, "Fridge")):
+        device = client.post("/api/devices/", headers=headers, json={
+            "name": name, "device_type": "air_conditioner", "power_rating": 100, "daily_usage_hours": 1
+        }).json()
+        # 设备ID在各分片上独立分配
+        assert device["id"] == 1
+
+    assert client.get("/api/devices/1", headers=alice).json()["name"] == "AC"
+    assert client.get("/api/devices/1", headers=bob).json()["name"] == "Fridge"
+    assert client.get("/api/devices/1").status_code == 401
+
+
+def test_directory_cache_is_bounded(engine):
+    router = ShardRouter({"s0": "sqlite://", "s1": "sqlite://"}, directory_size=2)
+    for user_id in (1, 2, 3):
+        router.directory_entry(user_id)
+    router.directory_entry(2)
+    router.directory_entry(4)
+
+    # 最久未访问的用户先被淘汰
+    assert list(router._directory) == [2, 4]
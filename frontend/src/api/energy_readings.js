@@ -3,4 +3,56 @@ import request from '@/utils/request'
 // 获取能耗分析
 export const getEnergyAnalysis = () => {
     return request.get('/energy-readings/analysis')
-}
\ No newline at end of file
+}
+
+// 获取仪表盘数据：fields 为需要的区块（analysis, benchmark, devices, recommendations, sources），逗号分隔，默认全部
+export const getDashboard = (fields) => {
+    return request.get('/dashboard', { params: { fields } })
+}
+
+// 获取实时推送令牌（短期有效，只能用于建立推送连接）
+export const getLiveToken = () => {
+    return request.post('/energy-readings/live/token')
+}
+
+// 订阅实时推送（Server-Sent Events）：先收到 snapshot，之后每次读数变化收到 update。
+// EventSource 无法设置请求头，URL中携带短期的推送令牌而不是登录令牌；
+// 令牌到期或被服务端断开（closed/evicted）时重新获取令牌再连接。返回对象的 close() 在组件卸载时调用
+export const subscribeLiveUpdates = ({ onSnapshot, onUpdate }) => {
+    let source = null
+    let stopped = false
+
+    const connect = async () => {
+        let token
+        try {
+            token = await getLiveToken()
+        } catch (error) {
+            if (!stopped) setTimeout(connect, 5000)
+            return
+        }
+        if (stopped) return
+
+        source = new EventSource(`/api/energy-readings/live?access_token=${encodeURIComponent(token.access_token)}`)
+        source.addEventListener('snapshot', (e) => onSnapshot && onSnapshot(JSON.parse(e.data)))
+        source.addEventListener('update', (e) => onUpdate && onUpdate(JSON.parse(e.data)))
+        const reconnect = () => {
+            // 关闭后浏览器不再用旧令牌自动重连
+            source.close()
+            if (!stopped) connect()
+        }
+        source.addEventListener('closed', reconnect)
+        source.addEventListener('evicted', reconnect)
+        // 连接被拒绝（如网络中断期间令牌已过期）时浏览器停止重连，重新获取令牌
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED && !stopped) setTimeout(connect, 5000)
+        }
+    }
+
+    connect()
+    return {
+        close: () => {
+            stopped = true
+            source && source.close()
+        }
+    }
+}